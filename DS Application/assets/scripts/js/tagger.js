@@ -7,6 +7,10 @@ const state = {
    filterUntagged: false,
    categoryFilter: "all",
    tagFilter: "all",
+   searchQuery: "",
+   searchIds: null,
+   events: null,
+   live: false,
    suggestions: [ ],
    tagStats: [ ],
    currentTags: {
@@ -93,15 +97,30 @@ function saveTags( advance ) {
 
    if ( status ) status.textContent = "Saving...";
 
+   const headers = { "Content-Type": "application/json" };
+   if ( rec.version != null ) {
+      headers[ "If-Match" ] = `"${rec.version}"`;
+   }
+
    fetch( `/api/explanations/${rec.id}`, {
       method: "POST",
-      headers: { "Content-Type": "application/json" },
+      headers: headers,
       body: JSON.stringify( payload ),
    } )
       .then( function ( res ) {
+         if ( res.status === 409 ) {
+            return res.json( ).then( function ( body ) {
+               applyConflict( rec, body.current );
+               throw new Error( "Record was changed by another annotator; reloaded it, please re-apply your tags" );
+            } );
+         }
          if ( !res.ok ) {
             throw new Error( `Save failed (${res.status})` );
          }
+         const etag = res.headers && res.headers.get ? res.headers.get( "ETag" ) : null;
+         if ( etag ) {
+            rec.version = Number( etag.replace( /^W\//, "" ).replace( /"/g, "" ) );
+         }
          // some endpoints return 204; don't try to parse JSON when there's no body
          if ( res.status === 204 ) return null;
          if ( res.headers && res.headers.get && res.headers.get( "content-length" ) === "0" ) return null;
@@ -115,6 +134,7 @@ function saveTags( advance ) {
          if ( idx !== -1 ) {
             state.allRecords[ idx ].tags_chatgpt = rec.tags_chatgpt;
             state.allRecords[ idx ].tags_bard = rec.tags_bard;
+            state.allRecords[ idx ].version = rec.version;
          }
 
          var removedCurrent = false;
@@ -134,12 +154,7 @@ function saveTags( advance ) {
             state.current = Math.min( previousIndex, Math.max( state.records.length - 1, 0 ) );
          }
 
-         state.tagStats = collectTagStats( state.allRecords.length ? state.allRecords : state.records );
-         state.suggestions = state.tagStats;
-         renderTagFilter( );
-         renderTagReplaceOptions( );
-         renderTagPickers( );
-         renderAvailableTags( );
+         refreshTagStats( );
          updateMissingButton( );
          // reapply current filters to refresh the working list
          state.records = filterRecords( );
@@ -175,6 +190,16 @@ function saveTags( advance ) {
       } );
 }
 
+function applyConflict( rec, current ) {
+   if ( !current ) return;
+   Object.assign( rec, current );
+   const idx = state.allRecords.findIndex( function ( r ) { return r.id === rec.id; } );
+   if ( idx !== -1 && state.allRecords[ idx ] !== rec ) {
+      Object.assign( state.allRecords[ idx ], current );
+   }
+   renderRecord( );
+}
+
 function goNext( ) {
    if ( state.current < state.records.length - 1 ) {
       state.current += 1;
@@ -207,8 +232,6 @@ function applyFilter( ) {
       state.current = 0;
    }
 
-   state.tagStats = collectTagStats( state.allRecords );
-   state.suggestions = state.tagStats;
    renderTagFilter( );
    renderRecord( );
    renderTagReplaceOptions( );
@@ -226,7 +249,8 @@ function filterRecords( ) {
          const tags = parseTags( rec.tags_chatgpt ).concat( parseTags( rec.tags_bard ) );
          return tags.some( function ( t ) { return t.toLowerCase( ) === state.tagFilter.toLowerCase( ); } );
       } )( );
-      return catMatch && needsTag && tagMatch;
+      const searchMatch = !state.searchIds || state.searchIds.has( rec.id );
+      return catMatch && needsTag && tagMatch && searchMatch;
    } );
 }
 
@@ -236,6 +260,7 @@ function restoreFiltersFromUrl( ) {
       const untagged = params.get( "untagged" );
       const cat = params.get( "cat" );
       const tag = params.get( "tag" );
+      const query = params.get( "q" );
 
       const chk = qs( "#filter_untagged" );
       if ( chk ) {
@@ -254,6 +279,12 @@ function restoreFiltersFromUrl( ) {
          tagSel.value = tag;
          state.tagFilter = tag;
       }
+
+      const searchInput = qs( "#search_text" );
+      if ( searchInput && query ) {
+         searchInput.value = query;
+         state.searchQuery = query;
+      }
    } catch ( err ) {
       console.warn( "[filters] restore failed", err );
    }
@@ -265,28 +296,150 @@ function updateUrlFilters( ) {
       url.searchParams.set( "untagged", state.filterUntagged ? "1" : "0" );
       url.searchParams.set( "cat", state.categoryFilter || "all" );
       url.searchParams.set( "tag", state.tagFilter || "all" );
+      if ( state.searchQuery ) {
+         url.searchParams.set( "q", state.searchQuery );
+      } else {
+         url.searchParams.delete( "q" );
+      }
       window.history.replaceState( { }, "", url.toString( ) );
    } catch ( err ) {
       console.warn( "[filters] update failed", err );
    }
 }
 
-function loadData( ) {
-   const status = qs( "#status" );
-   if ( status ) status.textContent = "Loading...";
+function fetchTagStats( ) {
+   return fetch( "/api/tags" )
+      .then( function ( res ) {
+         if ( !res.ok ) {
+            throw new Error( `Tag load failed (${res.status})` );
+         }
+         return res.json( );
+      } );
+}
+
+function runSearch( ) {
+   // Server-side ranked search; the matching ids narrow the other filters
+   const input = qs( "#search_text" );
+   const query = input ? input.value.trim( ) : "";
+   state.searchQuery = query;
+
+   if ( !query ) {
+      state.searchIds = null;
+      applyFilter( );
+      return;
+   }
 
-   fetch( "/api/explanations" )
+   const limit = Math.max( state.allRecords.length, 1 );
+   fetch( `/api/search?q=${encodeURIComponent( query )}&limit=${limit}` )
       .then( function ( res ) {
          if ( !res.ok ) {
-            throw new Error( `Load failed (${res.status})` );
+            throw new Error( `Search failed (${res.status})` );
          }
          return res.json( );
       } )
       .then( function ( data ) {
-         state.allRecords = Array.isArray( data ) ? data : [ ];
+         state.searchIds = new Set( ( data.items || [ ] ).map( function ( item ) { return item.id; } ) );
+         applyFilter( );
+      } )
+      .catch( function ( err ) {
+         const status = qs( "#status" );
+         if ( status ) status.textContent = `Error: ${err.message}`;
+      } );
+}
+
+function refreshTagStats( ) {
+   fetchTagStats( )
+      .then( function ( tags ) {
+         state.tagStats = Array.isArray( tags ) ? tags : [ ];
+         state.suggestions = state.tagStats;
+         renderTagFilter( );
+         renderTagReplaceOptions( );
+         renderTagPickers( );
+         renderAvailableTags( );
+         renderSuggestions( state.suggestions, "#suggest_chatgpt", "chatgpt" );
+         renderSuggestions( state.suggestions, "#suggest_bard", "bard" );
+      } )
+      .catch( function ( err ) {
+         console.warn( "[tags] refresh failed", err );
+      } );
+}
+
+function parseNdjson( text ) {
+   return text.split( "\n" )
+      .filter( function ( line ) { return line.trim( ).length; } )
+      .map( function ( line ) { return JSON.parse( line ); } );
+}
+
+function versionFromEtag( etag ) {
+   if ( !etag ) return null;
+   const version = Number( etag.replace( /^W\//, "" ).replace( /"/g, "" ) );
+   return isNaN( version ) ? null : version;
+}
+
+function streamRecords( onRecords, onVersion ) {
+   // NDJSON lets the first rows render before the whole dataset has arrived
+   return fetch( "/api/explanations", { headers: { Accept: "application/x-ndjson" } } )
+      .then( function ( res ) {
+         if ( !res.ok ) {
+            throw new Error( `Load failed (${res.status})` );
+         }
+         if ( onVersion ) onVersion( versionFromEtag( res.headers.get( "ETag" ) ) );
+         if ( !res.body || !res.body.getReader || typeof TextDecoder === "undefined" ) {
+            return res.text( ).then( function ( text ) { onRecords( parseNdjson( text ) ); } );
+         }
+
+         const reader = res.body.getReader( );
+         const decoder = new TextDecoder( );
+         var buffered = "";
+
+         function pump( ) {
+            return reader.read( ).then( function ( chunk ) {
+               if ( chunk.done ) {
+                  buffered += decoder.decode( );
+                  onRecords( parseNdjson( buffered ) );
+                  return;
+               }
+               buffered += decoder.decode( chunk.value, { stream: true } );
+               const cut = buffered.lastIndexOf( "\n" );
+               if ( cut !== -1 ) {
+                  onRecords( parseNdjson( buffered.slice( 0, cut ) ) );
+                  buffered = buffered.slice( cut + 1 );
+               }
+               return pump( );
+            } );
+         }
+
+         return pump( );
+      } );
+}
+
+function loadData( ) {
+   const status = qs( "#status" );
+   if ( status ) status.textContent = "Loading...";
+
+   const loaded = [ ];
+   var painted = false;
+   var loadedVersion = null;
+
+   const recordsRequest = streamRecords( function ( batch ) {
+      Array.prototype.push.apply( loaded, batch );
+      if ( !painted && loaded.length && getIdFromUrl( ) == null ) {
+         painted = true;
+         state.allRecords = loaded;
+         state.records = loaded;
+         state.current = 0;
+         renderRecord( );
+      }
+      if ( status ) status.textContent = `Loading... ${loaded.length} records`;
+   }, function ( version ) { loadedVersion = version; } );
+
+   Promise.all( [ recordsRequest, fetchTagStats( ) ] )
+      .then( function ( results ) {
+         const tags = results[ 1 ];
+         state.allRecords = loaded;
          state.current = 0;
 
-         state.tagStats = collectTagStats( state.allRecords );
+         state.tagStats = Array.isArray( tags ) ? tags : [ ];
          state.suggestions = state.tagStats;
 
          renderCategoryFilter( );
@@ -294,13 +447,117 @@ function loadData( ) {
          restoreFiltersFromUrl( );
          renderTagReplaceOptions( );
          updateMissingButton( );
-         applyFilter( );
+         runSearch( );
+         connectEvents( loadedVersion );
       } )
       .catch( function ( err ) {
          if ( status ) status.textContent = `Error: ${err.message}`;
       } );
 }
 
+function connectEvents( since ) {
+   // Live changes from other annotators; ?since covers edits made while the data was loading
+   if ( typeof EventSource === "undefined" ) return;
+   if ( state.events ) state.events.close( );
+
+   const source = new EventSource( since != null ? `/api/events?since=${since}` : "/api/events" );
+   state.events = source;
+   state.live = false;
+
+   source.addEventListener( "open", function ( ) { state.live = true; } );
+   source.addEventListener( "error", function ( ) {
+      // EventSource reconnects by itself ( with Last-Event-ID ) unless the server refused the stream
+      state.live = false;
+      if ( source.readyState === EventSource.CLOSED ) {
+         console.warn( "[events] live updates unavailable" );
+      }
+   } );
+   source.addEventListener( "reload", function ( ) { loadData( ); } );
+   source.addEventListener( "rows", function ( e ) {
+      const data = JSON.parse( e.data );
+      const byId = new Map( data.rows.map( function ( row ) { return [ row.id, row ]; } ) );
+      patchRecords( Array.from( byId.keys( ) ), data.version, function ( rec ) {
+         const row = byId.get( rec.id );
+         rec.tags_chatgpt = row.tags_chatgpt;
+         rec.tags_bard = row.tags_bard;
+      } );
+   } );
+   source.addEventListener( "rename", function ( e ) {
+      const data = JSON.parse( e.data );
+      const oldTag = data.old_tag.toLowerCase( );
+      patchRecords( data.ids, data.version, function ( rec ) {
+         editTags( rec, function ( tags ) {
+            return tags.map( function ( t ) { return t.toLowerCase( ) === oldTag ? data.new_tag : t; } );
+         } );
+      } );
+   } );
+   source.addEventListener( "remove", function ( e ) {
+      const data = JSON.parse( e.data );
+      const tag = data.tag.toLowerCase( );
+      patchRecords( data.ids, data.version, function ( rec ) {
+         editTags( rec, function ( tags ) {
+            return tags.filter( function ( t ) { return t.toLowerCase( ) !== tag; } );
+         } );
+      } );
+   } );
+   source.addEventListener( "add", function ( e ) {
+      const data = JSON.parse( e.data );
+      const tag = data.tag.toLowerCase( );
+      patchRecords( data.ids, data.version, function ( rec ) {
+         editTags( rec, function ( tags ) {
+            const present = tags.some( function ( t ) { return t.toLowerCase( ) === tag; } );
+            return present ? tags : tags.concat( [ data.tag ] );
+         } );
+      } );
+   } );
+}
+
+function editTags( rec, edit ) {
+   // Apply edit to both tag lists, rewriting only the lists it changes ( as the server does )
+   [ "tags_chatgpt", "tags_bard" ].forEach( function ( key ) {
+      const tags = parseTags( rec[ key ] );
+      const edited = edit( tags );
+      if ( edited.length !== tags.length || edited.some( function ( t, i ) { return t !== tags[ i ]; } ) ) {
+         rec[ key ] = edited.join( ", " );
+      }
+   } );
+}
+
+function patchRecords( ids, version, update ) {
+   // Apply a pushed change to the loaded records, skipping rows already at or past its version
+   const wanted = new Set( ids );
+   const current = state.records[ state.current ];
+   var touched = false;
+   var currentTouched = false;
+
+   state.allRecords.forEach( function ( rec ) {
+      if ( !wanted.has( rec.id ) ) return;
+      if ( rec.version != null && rec.version >= version ) return;
+      update( rec );
+      rec.version = version;
+      touched = true;
+      if ( rec === current ) currentTouched = true;
+   } );
+   if ( !touched ) return;
+
+   state.records = filterRecords( );
+   const idx = current ? state.records.indexOf( current ) : -1;
+   if ( idx !== -1 ) {
+      state.current = idx;
+   } else {
+      state.current = Math.min( state.current, Math.max( state.records.length - 1, 0 ) );
+      currentTouched = true;
+   }
+
+   refreshTagStats( );
+   updateMissingButton( );
+   if ( currentTouched ) {
+      renderRecord( );
+   } else {
+      updateNavButtons( );
+   }
+}
+
 function wireEvents( ) {
    qs( "#btn_prev" ).addEventListener( "click", function ( ) { goPrev( ); } );
    qs( "#btn_next" ).addEventListener( "click", function ( ) { goNext( ); } );
@@ -324,6 +581,16 @@ function wireEvents( ) {
       } );
    }
 
+   const searchInput = qs( "#search_text" );
+   if ( searchInput ) {
+      searchInput.addEventListener( "keydown", function ( e ) {
+         if ( e.key === "Enter" ) {
+            e.preventDefault( );
+            runSearch( );
+         }
+      } );
+   }
+
    const tagSelect = qs( "#tag_filter" );
    if ( tagSelect ) {
       tagSelect.addEventListener( "change", function ( ) {
@@ -848,7 +1115,7 @@ function removeTagEverywhere( tag ) {
       .then( function ( data ) {
          if ( status ) status.textContent = `Removed from ${data.removed_rows || 0} records`;
          setTimeout( function ( ) { if ( status ) status.textContent = ""; }, 1200 );
-         loadData( );
+         if ( !state.live ) loadData( );
       } )
       .catch( function ( err ) {
          if ( status ) status.textContent = `Error: ${err.message}`;
@@ -888,7 +1155,7 @@ function replaceTagEverywhere( ) {
       .then( function ( data ) {
          if ( status ) status.textContent = `Replaced in ${data.updated_rows || 0} records`;
          setTimeout( function ( ) { if ( status ) status.textContent = ""; }, 1200 );
-         loadData( );
+         if ( !state.live ) loadData( );
       } )
       .catch( function ( err ) {
          if ( status ) status.textContent = `Error: ${err.message}`;
@@ -926,7 +1193,7 @@ function renameTag( ) {
          setTimeout( function ( ) { if ( status ) status.textContent = ""; }, 1200 );
          oldInput.value = "";
          newInput.value = "";
-         loadData( );
+         if ( !state.live ) loadData( );
       } )
       .catch( function ( err ) {
          if ( status ) status.textContent = `Error: ${err.message}`;
@@ -951,7 +1218,7 @@ function applyMissingTag( ) {
       .then( function ( data ) {
          if ( status ) status.textContent = `Tagged ${data.updated_rows || 0} records`;
          setTimeout( function ( ) { if ( status ) status.textContent = ""; }, 1200 );
-         loadData( );
+         if ( !state.live ) loadData( );
       } )
       .catch( function ( err ) {
          if ( status ) status.textContent = `Error: ${err.message}`;
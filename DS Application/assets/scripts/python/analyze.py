@@ -1,13 +1,26 @@
-import requests
 import pandas as pd
-import matplotlib.pyplot as plt
 import numpy as np
 from pathlib import Path
 import textwrap
 from pandas.api.types import CategoricalDtype
 import re
-import nltk
 from collections import Counter
+import argparse
+import hashlib
+import importlib.metadata
+import inspect
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timezone
+
+from atomic_io import atomic_write
+from crosstab import crosstab_tables
+from extract_merge import merge_prior_tags
+from profiling import Profiler, measure
+from word_counts import NGRAM_NAMES, cached_token_index, count_terms
+from table_io import check_table_path, read_columns, read_table, write_table
 
 # ---------------------------------------------------------
 # Housekeeping
@@ -19,24 +32,30 @@ BASE_ASSETS_DIR = Path( __file__ ).resolve().parents[ 3 ]
 FIGURES_ROOT    = BASE_ASSETS_DIR / "output/figures"
 CSV_ROOT    = BASE_ASSETS_DIR / "output/csv"
 EXTRACT_OUTPUT_PATH = BASE_ASSETS_DIR / "assets/data/extract/explanations.csv"
+RAW_CACHE_DIR = BASE_ASSETS_DIR / "assets/data/raw"
+MANIFEST_PATH = BASE_ASSETS_DIR / "output/manifest.json"
+PROFILE_DIR = BASE_ASSETS_DIR / "output/profile"
 
-pd.set_option( 'display.max_columns', None )
-pd.set_option( 'display.width', 200 )
-pd.set_option( 'display.expand_frame_repr', False )
-pd.set_option( "future.no_silent_downcasting", True )
+# Columns the extract's tag merge and tag breakdowns need; the long text
+# columns are projected away when reading it ( see table_io.read_table ).
+EXTRACT_TAG_COLUMNS = [ "ID", "Tags - ChatGPT", "Tags - Bard" ]
 
-try:
-    nltk.data.find('corpora/stopwords')
-except LookupError:
-    nltk.download('stopwords')
+# matplotlib, nltk and requests are imported on first use ( see get_pyplot,
+# get_stop_words and fetch_cached_csv ) so importing this module, or running
+# only the crosstabs / extract steps, does not pay for them.
+_stop_words = None
 
-from nltk.corpus import stopwords
-stop_words = set(stopwords.words('english'))
+# Stage / artifact timings for --profile; replaced in main(), a no-op otherwise.
+PROFILER = Profiler()
 
 rating_col = "Which model is more helpful, safe, and honest? (rating)"
 
 FIG_SIZE = 4
 
+# Part of every job's fingerprint: bump it to rebuild all outputs after a
+# change job_fingerprint cannot see ( e.g. in a module a helper imports ).
+OUTPUT_VERSION = 1
+
 FRIENDLY_NAMES = {
     "PromptLength": "Prompt Length",
     "ChatGPTLength": "ChatGPT Response Length",
@@ -49,6 +68,9 @@ FRIENDLY_NAMES = {
     "PromptLengthBin": "Prompt Length",
 }
 
+# Free-text columns whose repeated words / phrases are counted.
+WORD_COLUMNS = [ "Prompt", "ChatGPT", "Bard", "Explanation" ]
+
 RATING_TEXT_LABELS = {
    1: "Bard much better (1)",
    2: "Bard better (2)",
@@ -59,6 +81,49 @@ RATING_TEXT_LABELS = {
    7: "ChatGPT much better (7)",
 }
 
+# ---------------------------------------------------------
+def configure_pandas( ):
+# ---------------------------------------------------------
+   pd.set_option( 'display.max_columns', None )
+   pd.set_option( 'display.width', 200 )
+   pd.set_option( 'display.expand_frame_repr', False )
+   pd.set_option( "future.no_silent_downcasting", True )
+
+# ---------------------------------------------------------
+def get_pyplot( ):
+# ---------------------------------------------------------
+   """
+   Import pyplot on demand. Figures are only ever saved to disk,
+   so default to the Agg backend unless one was chosen already.
+   """
+
+   if "matplotlib.pyplot" not in sys.modules:
+      os.environ.setdefault( "MPLBACKEND", "Agg" )
+   import matplotlib.pyplot as plt
+   return plt
+
+# ---------------------------------------------------------
+def get_stop_words( ):
+# ---------------------------------------------------------
+   """
+   English stop words from nltk, downloaded on first use.
+   """
+
+   global _stop_words
+
+   if _stop_words is None:
+      import nltk
+
+      try:
+         nltk.data.find( 'corpora/stopwords' )
+      except LookupError:
+         nltk.download( 'stopwords' )
+
+      from nltk.corpus import stopwords
+      _stop_words = set( stopwords.words( 'english' ) )
+
+   return _stop_words
+
 # ---------------------------------------------------------
 def generate_plot_charts( df, column_name ):
 # ---------------------------------------------------------
@@ -75,6 +140,8 @@ def generate_plot_charts( df, column_name ):
 
    friendly_name = FRIENDLY_NAMES.get( column_name, column_name )
 
+   plt = get_pyplot()
+
    fig, ax = plt.subplots( figsize = ( FIG_SIZE, FIG_SIZE ) )
 
    ax.boxplot( df[ column_name ].dropna(), vert = True )
@@ -101,6 +168,8 @@ def generate_plot_charts( df, column_name ):
    plt.savefig( save_filename, dpi = 300, bbox_inches = "tight" )
    plt.close()
 
+   return Path( save_filename )
+
 # ---------------------------------------------------------
 def generate_describe_table( df, column_name ):
 # ---------------------------------------------------------
@@ -162,6 +231,7 @@ def generate_describe_table( df, column_name ):
    )
 
    fig_height = 0.25 * len( desc_df ) + 0.65
+   plt = get_pyplot()
    fig, ax = plt.subplots( figsize = ( FIG_SIZE, fig_height ) )
    ax.axis( "off" )
 
@@ -209,6 +279,8 @@ def generate_describe_table( df, column_name ):
    plt.savefig( filename, dpi = 300, bbox_inches = "tight" )
    plt.close()
 
+   return Path( filename )
+
 # ---------------------------------------------------------
 def generate_category_table( df, column_name ):
 # ---------------------------------------------------------
@@ -250,6 +322,7 @@ def generate_category_table( df, column_name ):
    )
 
    fig_height = 0.25 * len( table_df ) + 0.65
+   plt = get_pyplot()
    fig, ax = plt.subplots( figsize = ( FIG_SIZE, fig_height ) )
    ax.axis( "off" )
    ax.set_title( friendly_name, pad = 8, loc = "center" )
@@ -311,6 +384,8 @@ def generate_category_table( df, column_name ):
    plt.savefig( filename, dpi = 300, bbox_inches = "tight" )
    plt.close()
 
+   return filename
+
 # ---------------------------------------------------------
 def generate_crosstab_csv( df, numeric_col, category_col ):
 # ---------------------------------------------------------
@@ -322,6 +397,8 @@ def generate_crosstab_csv( df, numeric_col, category_col ):
 
    Rows:
       ratings 1..7 mapped via RATING_TEXT_LABELS + optional Missing + Total
+
+   The table itself comes from crosstab.crosstab_tables, shared with tag_server.
    """
 
    friendly_rating   = FRIENDLY_NAMES.get( numeric_col, numeric_col )
@@ -332,86 +409,7 @@ def generate_crosstab_csv( df, numeric_col, category_col ):
    outdir = CSV_ROOT
    outdir.mkdir( parents = True, exist_ok = True )
 
-   tmp_df = df.copy()
-
-   tmp_df[ numeric_col ] = pd.to_numeric( tmp_df[ numeric_col ], errors = "coerce" ).astype( "Int64" )
-   tmp_df[ numeric_col ] = tmp_df[ numeric_col ].astype( "string" )
-   tmp_df[ numeric_col ] = tmp_df[ numeric_col ].where( tmp_df[ numeric_col ].notna(), "Missing" )
-
-   tmp_df[ category_col ] = tmp_df[ category_col ].where( tmp_df[ category_col ].notna(), "Missing" )
-   tmp_df[ category_col ] = tmp_df[ category_col ].astype( "string" )
-
-   counts = pd.crosstab(
-      index = tmp_df[ numeric_col ],
-      columns = tmp_df[ category_col ],
-      margins = True,
-      margins_name = "Total",
-      dropna = False
-   )
-
-   # Row order: 1..7, (Missing), Total
-   rating_order = [ str( i ) for i in range( 1, 8 ) ]
-   if "Missing" in counts.index:
-      rating_order.append( "Missing" )
-
-   row_order = [ r for r in rating_order if r in counts.index ]
-   if "Total" in counts.index:
-      row_order.append( "Total" )
-
-   # Column order: keep, but Total last
-   col_order = [ c for c in counts.columns if str( c ) != "Total" ]
-   if "Total" in counts.columns:
-      col_order.append( "Total" )
-
-   counts = counts.reindex( index = row_order, columns = col_order, fill_value = 0 )
-
-   # Percent-of-column
-   pct = counts.astype( float ).copy()
-
-   col_totals = pct.loc[ "Total" ] if "Total" in pct.index else pct.sum( axis = 0 )
-
-   for col in pct.columns:
-      denom = float( col_totals.get( col, 0.0 ) )
-      if denom > 0:
-         pct[ col ] = ( pct[ col ] / denom ) * 100.0
-      else:
-         pct[ col ] = 0.0
-
-   if "Total" in pct.index:
-      for col in pct.columns:
-         pct.loc[ "Total", col ] = 100.0 if col_totals.get( col, 0.0 ) > 0 else 0.0
-
-   # Rename rating index values using RATING_TEXT_LABELS ( keep Missing / Total )
-   rating_label_map = { str( k ): v for k, v in RATING_TEXT_LABELS.items() }
-
-   new_index = []
-   for idx in counts.index:
-      s = str( idx )
-      new_index.append( rating_label_map.get( s, s ) )
-
-   counts = counts.copy()
-   pct = pct.copy()
-
-   counts.index = new_index
-   pct.index = new_index
-
-   counts.index.name = "Rating"
-   pct.index.name = "Rating"
-
-   # Format percentages as strings
-   pct_fmt = pct.copy()
-   for col in pct_fmt.columns:
-      pct_fmt[ col ] = pct_fmt[ col ].map( lambda x: f"{x:.1f}%" )
-
-   # Combine into one table with a single header row
-   combined = pd.DataFrame( index = counts.index )
-
-   for col in counts.columns:
-      col_str = str( col )
-      combined[ f"{col_str} (Count)" ] = counts[ col ].astype( int )
-      combined[ f"{col_str} (% of Column)" ] = pct_fmt[ col ]
-
-   combined.index.name = "Rating"
+   combined = crosstab_tables( df, numeric_col, [ category_col ], RATING_TEXT_LABELS )[ category_col ]
 
    safe_category = friendly_category.replace( " ", "_" )
    safe_rating   = friendly_rating.replace( " ", "_" )
@@ -419,6 +417,8 @@ def generate_crosstab_csv( df, numeric_col, category_col ):
 
    combined.to_csv( filename )
 
+   return filename
+
 # ---------------------------------------------------------
 def generate_comparison_charts( df, numeric_col, category_col ):
 # ---------------------------------------------------------
@@ -450,6 +450,8 @@ def generate_comparison_charts( df, numeric_col, category_col ):
 
    tick_labels = [ str( cat ) for cat in categories ]
 
+   plt = get_pyplot()
+
    fig, ax = plt.subplots( figsize = ( 6, FIG_SIZE ) )
 
    ax.boxplot( values_by_cat, tick_labels = tick_labels, vert = True )
@@ -490,6 +492,8 @@ def generate_comparison_charts( df, numeric_col, category_col ):
    plt.savefig( filename, dpi = 300, bbox_inches = "tight" )
    plt.close()
 
+   return filename
+
 # ---------------------------------------------------------
 def check_for_0_ratings( df, column_name ):
 # ---------------------------------------------------------
@@ -561,74 +565,108 @@ def outlier_summary_for_column( df, column_name ):
    print( f" ... ... {summary_text}" )
       
 # ---------------------------------------------------------
-def generate_repeated_words_csv( df, column_name ):
+def generate_repeated_words_csv( df, column_name, n = 1 ):
 # ---------------------------------------------------------
    """
-   Generate repeated words table,
+   Generate repeated words ( or, for n > 1, repeated n-word phrases ) table,
    then save as .csv.
-   """   
 
-   print( f" ... ... {column_name} ... " )
-   
+   Text is streamed through word_counts.count_terms in chunks, so memory
+   grows with the vocabulary rather than with the number of tokens.
+   """
+
+   kind = NGRAM_NAMES[ n ]
+
+   print( f" ... ... {column_name} ( {kind.lower()} ) ... " )
+
    outdir = CSV_ROOT
    outdir.mkdir( parents = True, exist_ok = True )
 
    friendly_name = FRIENDLY_NAMES.get( column_name, column_name )
 
-   text_series = (
-      df[ column_name ]
-      .fillna( "" )
-      .astype( str )
-      .str.replace( r"[^a-zA-Z\s]", " ", regex = True )
-      .str.lower()
-   )
+   term_col = "word" if n == 1 else "phrase"
+   pct_col = f"percent_of_filtered_{term_col}s"
 
-   words_series = text_series.str.split().explode()
-   words_series = words_series[ words_series.str.len() > 0 ]
+   counts, total = count_terms( df[ column_name ], get_stop_words(), n )
 
-   filtered_words = words_series[ ~words_series.isin( stop_words ) ]
+   # Most frequent first; ties keep first-seen order.
+   term_counts = pd.Series( counts, dtype = "int64" ).sort_values( ascending = False, kind = "stable" )
+   repeated_counts = term_counts[ term_counts > 1 ]
 
-   if filtered_words.empty:
-      repeated_df = pd.DataFrame(
-         columns = [ "word", "count", "percent_of_filtered_words" ]
-      )
+   if repeated_counts.empty:
+      repeated_df = pd.DataFrame( columns = [ term_col, "count", pct_col ] )
    else:
-      word_counts = filtered_words.value_counts()
+      repeated_df = (
+         repeated_counts
+         .rename_axis( term_col )
+         .reset_index( name = "count" )
+      )
 
-      repeated_counts = word_counts[ word_counts > 1 ]
+      repeated_df[ pct_col ] = repeated_df[ "count" ] / total * 100.0
 
-      if repeated_counts.empty:
-         repeated_df = pd.DataFrame(
-            columns = [ "word", "count", "percent_of_filtered_words" ]
-         )
-      else:
-         total_filtered = int( filtered_words.shape[ 0 ] )
+   safe_name = friendly_name.replace( " ", "_" )
+   filename = outdir / f"Repeated{kind}_{safe_name}.csv"
 
-         repeated_df = (
-            repeated_counts
-            .rename_axis( "word" )
-            .reset_index( name = "count" )
-         )
+   repeated_df.to_csv( filename, index = False )
 
-         repeated_df[ "percent_of_filtered_words" ] = (
-            repeated_df[ "count" ] / total_filtered * 100.0
-         )
+   return filename
 
-   safe_name = friendly_name.replace( " ", "_" )
-   filename = outdir / f"RepeatedWords_{safe_name}.csv"
+# ---------------------------------------------------------
+def generate_term_lift_csv( df, by, index_path ):
+# ---------------------------------------------------------
+   """
+   Words that set each rating ( by = "Rating" ) or tag ( by = "Tag" ) apart
+   in the explanations, as count, share of the group's words and lift over
+   all explanations, then save as .csv.
+
+   df holds ID, Explanation, Rating and Tags ( both tag columns joined ).
+   Tokens come from the per-row index cached at index_path, so each group
+   is a slice of it rather than another pass over the text.
+   """
+
+   print( f" ... ... Explanation words by {by.lower()} ... " )
+
+   outdir = CSV_ROOT
+   outdir.mkdir( parents = True, exist_ok = True )
+
+   index = cached_token_index( index_path, df[ "ID" ], df[ "Explanation" ], get_stop_words() )
+
+   if by == "Rating":
+      labels = [ label for label in RATING_TEXT_LABELS.values() if label in set( df[ "Rating" ] ) ]
+      labels += sorted( set( df[ "Rating" ] ) - set( labels ) )
+      groups = { label: df.loc[ df[ "Rating" ] == label, "ID" ] for label in labels }
+   else:
+      tags = df[ [ "ID", "Tags" ] ].assign( Tag = df[ "Tags" ].str.split( "," ) ).explode( "Tag" )
+      tags[ "Tag" ] = tags[ "Tag" ].str.strip()
+      tags = tags[ tags[ "Tag" ].fillna( "" ) != "" ]
+      # Tags are case-insensitive; report each under its first spelling.
+      tags[ "Key" ] = tags[ "Tag" ].str.casefold()
+      spelling = tags.drop_duplicates( "Key" ).set_index( "Key" )[ "Tag" ]
+      groups = {
+         spelling[ key ]: rows.unique()
+         for key, rows in sorted( tags.groupby( "Key" )[ "ID" ], key = lambda item: item[ 0 ] )
+      }
+
+   table = index.lift_table( groups ).rename( columns = { "group": by } )
+
+   filename = outdir / f"TermLift_Explanation_by_{by}.csv"
+
+   table.to_csv( filename, index = False )
+
+   return filename
 
-   repeated_df.to_csv( filename, index = False )
-   
 # ---------------------------------------------------------
-def save_explanation_extract( df ):
+def save_explanation_extract( df, path = EXTRACT_OUTPUT_PATH ):
 # ---------------------------------------------------------
    """
-   Extract columns needed for tagging and save to CSV.
+   Extract columns needed for tagging and save to path
+   ( .csv, .parquet or .arrow, see table_io ).
    """
 
    print( f" ... Generating explanation extract ... " )
 
-   outdir = EXTRACT_OUTPUT_PATH.parent
+   path = Path( path )
+   outdir = path.parent
    outdir.mkdir( parents = True, exist_ok = True )
 
    rating_num_col = "Which model is more helpful, safe, and honest? (rating)"
@@ -655,66 +693,449 @@ def save_explanation_extract( df ):
       }
    )
 
-   extract_df = pd.DataFrame(
+   # Preserve existing tags if the extract already exists, following rows whose ID changed
+   if path.exists():
+      try:
+         prior_df = read_table( path, EXTRACT_TAG_COLUMNS + [ "Prompt", "ChatGPT", "Bard" ] )
+         extract_df, counts = merge_prior_tags( extract_df, prior_df )
+         print(
+            f" ... ... Tags carried over: {counts[ 'matched_by_content' ]} rows matched by content, "
+            f"{counts[ 'matched_by_id' ]} by ID, {counts[ 'new' ]} new, {counts[ 'orphaned' ]} orphaned"
+         )
+      except Exception as exc:
+         print( f" ... ... Warning: could not merge existing tags: {exc}" )
+
+   write_table( extract_df, path )
+
+   print( f" ... ... Saved extract to {path} ... " )
+   
+# ---------------------------------------------------------
+def raw_cache_paths( url ):
+# ---------------------------------------------------------
+   """
+   Cache file and metadata file for a downloaded source URL.
+   """
+
+   key = hashlib.sha1( url.encode( "utf-8" ) ).hexdigest()[ :12 ]
+   return RAW_CACHE_DIR / f"sheet-{key}.csv", RAW_CACHE_DIR / f"sheet-{key}.meta.json"
+
+# ---------------------------------------------------------
+def read_cache_meta( meta_path ):
+# ---------------------------------------------------------
+   try:
+      return json.loads( meta_path.read_text( encoding = "utf-8" ) )
+   except ( OSError, ValueError ):
+      return { }
+
+# ---------------------------------------------------------
+def cache_is_valid( cache_path, meta ):
+# ---------------------------------------------------------
+   """
+   The cached copy exists and still matches the content hash recorded for it.
+   """
+
+   if not cache_path.exists() or not meta.get( "sha256" ):
+      return False
+   return hashlib.sha256( cache_path.read_bytes() ).hexdigest() == meta[ "sha256" ]
+
+# ---------------------------------------------------------
+def fetch_cached_csv( url, offline = False, refresh = False ):
+# ---------------------------------------------------------
+   """
+   Return a local path holding the CSV at url.
+
+   The last download is cached under assets/data/raw with its sha256,
+   ETag and Last-Modified. A normal run revalidates with a conditional
+   request and reuses the cache on 304 (or when the network is down);
+   offline never touches the network; refresh always downloads.
+   """
+
+   cache_path, meta_path = raw_cache_paths( url )
+   meta = read_cache_meta( meta_path )
+   have_cache = cache_is_valid( cache_path, meta )
+
+   if offline:
+      if not have_cache:
+         raise FileNotFoundError( f"No cached copy of {url} in {RAW_CACHE_DIR}; run once without --offline." )
+      print( f" ... Offline: using cached copy from {meta.get( 'fetched_at', '?' )} ... " )
+      return cache_path
+
+   headers = { }
+   if have_cache and not refresh:
+      if meta.get( "etag" ):
+         headers[ "If-None-Match" ] = meta[ "etag" ]
+      if meta.get( "last_modified" ):
+         headers[ "If-Modified-Since" ] = meta[ "last_modified" ]
+
+   try:
+      import requests
+   except ImportError:
+      if have_cache:
+         print( " ... requests is not installed; using cached copy ... " )
+         return cache_path
+      raise
+
+   try:
+      response = requests.get( url, headers = headers, timeout = 60 )
+      response.raise_for_status()
+   except requests.exceptions.RequestException as exc:
+      if have_cache:
+         print( f" ... Download failed ({exc}); using cached copy ... " )
+         return cache_path
+      raise
+
+   if response.status_code == 304:
+      print( f" ... Source unchanged since {meta.get( 'fetched_at', '?' )}; using cached copy ... " )
+      return cache_path
+
+   content = response.content
+   digest = hashlib.sha256( content ).hexdigest()
+
+   if have_cache and digest == meta.get( "sha256" ):
+      print( f" ... Downloaded content matches cache ({digest[ :12 ]}) ... " )
+   else:
+      atomic_write( cache_path, lambda fh: fh.write( content ), keep = 0, binary = True )
+      print( f" ... Cached {len( content )} bytes ({digest[ :12 ]}) to {cache_path} ... " )
+
+   meta = {
+      "url": url,
+      "sha256": digest,
+      "bytes": len( content ),
+      "etag": response.headers.get( "ETag" ),
+      "last_modified": response.headers.get( "Last-Modified" ),
+      "fetched_at": datetime.now( timezone.utc ).isoformat( timespec = "seconds" ),
+   }
+   atomic_write( meta_path, lambda fh: json.dump( meta, fh, indent = 2 ), keep = 0 )
+
+   return cache_path
+
+# ---------------------------------------------------------
+def load_source_data( source, offline = False, refresh = False ):
+# ---------------------------------------------------------
+   """
+   Read the ratings sheet from a URL (through the local cache)
+   or from a local .csv / .parquet file.
+   """
+
+   source = str( source )
+
+   if source.startswith( ( "http://", "https://" ) ):
+      with PROFILER.artifact( "download" ):
+         path = fetch_cached_csv( source, offline = offline, refresh = refresh )
+   else:
+      path = Path( source )
+
+   with PROFILER.artifact( "read source" ):
+      if path.suffix.lower() in ( ".parquet", ".pq" ):
+         return pd.read_parquet( path )
+      return pd.read_csv( path )
+
+# ---------------------------------------------------------
+def describe_jobs( df, numeric_df ):
+# ---------------------------------------------------------
+   """
+   Describe tables for numeric columns and category tables,
+   as ( label, function, args ). Each job only carries the columns
+   it reads, so shipping it to a worker process stays cheap.
+   """
+
+   jobs = []
+
+   for col in numeric_df.columns:
+      jobs.append( ( f"describe {col}", generate_describe_table, ( numeric_df[ [ col ] ], col ) ) )
+
+   for col in [ "Prompt Category", "Complexity", "Rating", "ExplanationPresence" ]:
+      jobs.append( ( f"category {col}", generate_category_table, ( df[ [ col ] ], col ) ) )
+
+   return jobs
+
+# ---------------------------------------------------------
+def plot_jobs( df, numeric_df ):
+# ---------------------------------------------------------
+   """
+   Box/violin plots for numeric columns and rating comparison charts.
+   """
+
+   jobs = []
+
+   for col in numeric_df.columns:
+      jobs.append( ( f"plot {col}", generate_plot_charts, ( numeric_df[ [ col ] ], col ) ) )
+
+   for col in [ "PromptLengthBin", "Prompt Category", "Complexity" ]:
+      jobs.append( ( f"comparison {col}", generate_comparison_charts, ( df[ [ rating_col, col ] ], rating_col, col ) ) )
+
+   return jobs
+
+# ---------------------------------------------------------
+def crosstab_jobs( df ):
+# ---------------------------------------------------------
+   return [
+      ( f"crosstab {col}", generate_crosstab_csv, ( df[ [ rating_col, col ] ], rating_col, col ) )
+      for col in [ "PromptLengthBin", "Prompt Category", "Complexity" ]
+   ]
+
+# ---------------------------------------------------------
+def words_jobs( df, extract_path = EXTRACT_OUTPUT_PATH ):
+# ---------------------------------------------------------
+   return [
+      ( f"repeated {NGRAM_NAMES[ n ].lower()} {col}", generate_repeated_words_csv, ( df[ [ col ] ], col, n ) )
+      for col in WORD_COLUMNS
+      for n in NGRAM_NAMES
+   ] + term_lift_jobs( df, extract_path )
+
+# ---------------------------------------------------------
+def term_lift_jobs( df, extract_path = EXTRACT_OUTPUT_PATH ):
+# ---------------------------------------------------------
+   """
+   Explanation words by rating and by tag. Rows are numbered like the
+   extract, whose current tags are joined on by ID when it exists. The
+   token index is cached beside the extract.
+   """
+
+   extract_path = Path( extract_path )
+
+   frame = pd.DataFrame(
       {
-         "ID": extract_df[ "ID" ],
-         "Rating": extract_df[ "Rating" ],
-         "Prompt Category": extract_df[ "Prompt Category" ],
-         "Prompt": extract_df[ "Prompt" ],
-         "ChatGPT": extract_df[ "ChatGPT" ],
-         "Bard": extract_df[ "Bard" ],
-         "Explanation": extract_df[ "Explanation" ],
-         "Tags - ChatGPT": extract_df[ "Tags - ChatGPT" ],
-         "Tags - Bard": extract_df[ "Tags - Bard" ],
+         "ID": np.arange( 1, len( df ) + 1 ),
+         "Explanation": df[ "Explanation" ].fillna( "" ).astype( str ).to_numpy(),
+         "Rating": (
+            pd.to_numeric( df[ rating_col ], errors = "coerce" )
+            .map( RATING_TEXT_LABELS )
+            .fillna( "Missing" )
+            .to_numpy()
+         ),
+         "Tags": "",
       }
    )
 
-   # Preserve existing tags if the extract already exists (even if row count changed)
-   if EXTRACT_OUTPUT_PATH.exists():
-      try:
-         prior_df = pd.read_csv( EXTRACT_OUTPUT_PATH, keep_default_na = False )
-         if "ID" in prior_df.columns:
-            prior_df = prior_df.set_index( "ID" )
-            extract_df = extract_df.set_index( "ID" )
-
-            common_ids = prior_df.index.intersection( extract_df.index )
-            if len( common_ids ) > 0:
-               for col in [ "Tags - ChatGPT", "Tags - Bard", "ChatGPT", "Bard" ]:
-                  if col in prior_df.columns and col in extract_df.columns:
-                     extract_df.loc[ common_ids, col ] = prior_df.loc[ common_ids, col ]
-
-            extract_df = extract_df.reset_index()
+   if extract_path.exists() and set( EXTRACT_TAG_COLUMNS ) <= set( read_columns( extract_path ) ):
+      extract = read_table( extract_path, EXTRACT_TAG_COLUMNS )
+      tags = extract[ "Tags - ChatGPT" ] + "," + extract[ "Tags - Bard" ]
+      by_id = pd.Series( tags.to_numpy(), index = pd.to_numeric( extract[ "ID" ], errors = "coerce" ) )
+      by_id = by_id[ by_id.index.notna() & ~by_id.index.duplicated() ]
+      frame[ "Tags" ] = frame[ "ID" ].map( by_id ).fillna( "" ).to_numpy()
+
+   return [
+      ( f"term lift Explanation by {by}", generate_term_lift_csv, ( frame, by, extract_path.with_suffix( ".tokens.npz" ) ) )
+      for by in [ "Rating", "Tag" ]
+   ]
+
+# ---------------------------------------------------------
+def init_render_worker( ):
+# ---------------------------------------------------------
+   """
+   Worker processes render off-screen with their own pyplot state.
+   """
+
+   if "matplotlib.pyplot" in sys.modules:
+      get_pyplot().close( "all" )
+   else:
+      os.environ[ "MPLBACKEND" ] = "Agg"
+
+# ---------------------------------------------------------
+def run_render_job( fn, args, profile = False ):
+# ---------------------------------------------------------
+   """
+   Run one generator. With profile, return ( output, timings ) so that
+   jobs measured in a worker process can report back.
+   """
+
+   try:
+      if not profile:
+         return fn( *args )
+      with measure() as stats:
+         output = fn( *args )
+      return output, stats
+   finally:
+      if "matplotlib.pyplot" in sys.modules:
+         get_pyplot().close( "all" )
+
+# ---------------------------------------------------------
+def run_jobs( jobs, n_jobs ):
+# ---------------------------------------------------------
+   """
+   Run generator jobs inline ( n_jobs <= 1 ) or across a process pool.
+   Output paths are decided by the generators, so they are identical
+   either way.
+
+   Returns ( outputs, errors ): the path each successful job wrote,
+   keyed by label, and the exceptions of the jobs that failed.
+   """
+
+   outputs = {}
+   errors = []
+   profile = PROFILER.enabled
+
+   def finished( label, result ):
+      if profile:
+         result, stats = result
+         PROFILER.add( label, stats )
+      outputs[ label ] = result
+
+   if n_jobs <= 1:
+      init_render_worker()
+      for label, fn, args in jobs:
+         try:
+            finished( label, run_render_job( fn, args, profile ) )
+         except Exception as exc:
+            print( f" ... ... Failed: {label}: {exc}" )
+            errors.append( exc )
+      return outputs, errors
+
+   with ProcessPoolExecutor( max_workers = n_jobs, initializer = init_render_worker ) as pool:
+      futures = { pool.submit( run_render_job, fn, args, profile ): label for label, fn, args in jobs }
+      for future in as_completed( futures ):
+         exc = future.exception()
+         if exc is not None:
+            print( f" ... ... Failed: {futures[ future ]}: {exc}" )
+            errors.append( exc )
          else:
-            overlap = min( len( prior_df ), len( extract_df ) )
-            if overlap > 0:
-               if "Tags - ChatGPT" in prior_df.columns:
-                  extract_df.loc[ :overlap - 1, "Tags - ChatGPT" ] = prior_df.loc[ :overlap - 1, "Tags - ChatGPT" ]
-               if "Tags - Bard" in prior_df.columns:
-                  extract_df.loc[ :overlap - 1, "Tags - Bard" ] = prior_df.loc[ :overlap - 1, "Tags - Bard" ]
-               if "ChatGPT" in prior_df.columns:
-                  extract_df.loc[ :overlap - 1, "ChatGPT" ] = prior_df.loc[ :overlap - 1, "ChatGPT" ]
-               if "Bard" in prior_df.columns:
-                  extract_df.loc[ :overlap - 1, "Bard" ] = prior_df.loc[ :overlap - 1, "Bard" ]
-      except Exception as exc:
-         print( f" ... ... Warning: could not merge existing tags: {exc}" )
+            finished( futures[ future ], future.result() )
 
-   extract_df.to_csv( EXTRACT_OUTPUT_PATH, index = False )
+   return outputs, errors
 
-   print( f" ... ... Saved extract to {EXTRACT_OUTPUT_PATH} ... " )
-   
 # ---------------------------------------------------------
-# Start Main Processing
+def settings_fingerprint( ):
 # ---------------------------------------------------------
+   """
+   Shared settings every generator depends on, including the versions of
+   the libraries that draw and format the outputs.
+   """
 
-try:
-   
-   print( f"Starting" )
-   
-   print( f"Reading data in from {gsheet_url} ... " )
+   try:
+      matplotlib_version = importlib.metadata.version( "matplotlib" )
+   except importlib.metadata.PackageNotFoundError:
+      matplotlib_version = None
+
+   return repr(
+      ( OUTPUT_VERSION, FIG_SIZE, FRIENDLY_NAMES, RATING_TEXT_LABELS, pd.__version__, matplotlib_version )
+   ).encode( "utf-8" )
+
+# ---------------------------------------------------------
+def helper_sources( fn ):
+# ---------------------------------------------------------
+   """
+   Source of the code fn calls from this directory: functions defined in
+   analyze.py, and the whole module for helpers imported from a sibling
+   module ( word_counts, crosstab, ... ), in a stable order.
+   """
+
+   here = Path( __file__ ).resolve().parent
+   names = set()
+   codes = [ fn.__code__ ]
+   while codes:
+      code = codes.pop()
+      names.update( code.co_names )
+      codes.extend( const for const in code.co_consts if inspect.iscode( const ) )
+
+   sources = {}
+   for name in sorted( names ):
+      obj = globals().get( name )
+      if obj is None or obj is fn:
+         continue
+      module = obj if inspect.ismodule( obj ) else inspect.getmodule( obj )
+      module_file = getattr( module, "__file__", None )
+      if module_file is None or Path( module_file ).resolve().parent != here:
+         continue
+      if module is sys.modules[ __name__ ]:
+         if inspect.isfunction( obj ):
+            sources[ name ] = inspect.getsource( obj )
+      else:
+         sources[ module.__name__ ] = inspect.getsource( module )
+
+   return [ sources[ key ] for key in sorted( sources ) ]
+
+# ---------------------------------------------------------
+def job_fingerprint( fn, args, settings ):
+# ---------------------------------------------------------
+   """
+   Hash of a job's input columns, its parameters, the generator's code and
+   the helper code it calls ( see helper_sources ).
+   """
+
+   digest = hashlib.sha256()
+   digest.update( inspect.getsource( fn ).encode( "utf-8" ) )
+   for source in helper_sources( fn ):
+      digest.update( source.encode( "utf-8" ) )
+   digest.update( settings )
+
+   # Only the word counts depend on the stop-word list; avoid loading nltk otherwise.
+   if fn in ( generate_repeated_words_csv, generate_term_lift_csv ):
+      digest.update( repr( sorted( get_stop_words() ) ).encode( "utf-8" ) )
+
+   for arg in args:
+      if isinstance( arg, pd.DataFrame ):
+         schema = [ ( str( col ), str( arg[ col ].dtype ) ) for col in arg.columns ]
+         digest.update( repr( schema ).encode( "utf-8" ) )
+         digest.update( pd.util.hash_pandas_object( arg, index = True ).values.tobytes() )
+      else:
+         digest.update( repr( arg ).encode( "utf-8" ) )
+
+   return digest.hexdigest()
+
+# ---------------------------------------------------------
+def load_manifest( ):
+# ---------------------------------------------------------
+   try:
+      return json.loads( MANIFEST_PATH.read_text( encoding = "utf-8" ) )
+   except ( OSError, ValueError ):
+      return {}
+
+# ---------------------------------------------------------
+def run_incremental( jobs, n_jobs, force = False ):
+# ---------------------------------------------------------
+   """
+   Run only the jobs whose fingerprint differs from output/manifest.json
+   ( or whose output is missing ), then record the new fingerprints and
+   print what was rebuilt versus skipped.
+   """
+
+   manifest = load_manifest()
+   settings = settings_fingerprint()
+
+   fingerprints = {}
+   stale = []
+
+   for label, fn, args in jobs:
+      fingerprints[ label ] = job_fingerprint( fn, args, settings )
+      entry = manifest.get( label, {} )
+      output = entry.get( "output" )
+      up_to_date = (
+         not force
+         and entry.get( "fingerprint" ) == fingerprints[ label ]
+         and output
+         and ( BASE_ASSETS_DIR / output ).exists()
+      )
+      if not up_to_date:
+         stale.append( ( label, fn, args ) )
+
+   outputs, errors = run_jobs( stale, n_jobs )
+
+   new_manifest = {}
+   for label, _, _ in jobs:
+      if label in outputs:
+         output = Path( outputs[ label ] ).resolve().relative_to( BASE_ASSETS_DIR )
+         new_manifest[ label ] = { "fingerprint": fingerprints[ label ], "output": output.as_posix() }
+      elif label in manifest and all( label != s[ 0 ] for s in stale ):
+         new_manifest[ label ] = manifest[ label ]
 
-   df = pd.read_csv( gsheet_url )
+   atomic_write( MANIFEST_PATH, lambda fh: json.dump( new_manifest, fh, indent = 2, sort_keys = True ), keep = 0 )
+
+   skipped = len( jobs ) - len( stale )
+   print( f" ... ... Rebuilt {len( outputs )}, skipped {skipped} up-to-date, failed {len( errors )} ... " )
+   for label in sorted( outputs ):
+      print( f" ... ... ... rebuilt: {label}" )
+
+   if errors:
+      raise errors[ 0 ]
+
+# ---------------------------------------------------------
+def prepare_data( df ):
+# ---------------------------------------------------------
+   """
+   Add the derived length, rating and bin columns the generators use.
+   """
 
-   # ADD COLUMNS
    df['PromptLength'] = df['Prompt'].str.len()
    df['ChatGPTLength'] = df['ChatGPT'].str.len()
    df['BardLength'] = df['Bard'].str.len()
@@ -750,50 +1171,230 @@ try:
       ordered = True,
    )
 
+   return df
+
+# ---------------------------------------------------------
+def run_describe( df, args ):
+# ---------------------------------------------------------
    numeric_df = df.select_dtypes( include='number' )
 
-   # ---------------------------------------------------------
-   # Generate and save figures
-   # ---------------------------------------------------------
-   
-   print( f" ... Generating data description tables for column ... ")
-   for col in numeric_df.columns:
-      generate_describe_table( numeric_df, col ) 
-   
-   print( f" ... Generating outlier summaries for column ... ")
-   for col in numeric_df.columns:
-      outlier_summary_for_column( numeric_df, col )
+   print( f" ... Generating data description and category tables ... " )
+   with PROFILER.stage( "describe" ):
+      run_incremental( describe_jobs( df, numeric_df ), args.jobs, force = args.force )
 
-   print( f" ... Generating box/violin plots for column ... ")
-   for col in numeric_df.columns:
-      generate_plot_charts( numeric_df, col )  
+   run_summaries( df, numeric_df )
 
-   print( f" ... Generating category tables for column ... ")
-   for col in [ "Prompt Category", "Complexity", "Rating", "ExplanationPresence" ]:
-      generate_category_table( df, col )
-      
+# ---------------------------------------------------------
+def run_summaries( df, numeric_df ):
+# ---------------------------------------------------------
+   """
+   Console-only outlier and zero-rating summaries.
+   """
+
+   with PROFILER.stage( "summaries" ):
+      print( f" ... Generating outlier summaries for column ... ")
+      for col in numeric_df.columns:
+         outlier_summary_for_column( numeric_df, col )
+
+      print( f" ... Checking for Options without ratings for column  ... ")
+      for col in [ "Prompt Category", "Complexity" ]:
+         check_for_0_ratings( df, col )
+
+# ---------------------------------------------------------
+def run_plots( df, args ):
+# ---------------------------------------------------------
+   numeric_df = df.select_dtypes( include='number' )
+
+   print( f" ... Generating box/violin plots and comparison charts ... " )
+   with PROFILER.stage( "plots" ):
+      run_incremental( plot_jobs( df, numeric_df ), args.jobs, force = args.force )
+
+# ---------------------------------------------------------
+def run_crosstabs( df, args ):
+# ---------------------------------------------------------
    print( f" ... Generating crosstab csv for column ... ")
-   for col in [ "PromptLengthBin", "Prompt Category", "Complexity" ]:
-      generate_crosstab_csv( df, rating_col, col )
-      
-   print( f" ... Generating comparison charts for column ... ")
-   for col in [ "PromptLengthBin", "Prompt Category", "Complexity" ]:
-      generate_comparison_charts( df, rating_col, col )
-   
-   print( f" ... Checking for Options without ratings for column  ... ")
-   for col in [ "Prompt Category", "Complexity" ]:
-      check_for_0_ratings( df, col )
+   with PROFILER.stage( "crosstabs" ):
+      run_incremental( crosstab_jobs( df ), args.jobs, force = args.force )
 
+# ---------------------------------------------------------
+def run_words( df, args ):
+# ---------------------------------------------------------
    print( f" ... Generating repeated words .CSV for column ... " )
-   for col in [ "Explanation" ]:
-      generate_repeated_words_csv( df, col )
+   with PROFILER.stage( "words" ):
+      run_incremental( words_jobs( df, args.extract ), args.jobs, force = args.force )
 
+# ---------------------------------------------------------
+def run_extract( df, args ):
+# ---------------------------------------------------------
    print( f" ... Generating extract for explanations ... " )
-   save_explanation_extract( df )
+   with PROFILER.stage( "extract" ), PROFILER.artifact( "save_explanation_extract" ):
+      save_explanation_extract( df, args.extract )
+
+# ---------------------------------------------------------
+def run_all( df, args ):
+# ---------------------------------------------------------
+   """
+   Every figure and CSV in one job batch, then the console
+   summaries and the extract.
+   """
+
+   numeric_df = df.select_dtypes( include='number' )
+
+   jobs = (
+      describe_jobs( df, numeric_df )
+      + plot_jobs( df, numeric_df )
+      + crosstab_jobs( df )
+      + words_jobs( df, args.extract )
+   )
 
-except requests.exceptions.RequestException as e:
-   print(f"Error fetching the file from URL: {e}")   
+   print( f" ... Generating figures and CSVs ( {args.jobs} job(s) ) ... " )
+   with PROFILER.stage( "figures and CSVs" ):
+      run_incremental( jobs, args.jobs, force = args.force )
+
+   run_summaries( df, numeric_df )
+
+   run_extract( df, args )
+
+COMMANDS = {
+   "all": ( run_all, "Every figure, CSV and the extract (default)." ),
+   "describe": ( run_describe, "Describe and category tables, outlier and zero-rating summaries." ),
+   "plots": ( run_plots, "Box/violin plots and rating comparison charts." ),
+   "crosstabs": ( run_crosstabs, "Rating crosstab CSVs." ),
+   "words": ( run_words, "Repeated words / phrases and explanation word lift CSVs." ),
+   "extract": ( run_extract, "Explanations extract for the tagger." ),
+}
 
 # ---------------------------------------------------------
-print( 'Fini' )
+def add_common_options( parser, defaults = True ):
 # ---------------------------------------------------------
+   """
+   Options accepted both before and after the subcommand. Subcommand
+   copies get no defaults so they cannot overwrite values given earlier.
+   """
+
+   def default( value ):
+      return value if defaults else argparse.SUPPRESS
+
+   parser.add_argument(
+      "--source",
+      default = default( gsheet_url ),
+      help = "Sheet URL, or a local .csv / .parquet file (default: the Google Sheet export).",
+   )
+   parser.add_argument(
+      "--extract",
+      type = Path,
+      default = default( EXTRACT_OUTPUT_PATH ),
+      help = "Explanations extract to write and read tags from: .csv, .parquet or .arrow "
+             "(default: assets/data/extract/explanations.csv). Parquet and Arrow need pyarrow.",
+   )
+   parser.add_argument(
+      "--jobs",
+      type = int,
+      default = default( os.cpu_count() or 1 ),
+      help = "Worker processes for figure and CSV generation (default: all cores; 1 runs inline).",
+   )
+   parser.add_argument(
+      "--force",
+      action = "store_true",
+      default = default( False ),
+      help = "Regenerate every figure and CSV even if its inputs are unchanged.",
+   )
+   mode = parser.add_mutually_exclusive_group()
+   mode.add_argument(
+      "--offline",
+      action = "store_true",
+      default = default( False ),
+      help = "Use the cached download only; never touch the network.",
+   )
+   mode.add_argument(
+      "--refresh",
+      action = "store_true",
+      default = default( False ),
+      help = "Ignore the cache and download the source again.",
+   )
+   parser.add_argument(
+      "--profile",
+      nargs = "?",
+      type = Path,
+      const = PROFILE_DIR,
+      default = default( None ),
+      metavar = "DIR",
+      help = "Time every stage and generated artifact ( wall, CPU, peak memory ), print a summary "
+             "and save it as DIR/summary.csv (default DIR: output/profile). Memory tracing slows "
+             "the run; only rebuilt artifacts are measured, so add --force for a full profile.",
+   )
+   parser.add_argument(
+      "--profile-stats",
+      action = "store_true",
+      default = default( False ),
+      help = "With --profile, also dump cProfile stats per stage to DIR ( main process only; "
+             "use --jobs 1 to include the generators ).",
+   )
+
+# ---------------------------------------------------------
+def parse_args( argv = None ):
+# ---------------------------------------------------------
+   parser = argparse.ArgumentParser( description = "Analyze the ChatGPT vs. Bard human evaluation sheet." )
+   add_common_options( parser )
+
+   subparsers = parser.add_subparsers( dest = "command" )
+   for name, ( _, help_text ) in COMMANDS.items():
+      add_common_options( subparsers.add_parser( name, help = help_text ), defaults = False )
+
+   args = parser.parse_args( argv )
+   args.command = args.command or "all"
+
+   try:
+      check_table_path( args.extract )
+   except ( ValueError, ImportError ) as exc:
+      parser.error( str( exc ) )
+   if args.profile_stats and args.profile is None:
+      parser.error( "--profile-stats needs --profile" )
+   return args
+
+# ---------------------------------------------------------
+def main( argv = None ):
+# ---------------------------------------------------------
+   global PROFILER
+
+   args = parse_args( argv )
+   configure_pandas()
+
+   PROFILER = Profiler(
+      enabled = args.profile is not None,
+      stats_dir = args.profile if args.profile_stats else None,
+   )
+
+   try:
+
+      print( f"Starting" )
+
+      print( f"Reading data in from {args.source} ... " )
+
+      with PROFILER.stage( "download" ):
+         raw_df = load_source_data( args.source, offline = args.offline, refresh = args.refresh )
+
+      with PROFILER.stage( "prepare_data" ):
+         df = prepare_data( raw_df )
+
+      COMMANDS[ args.command ][ 0 ]( df, args )
+
+   except OSError as e:
+      # requests' RequestException is an OSError too
+      print( f"Error reading source: {e}" )
+      return 1
+
+   if PROFILER.enabled:
+      PROFILER.report( args.profile )
+
+   # ---------------------------------------------------------
+   print( 'Fini' )
+   # ---------------------------------------------------------
+   return 0
+
+# ---------------------------------------------------------
+# Start Main Processing
+# ---------------------------------------------------------
+
+if __name__ == "__main__":
+   sys.exit( main() )
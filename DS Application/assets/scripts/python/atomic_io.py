@@ -0,0 +1,135 @@
+import os
+import shutil
+import tempfile
+from datetime import datetime
+from pathlib import Path
+
+
+# Number of previous versions kept next to each file in snapshots/.
+KEEP_SNAPSHOTS = 10
+
+# Read once at import: os.umask can only be queried by setting it, which races with other threads.
+_UMASK = os.umask( 0 )
+os.umask( _UMASK )
+
+
+def snapshot_dir( path ):
+   return Path( path ).parent / "snapshots"
+
+
+def list_snapshots( path ):
+   """
+   Snapshots of path, oldest first.
+   """
+   path = Path( path )
+   folder = snapshot_dir( path )
+   if not folder.exists( ):
+      return [ ]
+   return sorted( folder.glob( f"{path.stem}.*{path.suffix}" ) )
+
+
+def _fsync_dir( folder ):
+   try:
+      fd = os.open( folder, os.O_RDONLY )
+   except OSError:
+      return
+   try:
+      os.fsync( fd )
+   except OSError:
+      pass
+   finally:
+      os.close( fd )
+
+
+def _copy_mode( path, tmp_name ):
+   # mkstemp creates 0600 files; give the replacement the mode path has,
+   # or the one open() would have given a new file.
+   if path.exists( ):
+      shutil.copymode( path, tmp_name )
+   else:
+      os.chmod( tmp_name, 0o666 & ~_UMASK )
+
+
+def _take_snapshot( path, keep ):
+   """
+   Preserve the current file under snapshots/ before it is replaced, then
+   prune to the newest `keep`. A hard link is enough because the live file
+   is always swapped out by rename, never rewritten in place.
+   """
+   if keep <= 0 or not path.exists( ):
+      return None
+
+   folder = snapshot_dir( path )
+   folder.mkdir( parents = True, exist_ok = True )
+
+   stamp = datetime.now( ).strftime( "%Y%m%dT%H%M%S%f" )
+   target = folder / f"{path.stem}.{stamp}{path.suffix}"
+
+   try:
+      os.link( path, target )
+   except OSError:
+      shutil.copy2( path, target )
+
+   for old in list_snapshots( path )[ :-keep ]:
+      old.unlink( missing_ok = True )
+
+   return target
+
+
+def atomic_write( path, write_fn, keep = KEEP_SNAPSHOTS, binary = False ):
+   """
+   Write path crash-safely: write_fn( fh ) fills a temp file in the same
+   directory, which is fsynced and renamed over path with path's permissions.
+   The previous version is kept as a rotating snapshot.
+   """
+   path = Path( path )
+   path.parent.mkdir( parents = True, exist_ok = True )
+
+   fd, tmp_name = tempfile.mkstemp( dir = path.parent, prefix = f".{path.name}.", suffix = ".tmp" )
+   try:
+      if binary:
+         fh = os.fdopen( fd, "wb" )
+      else:
+         fh = os.fdopen( fd, "w", encoding = "utf-8", newline = "" )
+      with fh:
+         write_fn( fh )
+         fh.flush( )
+         os.fsync( fh.fileno( ) )
+
+      _copy_mode( path, tmp_name )
+      _take_snapshot( path, keep )
+      os.replace( tmp_name, path )
+      _fsync_dir( path.parent )
+   except BaseException:
+      Path( tmp_name ).unlink( missing_ok = True )
+      raise
+
+
+def atomic_write_csv( df, path, keep = KEEP_SNAPSHOTS ):
+   atomic_write( path, lambda fh: df.to_csv( fh, index = False ), keep )
+
+
+def restore_snapshot( path, name = None, keep = KEEP_SNAPSHOTS ):
+   """
+   Roll path back to a snapshot (the newest one unless name is given).
+   The current file is itself snapshotted first, so a restore can be undone.
+   Returns the snapshot that was restored.
+   """
+   path = Path( path )
+   snapshots = list_snapshots( path )
+   if not snapshots:
+      raise FileNotFoundError( f"No snapshots found for {path}" )
+
+   if name is None:
+      source = snapshots[ -1 ]
+   else:
+      matches = [ s for s in snapshots if s.name == name or s.name == Path( name ).name ]
+      if not matches:
+         raise FileNotFoundError( f"Snapshot {name} not found in {snapshot_dir( path )}" )
+      source = matches[ 0 ]
+
+   content = source.read_bytes( )
+
+   # Keep one extra so the snapshot being restored survives the rotation.
+   atomic_write( path, lambda fh: fh.write( content ), keep + 1, binary = True )
+   return source
@@ -0,0 +1,578 @@
+import argparse
+import contextlib
+import io
+import json
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import analyze
+import tag_server
+from table_io import read_table, write_table
+
+
+BASE_DIR = Path( __file__ ).resolve().parents[ 3 ]
+REPORT_DIR = BASE_DIR / "output/benchmarks"
+
+# Bump when the report layout changes so --compare can refuse mismatched files.
+REPORT_SCHEMA = 1
+
+DEFAULT_SIZES = "1k,40k,400k,4M"
+
+# Distinct base texts per column; each row appends its own word so no two rows match.
+TEXT_POOL = 2048
+
+# ( median words, lognormal sigma, share empty ), fitted to the real sheet.
+TEXT_SHAPES = {
+   "Prompt": ( 44, 1.54, 0.0 ),
+   "ChatGPT": ( 147, 0.63, 0.0 ),
+   "Bard": ( 159, 0.44, 0.0 ),
+   "Explanation": ( 32, 0.40, 0.22 ),
+}
+MAX_TEXT_WORDS = 2000
+
+VOCABULARY_SIZE = 20000
+
+COMMON_WORDS = (
+   "the a to and of is in that it for on with as was be this are by or not "
+   "but an at from have has i you response chatgpt bard more better answer "
+   "prompt because both model question information code user than also"
+).split()
+
+CATEGORIES = [
+   "Adversarial Dishonesty", "Adversarial Harmfulness", "Brainstorming", "Classification",
+   "Closed QA", "Coding", "Creative Writing", "Extraction", "Mathematical Reasoning",
+   "Open QA", "Poetry", "Rewriting", "Summarization",
+]
+COMPLEXITY = { "High": 0.354, "Medium": 0.33, "Low": 0.316 }
+RATING_SHARES = np.array( [ 0.057, 0.093, 0.096, 0.163, 0.159, 0.192, 0.241 ] )
+RATING_SHARES /= RATING_SHARES.sum()
+
+TAGS = [
+   "agent followed instructions",
+   "agent failed to follow all instructions",
+   "agent's response included information not requested",
+   "agent addressed harmfulness of prompt",
+   "agent's response provided accurate information",
+   "agent's response felt honest",
+   "agent's response was well-reasoned",
+   "agent's response provided an incorrect solution",
+   "agent's response successfuly adopted requested personality",
+   "agent's response missed key elements of request",
+   "agent's response felt dishonest",
+   "agent failed to directly address harmfulness of prompt",
+   "agent's code was functional",
+   "agent's response contained inaccuracies",
+   "agent's response was concise",
+   "agent's response was verbose",
+   "agent's response was well formatted",
+   "agent refused the request",
+   "agent asked a clarifying question",
+   "agent's code did not run",
+   "agent's math was wrong",
+   "agent's summary was faithful",
+   "agent's poem followed the requested form",
+   "agent's response was repetitive",
+]
+MISSING_TAG = "worker did not provide an explanation"
+
+# Tags per side on an explanation-bearing row: share with 0, 1, 2 and 3 tags.
+TAG_COUNT_SHARES = [ 0.45, 0.35, 0.15, 0.05 ]
+
+# --compare flags an entry whose median grew by more than this fraction ...
+REGRESSION_TOLERANCE = 0.25
+# ... unless it still takes less than this many seconds ( timer noise ).
+NOISE_FLOOR_S = 0.005
+
+
+def parse_size( text ):
+   text = text.strip().lower()
+   scale = { "k": 1000, "m": 1000000 }.get( text[ -1: ], 1 )
+   return int( float( text.rstrip( "km" ) ) * scale )
+
+
+def size_label( n ):
+   for scale, suffix in ( ( 1000000, "M" ), ( 1000, "k" ) ):
+      if n >= scale and n % scale == 0:
+         return f"{n // scale}{suffix}"
+   return str( n )
+
+
+def _zipf_weights( n, exponent = 1.1 ):
+   weights = 1.0 / np.arange( 1, n + 1 ) ** exponent
+   return weights / weights.sum()
+
+
+def _pseudo_words( rng, n ):
+   letters = np.array( list( "abcdefghijklmnopqrstuvwxyz" ) )
+   lengths = rng.integers( 3, 11, size = n )
+   words = sorted( { "".join( rng.choice( letters, size = length ) ) for length in lengths } - set( COMMON_WORDS ) )
+   # Sorted first so the seed alone fixes the order, then shuffled so rank is not alphabetical.
+   return [ words[ i ] for i in rng.permutation( len( words ) ) ]
+
+
+def _row_word( i ):
+   # A letters-only word unique to row i, so every row has distinct content.
+   word = ""
+   i += 1
+   while i:
+      i, digit = divmod( i - 1, 26 )
+      word = chr( 97 + digit ) + word
+   return "zq" + word
+
+
+def synthesize_texts( rng, n, vocabulary, weights, shape, text_scale ):
+   median, sigma, empty_share = shape
+   lengths = np.clip(
+      np.round( rng.lognormal( np.log( median * text_scale ), sigma, size = TEXT_POOL ) ), 1, MAX_TEXT_WORDS
+   ).astype( int )
+   tokens = rng.choice( len( vocabulary ), size = lengths.sum(), p = weights )
+   pool = [ ]
+   start = 0
+   for length in lengths:
+      words = [ vocabulary[ t ] for t in tokens[ start:start + length ] ]
+      words[ 0 ] = words[ 0 ].capitalize()
+      pool.append( " ".join( words ) + "." )
+      start += length
+
+   picks = rng.integers( 0, TEXT_POOL, size = n )
+   empty = rng.random( n ) < empty_share
+   return [
+      "" if empty[ i ] else f"{pool[ picks[ i ] ]} {_row_word( i )}"
+      for i in range( n )
+   ]
+
+
+def synthesize_sheet( n, seed = 0, text_scale = 1.0 ):
+   """
+   A source sheet of n rows shaped like the real one: same columns, text
+   lengths, rating, category and complexity mix.
+   """
+   rng = np.random.default_rng( seed )
+   vocabulary = COMMON_WORDS + _pseudo_words( rng, VOCABULARY_SIZE )
+   weights = _zipf_weights( len( vocabulary ) )
+
+   texts = {
+      col: synthesize_texts( rng, n, vocabulary, weights, shape, text_scale )
+      for col, shape in TEXT_SHAPES.items()
+   }
+
+   ratings = rng.choice( np.arange( 1, 8 ), size = n, p = RATING_SHARES )
+   rating_text = np.array( [ analyze.RATING_TEXT_LABELS[ r ].rsplit( " (", 1 )[ 0 ] for r in range( 1, 8 ) ] )
+
+   return pd.DataFrame(
+      {
+         **texts,
+         analyze.rating_col: ratings,
+         "Which model is more helpful, safe, and honest? (text)": rating_text[ ratings - 1 ],
+         "Prompt Category": rng.choice( CATEGORIES, size = n ),
+         "Complexity": rng.choice( list( COMPLEXITY ), size = n, p = list( COMPLEXITY.values() ) ),
+      }
+   )
+
+
+def synthesize_tags( extract_df, seed = 0 ):
+   """
+   Fill both tag columns the way a tagged extract looks: a few tags per
+   side, common tags far more often than rare ones, and the missing
+   explanation tag on rows without an explanation.
+   """
+   rng = np.random.default_rng( seed + 1 )
+   n = len( extract_df )
+   weights = _zipf_weights( len( TAGS ), 0.9 )
+   missing = extract_df[ "Explanation" ].fillna( "" ).astype( str ).str.strip().eq( "" ).to_numpy()
+
+   tagged = extract_df.copy()
+   for col in tag_server.TAG_COLUMNS:
+      counts = rng.choice( len( TAG_COUNT_SHARES ), size = n, p = TAG_COUNT_SHARES )
+      picks = rng.choice( len( TAGS ), size = ( n, len( TAG_COUNT_SHARES ) - 1 ), p = weights )
+      values = [ ]
+      for i in range( n ):
+         if missing[ i ]:
+            values.append( MISSING_TAG )
+         else:
+            values.append( ", ".join( dict.fromkeys( TAGS[ t ] for t in picks[ i, :counts[ i ] ] ) ) )
+      tagged[ col ] = values
+   return tagged
+
+
+def summarize( runs, **extra ):
+   entry = {
+      "runs": [ round( r, 6 ) for r in runs ],
+      "min": round( min( runs ), 6 ),
+      "median": round( statistics.median( runs ), 6 ),
+   }
+   entry.update( extra )
+   return entry
+
+
+@contextlib.contextmanager
+def quiet( ):
+   with contextlib.redirect_stdout( io.StringIO() ), contextlib.redirect_stderr( io.StringIO() ):
+      yield
+
+
+def timed( fn, *args ):
+   start = time.perf_counter()
+   result = fn( *args )
+   return time.perf_counter() - start, result
+
+
+def bench_analyze( sheet, workdir, repeat, plots ):
+   """
+   Time prepare_data, every generator job ( grouped by stage ) and the
+   extract, writing into workdir instead of the repo's output folders.
+   """
+   analyze.CSV_ROOT = workdir / "csv"
+   analyze.FIGURES_ROOT = workdir / "figures"
+   extract_path = workdir / "explanations.csv"
+   timings = { }
+
+   with quiet( ):
+      runs = [ ]
+      for _ in range( repeat ):
+         seconds, df = timed( analyze.prepare_data, sheet.copy() )
+         runs.append( seconds )
+      timings[ "analyze/prepare_data" ] = summarize( runs )
+
+      seconds, _ = timed( analyze.save_explanation_extract, df, extract_path )
+      timings[ "analyze/extract (new)" ] = summarize( [ seconds ] )
+
+      tagged = synthesize_tags( read_table( extract_path ) )
+      write_table( tagged, extract_path, keep = 0 )
+
+      runs = [ ]
+      for _ in range( repeat ):
+         seconds, _ = timed( analyze.save_explanation_extract, df, extract_path )
+         runs.append( seconds )
+      timings[ "analyze/extract (merge)" ] = summarize( runs )
+
+      numeric_df = df.select_dtypes( include = "number" )
+      stages = {
+         "describe": lambda: analyze.describe_jobs( df, numeric_df ),
+         "crosstabs": lambda: analyze.crosstab_jobs( df ),
+         "words": lambda: [ job for job in analyze.words_jobs( df, extract_path ) if not job[ 0 ].startswith( "term lift" ) ],
+         "term_lift": lambda: analyze.term_lift_jobs( df, extract_path ),
+      }
+      if plots:
+         stages[ "plots" ] = lambda: analyze.plot_jobs( df, numeric_df )
+
+      analyze.init_render_worker()
+      for stage, make_jobs in stages.items():
+         stage_runs = [ ]
+         for _ in range( repeat ):
+            seconds, jobs = timed( make_jobs )
+            for label, fn, args in jobs:
+               job_seconds, _ = timed( analyze.run_render_job, fn, args )
+               timings.setdefault( f"analyze/{stage}/{label}", [ ] ).append( job_seconds )
+               seconds += job_seconds
+            stage_runs.append( seconds )
+         timings[ f"analyze/{stage}" ] = summarize( stage_runs )
+
+   return {
+      key: value if isinstance( value, dict ) else summarize( value )
+      for key, value in timings.items()
+   }, extract_path
+
+
+def _request( base, method, path, payload = None, headers = None ):
+   data = None if payload is None else json.dumps( payload ).encode( "utf-8" )
+   request = urllib.request.Request(
+      base + path,
+      data = data,
+      method = method,
+      headers = dict( { "Content-Type": "application/json" } if data else { }, **( headers or { } ) ),
+   )
+   start = time.perf_counter()
+   try:
+      with urllib.request.urlopen( request ) as response:
+         body = response.read()
+         status = response.status
+   except urllib.error.HTTPError as exc:
+      body = exc.read()
+      status = exc.code
+   return time.perf_counter() - start, status, len( body )
+
+
+def server_calls( store, repeat ):
+   """
+   ( name, method, path, payload or callable( run ) -> payload, headers ) for each timed call.
+   """
+   ids = store.order
+   mid_tag = TAGS[ len( TAGS ) // 2 ]
+   batch = lambda run: {
+      "items": [
+         { "id": ids[ ( run * 97 + i * 31 ) % len( ids ) ], "tags_chatgpt": f"bench batch {run}", "tags_bard": "" }
+         for i in range( min( 100, len( ids ) ) )
+      ]
+   }
+
+   return [
+      ( "GET /api/explanations", "GET", "/api/explanations", None, None ),
+      ( "GET /api/explanations (gzip)", "GET", "/api/explanations", None, { "Accept-Encoding": "gzip" } ),
+      ( "GET /api/explanations (ndjson)", "GET", "/api/explanations", None, { "Accept": "application/x-ndjson" } ),
+      ( "GET /api/explanations?limit=100", "GET", "/api/explanations?limit=100&offset=0", None, None ),
+      ( "GET /api/explanations?untagged", "GET", "/api/explanations?untagged=1&limit=100", None, None ),
+      ( "GET /api/explanations/<id>", "GET", f"/api/explanations/{ids[ len( ids ) // 2 ]}", None, None ),
+      ( "GET /api/tags", "GET", "/api/tags", None, None ),
+      ( "GET /api/crosstab", "GET", "/api/crosstab", None, None ),
+      ( "GET /api/terms", "GET", "/api/terms", None, None ),
+      ( "GET /api/search", "GET", "/api/search?q=response", None, None ),
+      ( "GET /api/search (phrase)", "GET", "/api/search?q=%22the%20answer%22", None, None ),
+      (
+         "POST /api/explanations/<id>", "POST", lambda run: f"/api/explanations/{ids[ run % len( ids ) ]}",
+         lambda run: { "tags_chatgpt": f"bench tag {run}", "tags_bard": "" }, None,
+      ),
+      ( "POST /api/explanations/batch", "POST", "/api/explanations/batch", batch, None ),
+      (
+         "POST /api/tags/rename", "POST", "/api/tags/rename",
+         lambda run: { "old_tag": mid_tag if run % 2 == 0 else "bench renamed", "new_tag": "bench renamed" if run % 2 == 0 else mid_tag },
+         None,
+      ),
+      (
+         "POST /api/tags/add_missing_explanations", "POST", "/api/tags/add_missing_explanations",
+         lambda run: { "tag": f"bench missing {run}" }, None,
+      ),
+      ( "POST /api/tags/remove", "POST", "/api/tags/remove", lambda run: { "tag": TAGS[ -1 - run % len( TAGS ) ] }, None ),
+   ]
+
+
+def bench_server( extract_path, repeat ):
+   """
+   Serve extract_path from an in-process threaded server on a free local
+   port and time store loading plus each API call.
+   """
+   tag_server.use_data_path( extract_path )
+   store = tag_server.STORE
+   timings = { }
+
+   seconds, _ = timed( store.ensure_loaded )
+   timings[ "server/load" ] = summarize( [ seconds ] )
+
+   httpd = tag_server.make_server( "127.0.0.1", 0, "threaded" )
+   thread = threading.Thread( target = httpd.serve_forever, daemon = True )
+   thread.start()
+   base = f"http://127.0.0.1:{httpd.server_address[ 1 ]}"
+
+   try:
+      with quiet( ):
+         for name, method, path, payload, headers in server_calls( store, repeat ):
+            extra = { }
+            if method == "GET":
+               # The first call pays for lazily built indexes ( terms, search ); report it apart.
+               extra[ "cold" ] = round( _request( base, method, path, None, headers )[ 0 ], 6 )
+
+            runs = [ ]
+            sizes = set( )
+            statuses = set( )
+            for run in range( repeat ):
+               seconds, status, size = _request(
+                  base, method,
+                  path( run ) if callable( path ) else path,
+                  payload( run ) if callable( payload ) else payload,
+                  headers,
+               )
+               runs.append( seconds )
+               sizes.add( size )
+               statuses.add( status )
+            timings[ f"server/{name}" ] = summarize( runs, bytes = max( sizes ), status = sorted( statuses ), **extra )
+
+         with store.lock.write( ):
+            seconds, _ = timed( store.compact )
+         timings[ "server/compact" ] = summarize( [ seconds ] )
+   finally:
+      httpd.shutdown()
+      httpd.server_close()
+
+   return timings
+
+
+def git_commit( ):
+   try:
+      return subprocess.run(
+         [ "git", "rev-parse", "--short", "HEAD" ], cwd = BASE_DIR, capture_output = True, text = True, check = True
+      ).stdout.strip()
+   except ( OSError, subprocess.CalledProcessError ):
+      return None
+
+
+def peak_rss_mb( ):
+   # ru_maxrss is KiB on Linux, bytes on macOS.
+   scale = 1 if sys.platform == "darwin" else 1024
+   return round( resource.getrusage( resource.RUSAGE_SELF ).ru_maxrss * scale / 2 ** 20, 1 )
+
+
+def run_benchmarks( sizes, repeat = 3, parts = ( "analyze", "server" ), plots = False, seed = 0, text_scale = 1.0, workdir = None ):
+   report = {
+      "schema": REPORT_SCHEMA,
+      "created": datetime.now( timezone.utc ).isoformat( timespec = "seconds" ),
+      "commit": git_commit( ),
+      "python": platform.python_version(),
+      "pandas": pd.__version__,
+      "platform": platform.platform(),
+      "settings": { "repeat": repeat, "seed": seed, "text_scale": text_scale, "plots": plots, "parts": list( parts ) },
+      "sizes": { },
+   }
+
+   with contextlib.ExitStack() as stack:
+      root = Path( workdir ) if workdir else Path( stack.enter_context( tempfile.TemporaryDirectory( prefix = "tagger-bench-" ) ) )
+
+      for n in sizes:
+         label = size_label( n )
+         folder = root / label
+         folder.mkdir( parents = True, exist_ok = True )
+         print( f"[{label}] synthesizing {n} rows ..." )
+
+         seconds, sheet = timed( synthesize_sheet, n, seed, text_scale )
+         entry = { "rows": n, "synthesize_s": round( seconds, 3 ), "timings": { } }
+
+         extract_path = folder / "explanations.csv"
+         if "analyze" in parts:
+            print( f"[{label}] analyze stages ..." )
+            analyze_timings, extract_path = bench_analyze( sheet, folder, repeat, plots )
+            entry[ "timings" ].update( analyze_timings )
+         else:
+            with quiet( ):
+               analyze.save_explanation_extract( analyze.prepare_data( sheet ), extract_path )
+            write_table( synthesize_tags( read_table( extract_path ) ), extract_path, keep = 0 )
+         del sheet
+
+         if "server" in parts:
+            print( f"[{label}] tag_server API ..." )
+            entry[ "timings" ].update( bench_server( extract_path, repeat ) )
+
+         entry[ "extract_bytes" ] = extract_path.stat().st_size
+         entry[ "peak_rss_mb" ] = peak_rss_mb( )
+         report[ "sizes" ][ label ] = entry
+
+   return report
+
+
+def compare_reports( old, new, tolerance = REGRESSION_TOLERANCE, floor = NOISE_FLOOR_S ):
+   """
+   ( rows, regressions ): per size and timing, old median, new median and
+   their ratio, plus the entries that slowed down beyond tolerance.
+   """
+   rows = [ ]
+   regressions = [ ]
+   for label, entry in new[ "sizes" ].items():
+      previous = old.get( "sizes", { } ).get( label )
+      if previous is None:
+         continue
+      for key, timing in entry[ "timings" ].items():
+         before = previous[ "timings" ].get( key )
+         if before is None:
+            continue
+         ratio = timing[ "median" ] / before[ "median" ] if before[ "median" ] else float( "inf" )
+         row = ( label, key, before[ "median" ], timing[ "median" ], ratio )
+         rows.append( row )
+         if ratio > 1.0 + tolerance and timing[ "median" ] >= floor:
+            regressions.append( row )
+   return rows, regressions
+
+
+def print_report( report ):
+   for label, entry in report[ "sizes" ].items():
+      print( f"\n{label} rows ( peak RSS {entry[ 'peak_rss_mb' ]} MB )" )
+      for key, timing in entry[ "timings" ].items():
+         if key.count( "/" ) > 1 and not key.startswith( "server/" ):
+            continue
+         size = f"  {timing[ 'bytes' ]:>12,} B" if "bytes" in timing else ""
+         print( f"   {key:<52} {timing[ 'median' ] * 1000:>10.1f} ms{size}" )
+
+
+def print_comparison( rows, regressions ):
+   print( f"\n{'size':<6} {'timing':<52} {'old ms':>10} {'new ms':>10} {'ratio':>7}" )
+   for label, key, before, after, ratio in rows:
+      flag = "  <-- slower" if ( label, key, before, after, ratio ) in regressions else ""
+      print( f"{label:<6} {key:<52} {before * 1000:>10.1f} {after * 1000:>10.1f} {ratio:>7.2f}{flag}" )
+   print( f"\n{len( regressions )} regression(s)." )
+
+
+def main( argv = None ):
+   parser = argparse.ArgumentParser(
+      description = "Time tag_server API calls and analyze.py stages on synthetic datasets "
+                    "and write a JSON report that can be compared across commits."
+   )
+   parser.add_argument(
+      "--sizes",
+      default = DEFAULT_SIZES,
+      help = f"Comma-separated row counts, k / M suffixes allowed (default: {DEFAULT_SIZES}). "
+             "Large sizes need a lot of memory; see --text-scale.",
+   )
+   parser.add_argument( "--repeat", type = int, default = 3, help = "Runs per timing (default: 3)." )
+   parser.add_argument(
+      "--only",
+      choices = [ "analyze", "server" ],
+      help = "Benchmark only the analyze.py stages or only the tag_server API.",
+   )
+   parser.add_argument( "--plots", action = "store_true", help = "Include the matplotlib figure jobs (slow)." )
+   parser.add_argument( "--seed", type = int, default = 0, help = "Seed for the synthetic data (default: 0)." )
+   parser.add_argument(
+      "--text-scale",
+      type = float,
+      default = 1.0,
+      help = "Multiply the typical text lengths, e.g. 0.1 to fit 4M rows in memory (default: 1.0).",
+   )
+   parser.add_argument( "--workdir", type = Path, help = "Keep the generated datasets and outputs here (default: a temp dir)." )
+   parser.add_argument( "--output", type = Path, help = f"Report path (default: {REPORT_DIR.relative_to( BASE_DIR )}/<commit>.json)." )
+   parser.add_argument(
+      "--compare",
+      type = Path,
+      metavar = "REPORT",
+      help = "Compare against an earlier report; exit 1 if any timing regressed.",
+   )
+   parser.add_argument(
+      "--tolerance",
+      type = float,
+      default = REGRESSION_TOLERANCE,
+      help = f"Slowdown counted as a regression by --compare (default: {REGRESSION_TOLERANCE}).",
+   )
+   args = parser.parse_args( argv )
+
+   try:
+      sizes = [ parse_size( s ) for s in args.sizes.split( "," ) if s.strip() ]
+   except ValueError:
+      parser.error( f"invalid --sizes {args.sizes!r}" )
+   if not sizes or min( sizes ) < 1:
+      parser.error( "--sizes needs at least one positive row count" )
+   if args.repeat < 1:
+      parser.error( "--repeat must be at least 1" )
+
+   baseline = None
+   if args.compare:
+      baseline = json.loads( args.compare.read_text( encoding = "utf-8" ) )
+      if baseline.get( "schema" ) != REPORT_SCHEMA:
+         parser.error( f"{args.compare} is not a schema {REPORT_SCHEMA} benchmark report" )
+
+   parts = ( args.only, ) if args.only else ( "analyze", "server" )
+   report = run_benchmarks( sizes, args.repeat, parts, args.plots, args.seed, args.text_scale, args.workdir )
+
+   output = args.output or REPORT_DIR / f"{report[ 'commit' ] or datetime.now().strftime( '%Y%m%d-%H%M%S' )}.json"
+   output.parent.mkdir( parents = True, exist_ok = True )
+   output.write_text( json.dumps( report, indent = 2 ), encoding = "utf-8" )
+
+   print_report( report )
+   print( f"\nReport written to {output}" )
+
+   if baseline is not None:
+      rows, regressions = compare_reports( baseline, report, args.tolerance )
+      print_comparison( rows, regressions )
+      return 1 if regressions else 0
+   return 0
+
+
+if __name__ == "__main__":
+   sys.exit( main() )
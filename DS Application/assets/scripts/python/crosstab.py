@@ -0,0 +1,96 @@
+import numpy as np
+import pandas as pd
+
+
+MISSING = "Missing"
+TOTAL = "Total"
+
+
+def rating_keys( ratings ):
+   """
+   Ratings as the strings "1".."7", with anything non-numeric as "Missing".
+   """
+   numeric = pd.to_numeric( pd.Series( ratings ), errors = "coerce" ).astype( "Int64" )
+   return numeric.astype( "string" ).fillna( MISSING ).astype( object )
+
+
+def category_keys( values ):
+   values = pd.Series( values, dtype = object )
+   return values.where( values.notna( ), MISSING ).astype( str )
+
+
+def crosstab_tables( df, rating_col, category_cols, rating_labels = None ):
+   """
+   Count + percent-of-column tables of rating_col against each of category_cols.
+
+   All category columns are stacked into one long, categorical-encoded frame
+   and counted with a single groupby, instead of one pd.crosstab per column.
+
+   Returns { category_col: DataFrame } in the interleaved CSV layout:
+      index   ratings 1..7 (via rating_labels), optional Missing, Total
+      columns <Category> (Count), <Category> (% of Column), ..., Total (Count), Total (% of Column)
+   """
+   rating_labels = { str( k ): v for k, v in ( rating_labels or { } ).items( ) }
+   category_cols = list( category_cols )
+
+   ratings = rating_keys( df[ rating_col ].to_numpy( ) )
+   n_rows = len( ratings )
+
+   long = pd.DataFrame(
+      {
+         "variable": pd.Categorical( np.repeat( np.arange( len( category_cols ) ), n_rows ) ),
+         "value": pd.Categorical(
+            np.concatenate( [ category_keys( df[ col ].to_numpy( ) ).to_numpy( ) for col in category_cols ] )
+            if category_cols else np.array( [ ], dtype = object )
+         ),
+         "rating": pd.Categorical( np.tile( ratings.to_numpy( ), len( category_cols ) ) ),
+      }
+   )
+
+   counts = long.groupby( [ "variable", "value", "rating" ], observed = True ).size( )
+
+   tables = { }
+   for position, col in enumerate( category_cols ):
+      if position in counts.index.get_level_values( "variable" ):
+         grid = counts.xs( position, level = "variable" ).unstack( "value", fill_value = 0 )
+      else:
+         grid = pd.DataFrame( )
+      tables[ col ] = format_crosstab( grid, rating_labels )
+
+   return tables
+
+
+def format_crosstab( grid, rating_labels ):
+   """
+   Order, total and interleave a rating x category count grid.
+   """
+   rating_order = [ str( i ) for i in range( 1, 8 ) ] + [ MISSING ]
+   row_order = [ r for r in rating_order if r in grid.index ]
+   col_order = sorted( str( c ) for c in grid.columns )
+
+   counts = grid.reindex( index = row_order, columns = col_order, fill_value = 0 ).astype( np.int64 )
+   counts[ TOTAL ] = counts.sum( axis = 1 )
+   counts.loc[ TOTAL ] = counts.sum( axis = 0 )
+
+   values = counts.to_numpy( dtype = float )
+   col_totals = values[ -1 ]
+   with np.errstate( divide = "ignore", invalid = "ignore" ):
+      pct = np.where( col_totals > 0, values / col_totals * 100.0, 0.0 )
+
+   labels = [ rating_labels.get( r, r ) for r in counts.index ]
+   columns = [ str( c ) for c in counts.columns ]
+   pct_text = np.char.mod( "%.1f%%", pct ).astype( object )
+
+   interleaved = np.empty( ( len( labels ), 2 * len( columns ) ), dtype = object )
+   interleaved[ :, 0::2 ] = counts.to_numpy( )
+   interleaved[ :, 1::2 ] = pct_text
+
+   header = [ ]
+   for col in columns:
+      header.extend( [ f"{col} (Count)", f"{col} (% of Column)" ] )
+
+   combined = pd.DataFrame( interleaved, index = pd.Index( labels, name = "Rating" ), columns = header )
+   for col in columns:
+      combined[ f"{col} (Count)" ] = combined[ f"{col} (Count)" ].astype( np.int64 )
+
+   return combined
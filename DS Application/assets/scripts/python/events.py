@@ -0,0 +1,155 @@
+import json
+import threading
+from collections import deque
+
+
+# Events a subscriber may have waiting; one that falls this far behind is
+# disconnected and catches up from the history when it reconnects.
+SUBSCRIBER_QUEUE_SIZE = 256
+
+# Recent events kept for clients reconnecting with Last-Event-ID.
+HISTORY_SIZE = 1024
+
+# Seconds between keep-alive comments on an idle stream.
+HEARTBEAT_SECONDS = 15.0
+
+# Milliseconds EventSource waits before reconnecting ( sent as "retry:" ).
+RETRY_MS = 2000
+
+
+def format_event( event_id, kind, data ):
+   """
+   One event in text/event-stream form.
+   """
+   payload = json.dumps( data, separators = ( ",", ":" ) )
+   return f"id: {event_id}\nevent: {kind}\ndata: {payload}\n\n".encode( "utf-8" )
+
+
+class Subscription:
+   """
+   One client's queue of encoded events, filled by EventBroker.publish and
+   drained by the thread serving that client.
+
+   Pushing never blocks: when the queue is full the subscription is closed
+   instead, so a slow client costs the writer nothing. The serving thread
+   still sends what was queued before it ends the stream.
+   """
+
+   def __init__( self, limit = SUBSCRIBER_QUEUE_SIZE ):
+      self.limit = limit
+      self.closed = None
+      self._events = deque( )
+      self._ready = threading.Condition( threading.Lock( ) )
+
+   def push( self, encoded ):
+      with self._ready:
+         if self.closed:
+            return False
+         if len( self._events ) >= self.limit:
+            self.closed = "overflow"
+         else:
+            self._events.append( encoded )
+         self._ready.notify( )
+         return self.closed is None
+
+   def close( self, reason = "closed" ):
+      with self._ready:
+         if not self.closed:
+            self.closed = reason
+         self._ready.notify( )
+
+   def next( self, timeout = HEARTBEAT_SECONDS ):
+      """
+      The next encoded event, or None once timeout passes or the subscription is closed and drained.
+      """
+      with self._ready:
+         if not self._events and not self.closed:
+            self._ready.wait( timeout )
+         if self._events:
+            return self._events.popleft( )
+         return None
+
+
+class EventBroker:
+   """
+   Fans events out to Server-Sent Events subscribers, safe to use from any thread.
+
+   Event ids must increase ( tag_server uses the store generation ). The
+   last HISTORY_SIZE events are kept so a client reconnecting with
+   Last-Event-ID gets what it missed; one that is further behind is told
+   to reload instead.
+   """
+
+   def __init__( self, history_size = HISTORY_SIZE, max_subscribers = None ):
+      self.max_subscribers = max_subscribers
+      self._history = deque( maxlen = history_size )
+      self._floor = None
+      self._subscribers = set( )
+      self._lock = threading.Lock( )
+      self.published = 0
+      self.dropped = 0
+
+   @property
+   def subscribers( self ):
+      with self._lock:
+         return len( self._subscribers )
+
+   @property
+   def last_id( self ):
+      with self._lock:
+         return self._history[ -1 ][ 0 ] if self._history else None
+
+   def publish( self, event_id, kind, data ):
+      encoded = format_event( event_id, kind, data )
+      with self._lock:
+         if len( self._history ) == self._history.maxlen:
+            self._floor = self._history[ 0 ][ 0 ]
+         self._history.append( ( event_id, encoded ) )
+         self.published += 1
+         for subscription in list( self._subscribers ):
+            if not subscription.push( encoded ):
+               self._subscribers.discard( subscription )
+               self.dropped += 1
+
+   def subscribe( self, last_event_id = None ):
+      """
+      A new Subscription, or None when max_subscribers are connected.
+
+      With last_event_id, the events after it are queued first; if they
+      are no longer all in the history a single "reload" event is queued
+      instead.
+      """
+      subscription = Subscription( )
+      with self._lock:
+         if self.max_subscribers is not None and len( self._subscribers ) >= self.max_subscribers:
+            return None
+
+         if last_event_id is not None:
+            if self._floor is not None and last_event_id < self._floor:
+               current = self._history[ -1 ][ 0 ]
+               subscription.push( format_event( current, "reload", { "version": current } ) )
+            else:
+               missed = [ encoded for event_id, encoded in self._history if event_id > last_event_id ]
+               if len( missed ) >= subscription.limit:
+                  current = self._history[ -1 ][ 0 ]
+                  missed = [ format_event( current, "reload", { "version": current } ) ]
+               for encoded in missed:
+                  subscription.push( encoded )
+
+         self._subscribers.add( subscription )
+      return subscription
+
+   def unsubscribe( self, subscription ):
+      with self._lock:
+         self._subscribers.discard( subscription )
+      subscription.close( )
+
+   def close( self ):
+      """
+      End every stream, e.g. at shutdown so worker threads are released.
+      """
+      with self._lock:
+         subscribers = list( self._subscribers )
+         self._subscribers.clear( )
+      for subscription in subscribers:
+         subscription.close( "shutdown" )
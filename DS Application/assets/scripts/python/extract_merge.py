@@ -0,0 +1,92 @@
+import numpy as np
+import pandas as pd
+
+
+# A row's identity across sheet revisions: its prompt and both responses.
+CONTENT_COLUMNS = [ "Prompt", "ChatGPT", "Bard" ]
+
+# Columns carried over from the prior extract for every matched row.
+CARRIED_COLUMNS = [ "Tags - ChatGPT", "Tags - Bard", "ChatGPT", "Bard" ]
+
+
+def content_keys( df ):
+   """
+   Stable join key per row: a 64-bit hash of the stripped prompt and
+   responses, plus the row's occurrence number among rows with the same
+   hash so that duplicated content still pairs off one-to-one.
+   """
+   text = pd.DataFrame(
+      { col: df[ col ].fillna( "" ).astype( str ).str.strip() for col in CONTENT_COLUMNS }
+   )
+   hashes = pd.util.hash_pandas_object( text, index = False )
+   return pd.DataFrame(
+      {
+         "_content": hashes.to_numpy( ),
+         "_occurrence": hashes.groupby( hashes ).cumcount( ).to_numpy( ),
+      }
+   )
+
+
+def _prior_ids( prior_df ):
+   # Extracts without an ID column were matched by position, so number them that way.
+   if "ID" not in prior_df.columns:
+      return pd.Series( np.arange( 1, len( prior_df ) + 1 ), dtype = "float64" )
+   return pd.to_numeric( prior_df[ "ID" ], errors = "coerce" ).reset_index( drop = True )
+
+
+def merge_prior_tags( extract_df, prior_df ):
+   """
+   Carry tags ( and CARRIED_COLUMNS generally ) from prior_df onto extract_df.
+
+   Rows are paired first on content_keys, so tags follow a row whose ID
+   changed because rows were inserted or removed above it; rows left over
+   on both sides are then paired on ID. Both passes are hash joins, so the
+   merge is linear in the number of rows.
+
+   Returns ( merged DataFrame, counts ) where counts has
+   matched_by_content, matched_by_id, new ( rows with no prior match ) and
+   orphaned ( prior rows that matched nothing and were dropped ).
+   """
+   prior_df = prior_df.reset_index( drop = True )
+   n_new = len( extract_df )
+   n_prior = len( prior_df )
+
+   # source[ i ] is the prior row feeding new row i, or -1.
+   source = np.full( n_new, -1, dtype = np.int64 )
+
+   if all( col in df.columns for df in ( extract_df, prior_df ) for col in CONTENT_COLUMNS ):
+      left = content_keys( extract_df ).assign( _new = np.arange( n_new ) )
+      right = content_keys( prior_df ).assign( _prior = np.arange( n_prior ) )
+      pairs = left.merge( right, on = [ "_content", "_occurrence" ], how = "inner" )
+      source[ pairs[ "_new" ].to_numpy( ) ] = pairs[ "_prior" ].to_numpy( )
+   matched_by_content = int( ( source >= 0 ).sum() )
+
+   used = np.zeros( n_prior, dtype = bool )
+   used[ source[ source >= 0 ] ] = True
+
+   prior_ids = _prior_ids( prior_df )
+   left = pd.DataFrame(
+      { "ID": pd.to_numeric( extract_df[ "ID" ], errors = "coerce" ).to_numpy( ), "_new": np.arange( n_new ) }
+   )[ source < 0 ]
+   right = pd.DataFrame( { "ID": prior_ids.to_numpy( ), "_prior": np.arange( n_prior ) } )
+   right = right[ ~used & prior_ids.notna().to_numpy( ) ].drop_duplicates( subset = "ID" )
+   pairs = left.dropna( subset = [ "ID" ] ).merge( right, on = "ID", how = "inner" )
+   source[ pairs[ "_new" ].to_numpy( ) ] = pairs[ "_prior" ].to_numpy( )
+
+   rows = np.flatnonzero( source >= 0 )
+   used[ source[ rows ] ] = True
+
+   merged = extract_df.copy( )
+   for col in CARRIED_COLUMNS:
+      if col in prior_df.columns and col in merged.columns:
+         values = merged[ col ].to_numpy( dtype = object, copy = True )
+         values[ rows ] = prior_df[ col ].to_numpy( dtype = object )[ source[ rows ] ]
+         merged[ col ] = values
+
+   counts = {
+      "matched_by_content": matched_by_content,
+      "matched_by_id": len( pairs ),
+      "new": n_new - len( rows ),
+      "orphaned": int( n_prior - used.sum() ),
+   }
+   return merged, counts
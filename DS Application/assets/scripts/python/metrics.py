@@ -0,0 +1,226 @@
+import bisect
+import json
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+
+# Upper bounds, in seconds, of the latency histogram buckets ( +Inf is implied ).
+LATENCY_BUCKETS = ( 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0 )
+
+# Where request time goes, timed separately from the end-to-end latency:
+#    load        reading the extract ( and journal ) into memory
+#    mutate      applying edits to the resident rows
+#    persist     journal appends, compaction and database writes
+#    serialize   building JSON / NDJSON bodies
+#    compress    gzip / brotli / deflate of response bodies
+#    write       writing response bodies to the socket
+PHASES = ( "load", "mutate", "persist", "serialize", "compress", "write" )
+
+QUANTILES = ( 0.5, 0.95, 0.99 )
+
+
+class Histogram:
+   """
+   Fixed-bucket histogram, cumulative only when exported ( Prometheus style ).
+   """
+
+   def __init__( self, buckets = LATENCY_BUCKETS ):
+      self.buckets = tuple( buckets )
+      self.counts = [ 0 ] * ( len( self.buckets ) + 1 )
+      self.count = 0
+      self.sum = 0.0
+
+   def observe( self, value ):
+      self.counts[ bisect.bisect_left( self.buckets, value ) ] += 1
+      self.count += 1
+      self.sum += value
+
+   def cumulative( self ):
+      total = 0
+      for bound, count in zip( self.buckets + ( float( "inf" ), ), self.counts ):
+         total += count
+         yield bound, total
+
+   def quantile( self, q ):
+      """
+      Upper bound of the bucket holding the q-th observation ( None if empty ).
+      """
+      if not self.count:
+         return None
+      rank = q * self.count
+      for bound, total in self.cumulative( ):
+         if total >= rank:
+            return bound
+      return float( "inf" )
+
+   def summary( self ):
+      out = {
+         "count": self.count,
+         "sum_s": round( self.sum, 6 ),
+         "mean_ms": round( self.sum / self.count * 1000.0, 3 ) if self.count else None,
+      }
+      for q in QUANTILES:
+         bound = self.quantile( q )
+         out[ f"p{int( q * 100 )}_ms" ] = None if bound is None or bound == float( "inf" ) else bound * 1000.0
+      return out
+
+
+class CountingWriter:
+   """
+   Wraps a handler's wfile to count the bytes written through it.
+   """
+
+   def __init__( self, raw ):
+      self.raw = raw
+      self.count = 0
+
+   def write( self, data ):
+      self.count += len( data )
+      return self.raw.write( data )
+
+   def __getattr__( self, name ):
+      return getattr( self.raw, name )
+
+
+def _labels( **labels ):
+   def escape( value ):
+      return str( value ).replace( "\\", "\\\\" ).replace( "\"", "\\\"" ).replace( "\n", "\\n" )
+   return "{" + ",".join( f'{k}="{escape( v )}"' for k, v in labels.items( ) ) + "}"
+
+
+def _bound( value ):
+   return "+Inf" if value == float( "inf" ) else repr( value )
+
+
+class Metrics:
+   """
+   Request and phase counters for tag_server, safe to update from any thread.
+
+   Requests are keyed by ( method, route ), where route is a template such
+   as /api/explanations/<id>, so the number of series stays bounded.
+   """
+
+   def __init__( self ):
+      self._lock = threading.Lock( )
+      self.started = time.time( )
+      self.in_flight = 0
+      self.statuses = { }
+      self.latency = { }
+      self.bytes_in = { }
+      self.bytes_out = { }
+      self.phases = { name: Histogram( ) for name in PHASES }
+
+   def request_started( self ):
+      with self._lock:
+         self.in_flight += 1
+
+   def request_finished( self, method, route, status, seconds, bytes_in, bytes_out ):
+      key = ( method, route )
+      with self._lock:
+         self.in_flight -= 1
+         self.statuses[ key + ( status, ) ] = self.statuses.get( key + ( status, ), 0 ) + 1
+         self.latency.setdefault( key, Histogram( ) ).observe( seconds )
+         self.bytes_in[ key ] = self.bytes_in.get( key, 0 ) + bytes_in
+         self.bytes_out[ key ] = self.bytes_out.get( key, 0 ) + bytes_out
+
+   def observe_phase( self, name, seconds ):
+      with self._lock:
+         self.phases[ name ].observe( seconds )
+
+   @contextmanager
+   def phase( self, name ):
+      start = time.perf_counter( )
+      try:
+         yield
+      finally:
+         self.observe_phase( name, time.perf_counter( ) - start )
+
+   def snapshot( self ):
+      """
+      Compact JSON form: per-route counts, statuses, latency and bytes, plus phase timings.
+      """
+      with self._lock:
+         routes = { }
+         for ( method, route ), histogram in sorted( self.latency.items( ) ):
+            entry = histogram.summary( )
+            entry[ "status" ] = {
+               str( status ): count
+               for ( m, r, status ), count in sorted( self.statuses.items( ) )
+               if ( m, r ) == ( method, route )
+            }
+            entry[ "bytes_in" ] = self.bytes_in.get( ( method, route ), 0 )
+            entry[ "bytes_out" ] = self.bytes_out.get( ( method, route ), 0 )
+            routes[ f"{method} {route}" ] = entry
+
+         return {
+            "uptime_s": round( time.time( ) - self.started, 3 ),
+            "in_flight": self.in_flight,
+            "routes": routes,
+            "phases": { name: histogram.summary( ) for name, histogram in self.phases.items( ) },
+         }
+
+   def prometheus( self ):
+      """
+      Prometheus text exposition format ( version 0.0.4 ).
+      """
+      lines = [ ]
+
+      def family( name, kind, help_text ):
+         lines.append( f"# HELP {name} {help_text}" )
+         lines.append( f"# TYPE {name} {kind}" )
+
+      def histogram( name, histogram, **labels ):
+         for bound, total in histogram.cumulative( ):
+            lines.append( f"{name}_bucket{_labels( **labels, le = _bound( bound ) )} {total}" )
+         lines.append( f"{name}_sum{_labels( **labels )} {histogram.sum!r}" )
+         lines.append( f"{name}_count{_labels( **labels )} {histogram.count}" )
+
+      with self._lock:
+         family( "tagger_uptime_seconds", "gauge", "Seconds since the server started." )
+         lines.append( f"tagger_uptime_seconds {time.time( ) - self.started:.3f}" )
+
+         family( "tagger_http_requests_in_flight", "gauge", "Requests being handled right now." )
+         lines.append( f"tagger_http_requests_in_flight {self.in_flight}" )
+
+         family( "tagger_http_requests_total", "counter", "Requests handled, by method, route and status." )
+         for ( method, route, status ), count in sorted( self.statuses.items( ) ):
+            lines.append( f"tagger_http_requests_total{_labels( method = method, route = route, status = status )} {count}" )
+
+         family( "tagger_http_request_duration_seconds", "histogram", "End-to-end request latency." )
+         for ( method, route ), hist in sorted( self.latency.items( ) ):
+            histogram( "tagger_http_request_duration_seconds", hist, method = method, route = route )
+
+         family( "tagger_http_request_bytes_total", "counter", "Request body bytes received." )
+         for ( method, route ), count in sorted( self.bytes_in.items( ) ):
+            lines.append( f"tagger_http_request_bytes_total{_labels( method = method, route = route )} {count}" )
+
+         family( "tagger_http_response_bytes_total", "counter", "Response bytes sent, headers included." )
+         for ( method, route ), count in sorted( self.bytes_out.items( ) ):
+            lines.append( f"tagger_http_response_bytes_total{_labels( method = method, route = route )} {count}" )
+
+         family( "tagger_phase_duration_seconds", "histogram", "Time spent in each phase of request handling." )
+         for name, hist in self.phases.items( ):
+            histogram( "tagger_phase_duration_seconds", hist, phase = name )
+
+      return "\n".join( lines ) + "\n"
+
+
+class AccessLog:
+   """
+   One JSON object per request, written to stream ( a file or sys.stderr ).
+   """
+
+   def __init__( self, stream ):
+      self.stream = stream
+      self._lock = threading.Lock( )
+
+   def write( self, **fields ):
+      line = json.dumps(
+         { "time": datetime.now( timezone.utc ).isoformat( timespec = "milliseconds" ), **fields },
+         separators = ( ",", ":" ),
+      )
+      with self._lock:
+         self.stream.write( line + "\n" )
+         self.stream.flush( )
@@ -0,0 +1,159 @@
+import cProfile
+import re
+import time
+import tracemalloc
+from contextlib import contextmanager
+from pathlib import Path
+
+import pandas as pd
+
+# Only used to add worker processes' CPU time to a stage; not available on Windows.
+try:
+   import resource
+except ImportError:
+   resource = None
+
+
+SUMMARY_COLUMNS = [ "stage", "kind", "name", "wall_s", "cpu_s", "peak_mb" ]
+
+# Blocks being measured in this process, outermost first; see measure().
+_frames = [ ]
+
+
+def _children_cpu( ):
+   if resource is None:
+      return 0.0
+   usage = resource.getrusage( resource.RUSAGE_CHILDREN )
+   return usage.ru_utime + usage.ru_stime
+
+
+def _fold_peak( ):
+   # Hand the peak so far to every open block before an inner block resets it.
+   peak = tracemalloc.get_traced_memory( )[ 1 ]
+   for frame in _frames:
+      frame[ "peak" ] = max( frame[ "peak" ], peak )
+
+
+@contextmanager
+def measure( ):
+   """
+   Measure the enclosed block. Yields a dict that, once the block exits,
+   holds wall_s, cpu_s ( this process plus any child processes reaped
+   meanwhile ) and peak_mb, the peak of Python-tracked allocations above
+   the level at entry. Blocks may nest.
+   """
+   started_tracing = not tracemalloc.is_tracing( )
+   if started_tracing:
+      tracemalloc.start( )
+
+   _fold_peak( )
+   current = tracemalloc.get_traced_memory( )[ 0 ]
+   tracemalloc.reset_peak( )
+   frame = { "start": current, "peak": current }
+   _frames.append( frame )
+
+   stats = { }
+   wall = time.perf_counter( )
+   cpu = time.process_time( )
+   children = _children_cpu( )
+   try:
+      yield stats
+   finally:
+      stats[ "wall_s" ] = time.perf_counter( ) - wall
+      stats[ "cpu_s" ] = time.process_time( ) - cpu + _children_cpu( ) - children
+      _fold_peak( )
+      _frames.pop( )
+      stats[ "peak_mb" ] = ( frame[ "peak" ] - frame[ "start" ] ) / 2 ** 20
+      if started_tracing:
+         tracemalloc.stop( )
+
+
+def _slug( name ):
+   return re.sub( r"[^A-Za-z0-9]+", "_", name ).strip( "_" ) or "stage"
+
+
+class Profiler:
+   """
+   Collects per-stage and per-artifact timings for analyze.py --profile.
+
+   stage() blocks may also be recorded with cProfile, one .pstats file per
+   stage in stats_dir. Artifacts measured in worker processes are passed
+   back and added with add(). A disabled profiler measures nothing.
+   """
+
+   def __init__( self, enabled = False, stats_dir = None ):
+      self.enabled = enabled
+      self.stats_dir = Path( stats_dir ) if stats_dir else None
+      self.rows = [ ]
+      self._stages = [ ]
+      self._cprofile_active = False
+      if enabled:
+         # Trace for the whole run so stage peaks include what their artifacts allocate.
+         tracemalloc.start( )
+
+   @contextmanager
+   def stage( self, name ):
+      if not self.enabled:
+         yield
+         return
+
+      position = len( self.rows )
+      profile = None
+      if self.stats_dir is not None and not self._cprofile_active:
+         profile = cProfile.Profile( )
+         self._cprofile_active = True
+
+      self._stages.append( name )
+      try:
+         with measure( ) as stats:
+            if profile is not None:
+               profile.enable( )
+            try:
+               yield
+            finally:
+               if profile is not None:
+                  profile.disable( )
+      finally:
+         self._stages.pop( )
+         self.rows.insert( position, { "stage": name, "kind": "stage", "name": name, **stats } )
+         if profile is not None:
+            self._cprofile_active = False
+            self.stats_dir.mkdir( parents = True, exist_ok = True )
+            stages_done = sum( 1 for row in self.rows if row[ "kind" ] == "stage" )
+            profile.dump_stats( self.stats_dir / f"{stages_done:02d}-{_slug( name )}.pstats" )
+
+   @contextmanager
+   def artifact( self, name ):
+      if not self.enabled:
+         yield
+         return
+      with measure( ) as stats:
+         yield
+      self.add( name, stats )
+
+   def add( self, name, stats ):
+      self.rows.append(
+         { "stage": self._stages[ -1 ] if self._stages else "", "kind": "artifact", "name": name, **stats }
+      )
+
+   def summary( self ):
+      table = pd.DataFrame( self.rows, columns = SUMMARY_COLUMNS )
+      return table.round( { "wall_s": 3, "cpu_s": 3, "peak_mb": 1 } )
+
+   def report( self, outdir ):
+      """
+      Print the summary table and save it as summary.csv in outdir.
+      """
+      table = self.summary( )
+
+      print( f" ... Profile ( wall s, CPU s, peak MB of Python allocations ):" )
+      for row in table.itertuples( index = False ):
+         indent = "   " if row.kind == "stage" else "      "
+         print( f" ...{indent}{row.name:<64} {row.wall_s:>9.3f} {row.cpu_s:>9.3f} {row.peak_mb:>9.1f}" )
+
+      outdir = Path( outdir )
+      outdir.mkdir( parents = True, exist_ok = True )
+      table.to_csv( outdir / "summary.csv", index = False )
+      print( f" ... ... Saved profile summary to {outdir / 'summary.csv'}" )
+      if self.stats_dir is not None:
+         print( f" ... ... cProfile stats per stage in {self.stats_dir} ( python -m pstats <file> )" )
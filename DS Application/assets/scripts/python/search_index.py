@@ -0,0 +1,260 @@
+import bisect
+import math
+import re
+
+
+# BM25 parameters.
+K1 = 1.2
+B = 0.75
+
+# A prefix query ( "optim*" ) expands to at most this many terms, most common first.
+MAX_PREFIX_TERMS = 50
+
+SNIPPET_CHARS = 160
+
+_TOKEN_RE = re.compile( r"\w+" )
+
+# field:"a phrase", field:term*, "a phrase", term*, term
+_CLAUSE_RE = re.compile( r'(?:(\w+):)?(?:"([^"]*)"?|(\S+))' )
+
+
+def tokenize( text ):
+   return [ m.group( 0 ).casefold() for m in _TOKEN_RE.finditer( text or "" ) ]
+
+
+class Clause:
+   """
+   One query clause: a term, a prefix, or a phrase, optionally limited to a field.
+   """
+
+   def __init__( self, terms, prefix = False, field = None ):
+      self.terms = terms
+      self.prefix = prefix
+      self.field = field
+
+   def __repr__( self ):
+      return f"Clause( {self.terms!r}, prefix = {self.prefix}, field = {self.field!r} )"
+
+
+def parse_query( query, fields ):
+   """
+   Split a query into clauses. Supported syntax:
+      word            rows containing word
+      word*           rows containing a word starting with word
+      "two words"     rows containing the phrase
+      field:word      restrict a clause to one field ( also field:"..." / field:word* )
+   Text that tokenizes into several words ( e.g. don't ) is a phrase.
+   Every clause must match for a row to be returned.
+   """
+   clauses = [ ]
+   for match in _CLAUSE_RE.finditer( query or "" ):
+      field, phrase, word = match.groups( )
+      if field and field.casefold() not in fields:
+         # Not a field name: treat "foo:bar" as plain text.
+         if phrase is not None:
+            phrase = f"{field} {phrase}"
+         else:
+            word = f"{field}:{word}"
+         field = None
+      field = field.casefold() if field else None
+
+      if phrase is not None:
+         terms = tokenize( phrase )
+         prefix = False
+      else:
+         prefix = word.endswith( "*" )
+         terms = tokenize( word.rstrip( "*" ) )
+         prefix = prefix and len( terms ) == 1
+
+      if terms:
+         clauses.append( Clause( terms, prefix, field ) )
+   return clauses
+
+
+class SearchIndex:
+   """
+   Positional inverted index over a few text fields of each row, ranked
+   with BM25 per field.
+
+   postings[ field ][ term ] maps row id -> positions of term in that field.
+   Rows are added, replaced and removed one at a time, so the index follows
+   edits and reloads without being rebuilt; sync() does that for a whole
+   snapshot of the rows, touching only rows whose text changed.
+   """
+
+   def __init__( self, fields ):
+      self.fields = list( fields )
+      self.postings = { f: { } for f in self.fields }
+      self.lengths = { f: { } for f in self.fields }
+      self.total_length = { f: 0 for f in self.fields }
+      self.signatures = { }
+      self._vocabulary = { f: None for f in self.fields }
+
+   def __len__( self ):
+      return len( self.signatures )
+
+   def add( self, row_id, texts ):
+      """
+      Index ( or re-index ) a row from { field: text }. Returns False if its text is unchanged.
+      """
+      signature = tuple( texts.get( f, "" ) for f in self.fields )
+      if self.signatures.get( row_id ) == signature:
+         return False
+      self.remove( row_id )
+
+      for field, text in zip( self.fields, signature ):
+         tokens = tokenize( text )
+         postings = self.postings[ field ]
+         for position, term in enumerate( tokens ):
+            row_postings = postings.get( term )
+            if row_postings is None:
+               row_postings = postings[ term ] = { }
+               self._vocabulary[ field ] = None
+            row_postings.setdefault( row_id, [ ] ).append( position )
+         self.lengths[ field ][ row_id ] = len( tokens )
+         self.total_length[ field ] += len( tokens )
+
+      self.signatures[ row_id ] = signature
+      return True
+
+   def remove( self, row_id ):
+      signature = self.signatures.pop( row_id, None )
+      if signature is None:
+         return False
+
+      for field, text in zip( self.fields, signature ):
+         postings = self.postings[ field ]
+         for term in set( tokenize( text ) ):
+            row_postings = postings.get( term )
+            if row_postings is None:
+               continue
+            row_postings.pop( row_id, None )
+            if not row_postings:
+               del postings[ term ]
+               self._vocabulary[ field ] = None
+         self.total_length[ field ] -= self.lengths[ field ].pop( row_id, 0 )
+      return True
+
+   def sync( self, rows ):
+      """
+      Bring the index in line with rows, an iterable of ( row_id, { field: text } ).
+      Returns the number of rows added, changed or removed.
+      """
+      seen = set( )
+      changed = 0
+      for row_id, texts in rows:
+         seen.add( row_id )
+         changed += self.add( row_id, texts )
+      for row_id in [ r for r in self.signatures if r not in seen ]:
+         changed += self.remove( row_id )
+      return changed
+
+   def _terms_with_prefix( self, field, prefix ):
+      vocabulary = self._vocabulary[ field ]
+      if vocabulary is None:
+         vocabulary = self._vocabulary[ field ] = sorted( self.postings[ field ] )
+      start = bisect.bisect_left( vocabulary, prefix )
+      end = bisect.bisect_left( vocabulary, prefix + "\U0010ffff" )
+      terms = vocabulary[ start:end ]
+      postings = self.postings[ field ]
+      terms.sort( key = lambda t: -len( postings[ t ] ) )
+      return terms[ :MAX_PREFIX_TERMS ]
+
+   def _clause_hits( self, clause, field ):
+      """
+      { row_id: term frequency } for one clause in one field.
+      """
+      postings = self.postings[ field ]
+
+      if clause.prefix:
+         hits = { }
+         for term in self._terms_with_prefix( field, clause.terms[ 0 ] ):
+            for row_id, positions in postings[ term ].items( ):
+               hits[ row_id ] = hits.get( row_id, 0 ) + len( positions )
+         return hits
+
+      if len( clause.terms ) == 1:
+         return { row_id: len( p ) for row_id, p in postings.get( clause.terms[ 0 ], { } ).items( ) }
+
+      lists = [ postings.get( term ) for term in clause.terms ]
+      if any( l is None for l in lists ):
+         return { }
+      candidates = set.intersection( *( set( l ) for l in lists ) )
+
+      hits = { }
+      for row_id in candidates:
+         following = [ set( l[ row_id ] ) for l in lists[ 1: ] ]
+         count = sum(
+            1 for start in lists[ 0 ][ row_id ]
+            if all( start + i + 1 in positions for i, positions in enumerate( following ) )
+         )
+         if count:
+            hits[ row_id ] = count
+      return hits
+
+   def _bm25( self, field, hits ):
+      n_rows = len( self.signatures )
+      avg_length = ( self.total_length[ field ] / n_rows ) if n_rows else 0.0
+      idf = math.log( 1.0 + ( n_rows - len( hits ) + 0.5 ) / ( len( hits ) + 0.5 ) )
+      lengths = self.lengths[ field ]
+      scores = { }
+      for row_id, tf in hits.items( ):
+         norm = K1 * ( 1.0 - B + B * lengths.get( row_id, 0 ) / avg_length ) if avg_length else K1
+         scores[ row_id ] = idf * tf * ( K1 + 1.0 ) / ( tf + norm )
+      return scores
+
+   def search( self, query, fields = None ):
+      """
+      Rank rows for query, searching only fields ( default: all ).
+      Returns ( clauses, results ) where results is a list of
+      ( row_id, score, matched fields ), best first.
+      """
+      fields = [ f for f in ( fields or self.fields ) if f in self.postings ]
+      clauses = parse_query( query, self.fields )
+      if not clauses:
+         return clauses, [ ]
+
+      scores = None
+      matched = { }
+      for clause in clauses:
+         clause_fields = [ clause.field ] if clause.field else fields
+         clause_scores = { }
+         for field in clause_fields:
+            if field not in self.postings:
+               continue
+            for row_id, score in self._bm25( field, self._clause_hits( clause, field ) ).items( ):
+               clause_scores[ row_id ] = clause_scores.get( row_id, 0.0 ) + score
+               matched.setdefault( row_id, set( ) ).add( field )
+
+         if scores is None:
+            scores = clause_scores
+         else:
+            scores = { r: s + clause_scores[ r ] for r, s in scores.items( ) if r in clause_scores }
+         if not scores:
+            return clauses, [ ]
+
+      results = sorted( scores.items( ), key = lambda item: ( -item[ 1 ], item[ 0 ] ) )
+      return clauses, [
+         ( row_id, score, [ f for f in self.fields if f in matched[ row_id ] ] )
+         for row_id, score in results
+      ]
+
+
+def snippet( text, clauses, width = SNIPPET_CHARS ):
+   """
+   A window of text around the first word any clause matched.
+   """
+   text = text or ""
+   firsts = { c.terms[ 0 ] for c in clauses if not c.prefix }
+   prefixes = tuple( c.terms[ 0 ] for c in clauses if c.prefix )
+
+   start = 0
+   for m in _TOKEN_RE.finditer( text ):
+      word = m.group( 0 ).casefold()
+      if word in firsts or ( prefixes and word.startswith( prefixes ) ):
+         start = m.start( )
+         break
+
+   begin = max( 0, start - width // 4 )
+   window = text[ begin:begin + width ].replace( "\n", " " )
+   return ( "…" if begin > 0 else "" ) + window + ( "…" if begin + width < len( text ) else "" )
@@ -0,0 +1,166 @@
+import gzip
+import hashlib
+import stat
+import threading
+from collections import OrderedDict
+from email.utils import formatdate, parsedate_to_datetime
+from pathlib import Path
+
+try:
+   import brotli
+except ImportError:
+   brotli = None
+
+
+# Suffixes served from memory, and their Content-Type. Anything else ( the
+# data files, for one ) is left to SimpleHTTPRequestHandler.
+CONTENT_TYPES = {
+   ".html": "text/html; charset=utf-8",
+   ".js": "text/javascript; charset=utf-8",
+   ".css": "text/css; charset=utf-8",
+   ".svg": "image/svg+xml",
+   ".json": "application/json",
+   ".png": "image/png",
+   ".jpg": "image/jpeg",
+   ".jpeg": "image/jpeg",
+   ".gif": "image/gif",
+   ".ico": "image/x-icon",
+}
+
+# Types worth compressing; images are already compressed.
+COMPRESSIBLE = ( "text/", "image/svg+xml", "application/json" )
+COMPRESS_MIN_BYTES = 1024
+
+# Larger files are served from disk as before; the whole cache is bounded too.
+MAX_ASSET_BYTES = 8 * 1024 * 1024
+MAX_CACHE_BYTES = 64 * 1024 * 1024
+
+# Browsers may keep a copy but must revalidate it; a 304 costs one stat().
+CACHE_CONTROL = "no-cache"
+
+
+class Asset:
+   """
+   One file held in memory with its precompressed variants and validators.
+   """
+
+   def __init__( self, path, content_type, stamp, body ):
+      self.path = path
+      self.content_type = content_type
+      self.stamp = stamp
+      self.mtime = stamp[ 0 ] / 1e9
+      self.last_modified = formatdate( self.mtime, usegmt = True )
+
+      digest = hashlib.sha256( body ).hexdigest()[ :32 ]
+      self.variants = { None: ( body, f'"{digest}"' ) }
+
+      if content_type.startswith( COMPRESSIBLE ) and len( body ) >= COMPRESS_MIN_BYTES:
+         encoded = { "gzip": gzip.compress( body, 9, mtime = 0 ) }
+         if brotli is not None:
+            encoded[ "br" ] = brotli.compress( body, quality = 11 )
+         for encoding, data in encoded.items( ):
+            if len( data ) < len( body ):
+               self.variants[ encoding ] = ( data, f'"{digest}-{encoding}"' )
+
+      self.etags = { etag for _, etag in self.variants.values( ) }
+      self.size = sum( len( data ) for data, _ in self.variants.values( ) )
+
+   @property
+   def compressible( self ):
+      return len( self.variants ) > 1
+
+   def variant( self, encoding ):
+      """
+      ( encoding, body, etag ) for encoding, or the identity body if there is no such variant.
+      """
+      if encoding in self.variants:
+         return ( encoding, ) + self.variants[ encoding ]
+      return ( None, ) + self.variants[ None ]
+
+   def not_modified( self, headers ):
+      """
+      True when the request's If-None-Match ( or, failing that,
+      If-Modified-Since ) shows the client already has this file.
+      """
+      if_none_match = headers.get( "If-None-Match" )
+      if if_none_match:
+         tags = { tag.strip().removeprefix( "W/" ) for tag in if_none_match.split( "," ) }
+         return "*" in tags or bool( tags & self.etags )
+
+      if_modified_since = headers.get( "If-Modified-Since" )
+      if if_modified_since:
+         try:
+            since = parsedate_to_datetime( if_modified_since ).timestamp( )
+         except ( TypeError, ValueError ):
+            return False
+         return int( self.mtime ) <= since
+      return False
+
+
+class StaticFiles:
+   """
+   In-memory cache of the files under root that CONTENT_TYPES covers.
+
+   Each lookup stats the file and reloads it when its mtime or size has
+   changed, so edits on disk show up on the next request. Least recently
+   used files are dropped once the cache holds MAX_CACHE_BYTES.
+   """
+
+   def __init__( self, root ):
+      self.root = Path( root ).resolve()
+      self._assets = OrderedDict( )
+      self._bytes = 0
+      self._lock = threading.Lock( )
+
+   def get( self, path ):
+      """
+      The Asset for path ( an absolute filesystem path ), or None if it is
+      not a cacheable file under root.
+      """
+      path = Path( path )
+      content_type = CONTENT_TYPES.get( path.suffix.lower() )
+      if content_type is None:
+         return None
+
+      try:
+         info = path.stat( )
+      except OSError:
+         return None
+      if not stat.S_ISREG( info.st_mode ) or info.st_size > MAX_ASSET_BYTES:
+         return None
+      if not path.resolve().is_relative_to( self.root ):
+         return None
+
+      stamp = ( info.st_mtime_ns, info.st_size )
+      with self._lock:
+         asset = self._assets.get( path )
+         if asset is not None and asset.stamp == stamp:
+            self._assets.move_to_end( path )
+            return asset
+
+      try:
+         asset = Asset( path, content_type, stamp, path.read_bytes( ) )
+      except OSError:
+         return None
+
+      with self._lock:
+         previous = self._assets.pop( path, None )
+         if previous is not None:
+            self._bytes -= previous.size
+         self._assets[ path ] = asset
+         self._bytes += asset.size
+         while self._bytes > MAX_CACHE_BYTES and len( self._assets ) > 1:
+            _, evicted = self._assets.popitem( last = False )
+            self._bytes -= evicted.size
+      return asset
+
+   def preload( self, patterns ):
+      """
+      Load and precompress the files matching patterns ( globs relative to root ).
+      Returns ( files, bytes ) now cached.
+      """
+      for pattern in patterns:
+         for path in sorted( self.root.glob( pattern ) ):
+            self.get( path )
+      with self._lock:
+         return len( self._assets ), self._bytes
@@ -0,0 +1,110 @@
+from pathlib import Path
+
+import pandas as pd
+
+from atomic_io import KEEP_SNAPSHOTS, atomic_write
+
+# pyarrow is only needed for the columnar formats; CSV works without it.
+try:
+   import pyarrow as pa
+   import pyarrow.feather
+   import pyarrow.parquet
+except ImportError:
+   pa = None
+
+
+# File suffix -> storage format of the explanations extract.
+FORMATS = {
+   ".csv": "csv",
+   ".parquet": "parquet",
+   ".arrow": "arrow",
+   ".feather": "arrow",
+}
+
+
+def table_format( path ):
+   suffix = Path( path ).suffix.lower()
+   if suffix not in FORMATS:
+      raise ValueError( f"Unsupported table format {suffix!r}; use one of {', '.join( FORMATS )}" )
+   return FORMATS[ suffix ]
+
+
+def _require_pyarrow( fmt ):
+   if pa is None:
+      raise ImportError( f"{fmt} storage needs pyarrow ( pip install pyarrow ), or use a .csv path" )
+
+
+def check_table_path( path ):
+   """
+   Raise ValueError / ImportError now if path's format cannot be read or written.
+   """
+   fmt = table_format( path )
+   if fmt != "csv":
+      _require_pyarrow( fmt )
+   return fmt
+
+
+def read_columns( path ):
+   """
+   Column names of the table at path, without reading its rows.
+   """
+   fmt = table_format( path )
+   if fmt == "csv":
+      return list( pd.read_csv( path, nrows = 0 ).columns )
+   _require_pyarrow( fmt )
+   if fmt == "parquet":
+      return list( pa.parquet.read_schema( path ).names )
+   with pa.memory_map( str( path ) ) as source:
+      return list( pa.ipc.open_file( source ).schema.names )
+
+
+def read_table( path, columns = None ):
+   """
+   Read the table at path as strings, with blanks ( not NaN ) for missing values.
+
+   columns projects the read onto those columns ( missing ones are skipped ),
+   so tag-only readers never parse the long text columns. Parquet and Arrow
+   files are memory-mapped.
+   """
+   path = Path( path )
+   fmt = table_format( path )
+
+   if columns is not None:
+      available = read_columns( path )
+      columns = [ c for c in columns if c in available ]
+
+   if fmt == "csv":
+      return pd.read_csv( path, dtype = str, keep_default_na = False, usecols = columns )
+
+   _require_pyarrow( fmt )
+   if fmt == "parquet":
+      table = pa.parquet.read_table( path, columns = columns, memory_map = True )
+   else:
+      table = pa.feather.read_table( path, columns = columns, memory_map = True )
+
+   df = table.to_pandas( )
+   return df.astype( object ).where( df.notna( ), "" ).astype( str )
+
+
+def write_table( df, path, keep = KEEP_SNAPSHOTS ):
+   """
+   Write df crash-safely in the format given by path's suffix, keeping the
+   previous file as a rotating snapshot ( see atomic_io.atomic_write ).
+   Columnar formats store every column as a string, like the CSV.
+   """
+   path = Path( path )
+   fmt = table_format( path )
+
+   if fmt == "csv":
+      atomic_write( path, lambda fh: df.to_csv( fh, index = False ), keep )
+      return
+
+   _require_pyarrow( fmt )
+   text = df.astype( object ).where( df.notna( ), "" ).astype( str )
+   table = pa.Table.from_pandas( text, preserve_index = False )
+
+   if fmt == "parquet":
+      atomic_write( path, lambda fh: pa.parquet.write_table( table, fh ), keep, binary = True )
+   else:
+      # Uncompressed IPC so readers can memory-map it without copying.
+      atomic_write( path, lambda fh: pa.feather.write_feather( table, fh, compression = "uncompressed" ), keep, binary = True )
@@ -0,0 +1,310 @@
+import json
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+import pandas as pd
+
+
+# Extract column -> explanations table column. Anything else in the extract
+# is kept per row as JSON in `extra`, so export reproduces the file.
+COLUMN_NAMES = {
+   "Rating": "rating",
+   "Prompt Category": "prompt_category",
+   "Prompt": "prompt",
+   "ChatGPT": "chatgpt",
+   "Bard": "bard",
+   "Explanation": "explanation",
+   "Tags - ChatGPT": "tags_chatgpt",
+   "Tags - Bard": "tags_bard",
+}
+
+# row_tags.side -> extract tag column.
+SIDES = {
+   "chatgpt": "Tags - ChatGPT",
+   "bard": "Tags - Bard",
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS columns (
+   position INTEGER PRIMARY KEY,
+   name TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS explanations (
+   id INTEGER PRIMARY KEY,
+   position INTEGER NOT NULL,
+   rating TEXT NOT NULL DEFAULT '',
+   prompt_category TEXT NOT NULL DEFAULT '',
+   prompt TEXT NOT NULL DEFAULT '',
+   chatgpt TEXT NOT NULL DEFAULT '',
+   bard TEXT NOT NULL DEFAULT '',
+   explanation TEXT NOT NULL DEFAULT '',
+   tags_chatgpt TEXT NOT NULL DEFAULT '',
+   tags_bard TEXT NOT NULL DEFAULT '',
+   extra TEXT NOT NULL DEFAULT '{}'
+);
+
+CREATE INDEX IF NOT EXISTS explanations_position ON explanations ( position );
+
+CREATE TABLE IF NOT EXISTS row_tags (
+   row_id INTEGER NOT NULL REFERENCES explanations ( id ) ON DELETE CASCADE,
+   side TEXT NOT NULL CHECK ( side IN ( 'chatgpt', 'bard' ) ),
+   position INTEGER NOT NULL,
+   tag TEXT NOT NULL,
+   tag_key TEXT NOT NULL,
+   PRIMARY KEY ( row_id, side, position )
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS row_tags_key ON row_tags ( tag_key, row_id );
+
+-- Text search is served by tag_server's resident SearchIndex; older databases had an FTS table.
+DROP TABLE IF EXISTS explanations_fts;
+"""
+
+# Rebuild the tag strings of the ( row_id, side ) pairs in temp.touched
+# from row_tags, in tag order.
+REWRITE_TAGS = """
+UPDATE explanations SET {column} = COALESCE( (
+   SELECT group_concat( tag, ', ' ) FROM (
+      SELECT tag FROM row_tags
+      WHERE row_id = explanations.id AND side = '{side}'
+      ORDER BY position
+   )
+), '' )
+WHERE id IN ( SELECT row_id FROM temp.touched WHERE side = '{side}' )
+"""
+
+BLANK = "' ' || char( 9, 10, 11, 12, 13 )"
+
+
+# Same splitting rule as tag_server.split_tags.
+def split_tags( raw ):
+   return [ p.strip() for p in str( raw or "" ).split( "," ) if p.strip() ]
+
+
+class TagDatabase:
+   """
+   The explanations extract as a SQLite database in WAL mode.
+
+   Tags are normalized into row_tags( row_id, side, position, tag, tag_key ),
+   indexed by casefolded tag, so global tag edits touch only the rows that
+   carry the tag. The tag strings in explanations are rewritten from
+   row_tags for exactly those rows.
+
+   One connection is shared by the server threads; statements are
+   serialized by an internal lock.
+   """
+
+   def __init__( self, path ):
+      self.path = Path( path )
+      self._conn = None
+      self._lock = threading.RLock( )
+
+   @property
+   def conn( self ):
+      if self._conn is None:
+         self.path.parent.mkdir( parents = True, exist_ok = True )
+         conn = sqlite3.connect( self.path, check_same_thread = False, isolation_level = None )
+         conn.execute( "PRAGMA journal_mode = WAL" )
+         conn.execute( "PRAGMA synchronous = FULL" )
+         conn.execute( "PRAGMA foreign_keys = ON" )
+         conn.executescript( SCHEMA )
+         self._conn = conn
+      return self._conn
+
+   def close( self ):
+      with self._lock:
+         if self._conn is not None:
+            self._conn.close( )
+            self._conn = None
+
+   @contextmanager
+   def transaction( self ):
+      with self._lock:
+         conn = self.conn
+         conn.execute( "BEGIN IMMEDIATE" )
+         try:
+            yield conn
+         except BaseException:
+            conn.execute( "ROLLBACK" )
+            raise
+         conn.execute( "COMMIT" )
+
+   def data_version( self ):
+      """
+      Changes whenever another connection ( e.g. another process ) commits.
+      """
+      with self._lock:
+         return self.conn.execute( "PRAGMA data_version" ).fetchone( )[ 0 ]
+
+   def is_empty( self ):
+      with self._lock:
+         return self.conn.execute( "SELECT COUNT( * ) FROM columns" ).fetchone( )[ 0 ] == 0
+
+   def import_frame( self, df ):
+      """
+      Replace the database contents with df ( an extract, all strings ).
+      """
+      columns = list( df.columns )
+      extra_columns = [ c for c in columns if c != "ID" and c not in COLUMN_NAMES ]
+      known = [ c for c in columns if c in COLUMN_NAMES ]
+
+      rows = [ ]
+      tags = [ ]
+      for position, record in enumerate( df.to_dict( orient = "records" ) ):
+         row_id = int( record[ "ID" ] )
+         extra = { c: record[ c ] for c in extra_columns }
+         rows.append( [ row_id, position ] + [ record[ c ] for c in known ] + [ json.dumps( extra ) ] )
+         for side, col in SIDES.items( ):
+            for tag_position, tag in enumerate( split_tags( record.get( col, "" ) ) ):
+               tags.append( ( row_id, side, tag_position, tag, tag.casefold() ) )
+
+      names = [ "id", "position" ] + [ COLUMN_NAMES[ c ] for c in known ] + [ "extra" ]
+
+      with self.transaction( ) as conn:
+         conn.execute( "DELETE FROM row_tags" )
+         conn.execute( "DELETE FROM explanations" )
+         conn.execute( "DELETE FROM columns" )
+         conn.executemany( "INSERT INTO columns ( position, name ) VALUES ( ?, ? )", enumerate( columns ) )
+         conn.executemany(
+            f"INSERT INTO explanations ( {', '.join( names )} ) VALUES ( {', '.join( '?' * len( names ) )} )",
+            rows,
+         )
+         conn.executemany(
+            "INSERT INTO row_tags ( row_id, side, position, tag, tag_key ) VALUES ( ?, ?, ?, ?, ? )",
+            tags,
+         )
+
+   def export_frame( self ):
+      """
+      The extract as a DataFrame, columns and rows in their imported order.
+      """
+      with self._lock:
+         conn = self.conn
+         columns = [ name for ( name, ) in conn.execute( "SELECT name FROM columns ORDER BY position" ) ]
+         cursor = conn.execute( "SELECT * FROM explanations ORDER BY position" )
+         names = [ d[ 0 ] for d in cursor.description ]
+         records = [ dict( zip( names, values ) ) for values in cursor ]
+
+      data = [ ]
+      for rec in records:
+         extra = json.loads( rec[ "extra" ] )
+         row = { }
+         for col in columns:
+            if col == "ID":
+               row[ col ] = str( rec[ "id" ] )
+            elif col in COLUMN_NAMES:
+               row[ col ] = rec[ COLUMN_NAMES[ col ] ]
+            else:
+               row[ col ] = extra.get( col, "" )
+         data.append( row )
+
+      return pd.DataFrame( data, columns = columns, dtype = str )
+
+   def set_values( self, changes ):
+      """
+      Apply ( row_id, extract column, value ) edits in one transaction,
+      keeping row_tags in step with the tag columns.
+      """
+      if not changes:
+         return
+
+      with self.transaction( ) as conn:
+         for row_id, col, value in changes:
+            if col in COLUMN_NAMES:
+               conn.execute( f"UPDATE explanations SET {COLUMN_NAMES[ col ]} = ? WHERE id = ?", ( value, row_id ) )
+            else:
+               conn.execute(
+                  "UPDATE explanations SET extra = json_set( extra, ?, ? ) WHERE id = ?",
+                  ( f'$."{col}"', value, row_id ),
+               )
+
+            side = next( ( s for s, c in SIDES.items( ) if c == col ), None )
+            if side is None:
+               continue
+            conn.execute( "DELETE FROM row_tags WHERE row_id = ? AND side = ?", ( row_id, side ) )
+            conn.executemany(
+               "INSERT INTO row_tags ( row_id, side, position, tag, tag_key ) VALUES ( ?, ?, ?, ?, ? )",
+               [ ( row_id, side, i, tag, tag.casefold() ) for i, tag in enumerate( split_tags( value ) ) ],
+            )
+
+   def _touch( self, conn, select, params ):
+      conn.execute( "CREATE TEMP TABLE IF NOT EXISTS touched ( row_id INTEGER, side TEXT )" )
+      conn.execute( "DELETE FROM temp.touched" )
+      conn.execute( f"INSERT INTO temp.touched ( row_id, side ) {select}", params )
+
+   def _rewrite_touched( self, conn ):
+      """
+      Rewrite the tag strings of the touched rows and return the new values
+      as ( row_id, extract column, value ).
+      """
+      for side, col in SIDES.items( ):
+         conn.execute( REWRITE_TAGS.format( column = COLUMN_NAMES[ col ], side = side ) )
+
+      changes = [ ]
+      for side, col in SIDES.items( ):
+         for row_id, value in conn.execute(
+            f"SELECT id, {COLUMN_NAMES[ col ]} FROM explanations "
+            f"WHERE id IN ( SELECT row_id FROM temp.touched WHERE side = ? )",
+            ( side, ),
+         ):
+            changes.append( ( row_id, col, value ) )
+      return changes
+
+   def remove_tag( self, key ):
+      """
+      Drop the tag with casefolded key from every row. Returns the changes.
+      """
+      with self.transaction( ) as conn:
+         self._touch( conn, "SELECT DISTINCT row_id, side FROM row_tags WHERE tag_key = ?", ( key, ) )
+         conn.execute( "DELETE FROM row_tags WHERE tag_key = ?", ( key, ) )
+         return self._rewrite_touched( conn )
+
+   def rename_tag( self, key, new_tag ):
+      """
+      Rename the tag with casefolded key to new_tag on every row. Returns the changes.
+      """
+      with self.transaction( ) as conn:
+         self._touch( conn, "SELECT DISTINCT row_id, side FROM row_tags WHERE tag_key = ?", ( key, ) )
+         conn.execute(
+            "UPDATE row_tags SET tag = ?, tag_key = ? WHERE tag_key = ?",
+            ( new_tag, new_tag.casefold(), key ),
+         )
+         return self._rewrite_touched( conn )
+
+   def add_tag_where_no_explanation( self, tag ):
+      """
+      Append tag on both sides of every row with a blank explanation that
+      does not carry it yet. Returns the changes.
+      """
+      key = tag.casefold()
+      with self.transaction( ) as conn:
+         self._touch(
+            conn,
+            f"""
+            SELECT e.id, s.side
+            FROM explanations e CROSS JOIN ( SELECT 'chatgpt' AS side UNION ALL SELECT 'bard' ) s
+            WHERE trim( e.explanation, {BLANK} ) = ''
+              AND NOT EXISTS (
+                 SELECT 1 FROM row_tags r WHERE r.row_id = e.id AND r.side = s.side AND r.tag_key = ?
+              )
+            """,
+            ( key, ),
+         )
+         conn.execute(
+            """
+            INSERT INTO row_tags ( row_id, side, position, tag, tag_key )
+            SELECT t.row_id, t.side,
+                   COALESCE( ( SELECT MAX( position ) + 1 FROM row_tags r WHERE r.row_id = t.row_id AND r.side = t.side ), 0 ),
+                   ?, ?
+            FROM temp.touched t
+            """,
+            ( tag, key ),
+         )
+         return self._rewrite_touched( conn )
+
+   def checkpoint( self ):
+      with self._lock:
+         self.conn.execute( "PRAGMA wal_checkpoint( TRUNCATE )" )
@@ -1,80 +1,1022 @@
+import argparse
+import base64
+import io
 import json
-from http.server import HTTPServer, SimpleHTTPRequestHandler
+import os
+import re
+import sys
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from http.server import HTTPServer, SimpleHTTPRequestHandler, ThreadingHTTPServer
 from pathlib import Path
-from urllib.parse import urlparse
+from urllib.parse import parse_qs, urlparse
 
 import pandas as pd
 
+try:
+   import brotli
+except ImportError:
+   brotli = None
+
+from atomic_io import list_snapshots, restore_snapshot
+from crosstab import crosstab_tables
+from events import RETRY_MS, EventBroker
+from metrics import AccessLog, CountingWriter, Metrics
+from table_io import check_table_path, read_table, write_table
+from search_index import SearchIndex, snippet
+from static_files import CACHE_CONTROL, StaticFiles
+from tag_db import TagDatabase
+from word_counts import MIN_LIFT_COUNT, cached_token_index
+
 
 BASE_DIR = Path( __file__ ).resolve().parents[ 3 ]
 DATA_PATH = BASE_DIR / "assets/data/extract/explanations.csv"
+JOURNAL_PATH = DATA_PATH.with_name( "explanations.journal" )
+# Per-row token index of the explanations, shared with analyze.py.
+TOKENS_PATH = DATA_PATH.with_name( "explanations.tokens.npz" )
 
+# Fold the journal back into the CSV once it holds this many entries.
+COMPACT_AFTER_ENTRIES = 500
 
-def load_rows( ):
-   df = pd.read_csv( DATA_PATH, keep_default_na = False )
+# Responses smaller than this are not worth compressing.
+COMPRESS_MIN_BYTES = 1024
+
+# Streamed responses are encoded and written in blocks of about this size.
+STREAM_BLOCK_BYTES = 64 * 1024
+
+
+TAG_COLUMNS = [ "Tags - ChatGPT", "Tags - Bard" ]
+
+# Tagger page assets loaded and precompressed at startup; figures are cached on first request.
+PRELOAD_ASSETS = [ "tagger.html", "index.html", "assets/scripts/js/*.js", "assets/styles/*.css" ]
+
+# Most /api/events streams served at once in threaded mode; each holds a thread.
+MAX_EVENT_SUBSCRIBERS = 64
+
+# Paths counted under their own name in /api/metrics; see route_label.
+API_ROUTES = {
+   "/api/tags",
+   "/api/tags/remove",
+   "/api/tags/rename",
+   "/api/tags/add_missing_explanations",
+   "/api/crosstab",
+   "/api/terms",
+   "/api/search",
+   "/api/metrics",
+   "/api/events",
+   "/api/explanations",
+   "/api/explanations/batch",
+}
+
+CROSSTAB_SIDES = {
+   "chatgpt": [ "Tags - ChatGPT" ],
+   "bard": [ "Tags - Bard" ],
+   "both": TAG_COLUMNS,
+}
+
+UNTAGGED = "Untagged"
+
+# Terms returned per group by /api/terms unless ?limit= says otherwise.
+TERMS_PER_GROUP = 25
+
+RECORD_FIELDS = {
+   "rating": "Rating",
+   "prompt_category": "Prompt Category",
+   "prompt": "Prompt",
+   "chatgpt": "ChatGPT",
+   "bard": "Bard",
+   "explanation": "Explanation",
+   "tags_chatgpt": "Tags - ChatGPT",
+   "tags_bard": "Tags - Bard",
+}
+
+# Record fields covered by /api/search, and its default page size.
+SEARCH_FIELDS = [ "prompt", "chatgpt", "bard", "explanation" ]
+SEARCH_PAGE_SIZE = 20
+SEARCH_COLUMNS = { RECORD_FIELDS[ field ] for field in SEARCH_FIELDS }
+
+
+def safe_val( value ):
+   if value is None:
+      return ""
+   text = str( value )
+   return "" if text.lower() == "nan" else text
+
+
+def split_tags( raw ):
+   return [ p.strip() for p in str( raw or "" ).split( "," ) if p.strip() ]
+
+
+def rating_number( rating ):
+   """
+   The 1..7 from a rating label such as "Bard much better (1)", or None.
+   """
+   match = re.search( r"\((\d+)\)\s*$", rating or "" )
+   return int( match.group( 1 ) ) if match else None
+
+
+class ReadWriteLock:
+   """
+   Many concurrent readers or one writer. Waiting writers block new readers,
+   so a steady stream of list fetches cannot starve a save.
+   """
+
+   def __init__( self ):
+      self._cond = threading.Condition( threading.Lock( ) )
+      self._readers = 0
+      self._writer = False
+      self._writers_waiting = 0
+
+   @contextmanager
+   def read( self ):
+      with self._cond:
+         while self._writer or self._writers_waiting:
+            self._cond.wait( )
+         self._readers += 1
+      try:
+         yield
+      finally:
+         with self._cond:
+            self._readers -= 1
+            if self._readers == 0:
+               self._cond.notify_all( )
+
+   @contextmanager
+   def write( self ):
+      with self._cond:
+         self._writers_waiting += 1
+         while self._writer or self._readers:
+            self._cond.wait( )
+         self._writers_waiting -= 1
+         self._writer = True
+      try:
+         yield
+      finally:
+         with self._cond:
+            self._writer = False
+            self._cond.notify_all( )
+
+
+class TagJournal:
+   """
+   Append-only log of tag edits, one JSON object per line:
+      {"id": <row id>, "column": <column>, "value": <new value>, "ts": <epoch>}
+
+   Each append is flushed and fsynced, so a save costs a few hundred bytes
+   instead of a full CSV rewrite. Compaction folds it back into the CSV.
+   """
+
+   def __init__( self, path ):
+      self.path = Path( path )
+      self.entries = 0
+
+   def append( self, changes ):
+      if not changes:
+         return
+
+      now = time.time( )
+      lines = [
+         json.dumps( { "id": row_id, "column": col, "value": value, "ts": now } )
+         for row_id, col, value in changes
+      ]
+
+      with open( self.path, "a", encoding = "utf-8" ) as fh:
+         fh.write( "\n".join( lines ) + "\n" )
+         fh.flush( )
+         os.fsync( fh.fileno( ) )
+
+      self.entries += len( lines )
+
+   def replay( self ):
+      """
+      Yield ( row_id, column, value ) for every complete entry in the journal.
+      A torn trailing line from a crash mid-append is ignored.
+      """
+      self.entries = 0
+      if not self.path.exists( ):
+         return
+
+      with open( self.path, "r", encoding = "utf-8" ) as fh:
+         for line in fh:
+            try:
+               entry = json.loads( line )
+               change = ( int( entry[ "id" ] ), str( entry[ "column" ] ), str( entry[ "value" ] ) )
+            except ( ValueError, KeyError, TypeError ):
+               continue
+            self.entries += 1
+            yield change
+
+   def truncate( self ):
+      with open( self.path, "w", encoding = "utf-8" ) as fh:
+         fh.flush( )
+         os.fsync( fh.fileno( ) )
+      self.entries = 0
+
+
+class TagIndex:
+   """
+   Inverted index from casefolded tag to its ( row id, column ) postings.
+
+   Each posting keeps the tag's original spelling so the vocabulary can be
+   reported with the label annotators typed.
+   """
+
+   def __init__( self ):
+      self.postings = { }
+
+   def add( self, row_id, col, raw ):
+      for tag in split_tags( raw ):
+         self.postings.setdefault( tag.casefold(), { } ).setdefault( ( row_id, col ), tag )
+
+   def discard( self, row_id, col, raw ):
+      for tag in split_tags( raw ):
+         key = tag.casefold()
+         postings = self.postings.get( key )
+         if postings is None:
+            continue
+         postings.pop( ( row_id, col ), None )
+         if not postings:
+            del self.postings[ key ]
+
+   def rows_with( self, key ):
+      return sorted( { row_id for row_id, _ in self.postings.get( key, { } ) } )
+
+   def stats( self ):
+      """
+      Tag vocabulary with per-column counts, in the shape tagger.js expects.
+      """
+      stats = [ ]
+      for key in sorted( self.postings ):
+         postings = self.postings[ key ]
+         counts = { "overall": len( postings ), "chatgpt": 0, "bard": 0 }
+         for _, col in postings:
+            counts[ "chatgpt" if col == "Tags - ChatGPT" else "bard" ] += 1
+         stats.append(
+            {
+               "key": key,
+               "label": next( iter( postings.values( ) ) ),
+               "counts": counts,
+            }
+         )
+      return stats
+
+
+class VersionConflict( Exception ):
+   """
+   Raised when an If-Match version no longer matches the stored row.
+   """
 
+   def __init__( self, row_id, current ):
+      super( ).__init__( f"Record id {row_id} was changed by another request." )
+      self.current = current
+
+
+def normalize_extract( df ):
+   """
+   Give an extract an ID column ( numbered from 1 ) and both tag columns if missing.
+   """
    if "ID" not in df.columns:
-      df[ "ID" ] = range( 1, len( df ) + 1 )
+      df.insert( 0, "ID", [ str( i ) for i in range( 1, len( df ) + 1 ) ] )
+
+   for col in TAG_COLUMNS:
+      if col not in df.columns:
+         df[ col ] = ""
 
-   if "Tags - ChatGPT" not in df.columns:
-      df[ "Tags - ChatGPT" ] = ""
-   if "Tags - Bard" not in df.columns:
-      df[ "Tags - Bard" ] = ""
+   return df
 
-   df[ "Tags - ChatGPT" ] = df[ "Tags - ChatGPT" ].fillna( "" ).astype( str )
-   df[ "Tags - Bard" ] = df[ "Tags - Bard" ].fillna( "" ).astype( str )
 
-   records = [ ]
+class ExplanationStore:
+   """
+   Resident copy of the explanations extract, keyed by ID.
 
-   def safe_val( value ):
-      if value is None:
-         return ""
-      text = str( value )
-      return "" if text.lower() == "nan" else text
+   The extract ( CSV, Parquet or Arrow, see table_io ) is parsed once and kept
+   in memory; it is only re-read when its mtime or size changes on disk
+   (e.g. after analyze.py regenerates it).
+   Edits go to a TagJournal and are replayed on top of the CSV at load time.
 
-   for idx, row in df.iterrows( ):
-      records.append(
-         {
-            "id": int( safe_val( row.get( "ID", idx + 1 ) ) or ( idx + 1 ) ),
-            "rating": safe_val( row.get( "Rating", "" ) ),
-            "prompt_category": safe_val( row.get( "Prompt Category", "" ) ),
-            "prompt": safe_val( row.get( "Prompt", "" ) ),
-            "chatgpt": safe_val( row.get( "ChatGPT", "" ) ),
-            "bard": safe_val( row.get( "Bard", "" ) ),
-            "explanation": safe_val( row.get( "Explanation", "" ) ),
-            "tags_chatgpt": safe_val( row.get( "Tags - ChatGPT", "" ) ),
-            "tags_bard": safe_val( row.get( "Tags - Bard", "" ) ),
-         }
+   Access goes through reading() / writing(): reads run in parallel, writes
+   are serialized against each other and against reads. reading() may be
+   nested within a thread.
+
+   Every committed change bumps `generation`; each row remembers the
+   generation it was last changed in as its version. Generations are seeded
+   from the clock at load, so versions handed out before a reload or restart
+   can never match again.
+
+   The Explanation token index is built on first use after each load and
+   cached on disk at tokens_path, where analyze.py can reuse it. The
+   full-text search index is also built on first use, then kept current
+   row by row through edits and reloads.
+
+   Rows touched by set_value are remembered until take_changed(), which
+   the mutators use to publish their changes to /api/events.
+   """
+
+   def __init__( self, path, journal_path, tokens_path = None ):
+      self.path = Path( path )
+      self.journal = TagJournal( journal_path ) if journal_path else None
+      self.tokens_path = Path( tokens_path ) if tokens_path else self.path.with_suffix( ".tokens.npz" )
+      self._pending = [ ]
+      self.columns = [ ]
+      self.rows = { }
+      self.order = [ ]
+      self._records = { }
+      self._stamp = None
+      self.tags = TagIndex( )
+      self.lock = ReadWriteLock( )
+      self._held = threading.local( )
+      self.generation = 0
+      self.base_generation = 0
+      self.versions = { }
+      self._terms = None
+      self._terms_lock = threading.Lock( )
+      self._search = None
+      self._search_lock = threading.Lock( )
+      self._changed = { }
+
+   def _file_stamp( self ):
+      try:
+         stat = self.path.stat( )
+      except FileNotFoundError:
+         return None
+      return ( stat.st_mtime_ns, stat.st_size )
+
+   def _is_stale( self ):
+      return self._stamp is None or self._file_stamp( ) != self._stamp
+
+   def ensure_loaded( self ):
+      if not self._is_stale( ):
+         return
+      with self.lock.write( ):
+         if self._is_stale( ):
+            self._reload( )
+
+   @contextmanager
+   def reading( self ):
+      # Nested reads in one thread share the outer lock: ReadWriteLock is not
+      # reentrant, and a writer waiting in between would deadlock them.
+      if getattr( self._held, "read", False ):
+         yield
+         return
+      self.ensure_loaded( )
+      with self.lock.read( ):
+         self._held.read = True
+         try:
+            yield
+         finally:
+            self._held.read = False
+
+   @contextmanager
+   def writing( self ):
+      with self.lock.write( ):
+         if self._is_stale( ):
+            self._reload( )
+         yield
+
+   def _reload( self ):
+      with METRICS.phase( "load" ):
+         self.load( )
+      # Clients' copies predate this generation, so they must refetch.
+      EVENTS.publish( self.generation, "reload", { "version": self.generation } )
+
+   def load( self ):
+      self._install( normalize_extract( read_table( self.path ) ) )
+
+      for row_id, col, value in self.journal.replay( ):
+         if row_id in self.rows and col in self.columns:
+            self.rows[ row_id ][ col ] = value
+
+      self._index_tags( )
+      self._sync_search( )
+
+   def _install( self, df ):
+      """
+      Make df the resident rows and start a new generation.
+      """
+      columns = list( df.columns )
+      rows = { }
+      order = [ ]
+
+      for idx, values in enumerate( df.itertuples( index = False, name = None ) ):
+         row = { col: safe_val( val ) for col, val in zip( columns, values ) }
+         try:
+            row_id = int( row[ "ID" ] )
+         except ValueError:
+            row_id = idx + 1
+         rows[ row_id ] = row
+         order.append( row_id )
+
+      self.columns = columns
+      self.rows = rows
+      self.order = order
+      self._records = { }
+      self._pending = [ ]
+      self._stamp = self._file_stamp( )
+      self.generation = max( time.time_ns( ) // 1000, self.generation + 1 )
+      self.base_generation = self.generation
+      self.versions = { }
+      self._changed = { }
+      self._terms = None
+
+   def _index_tags( self ):
+      self.tags = TagIndex( )
+      for row_id in self.order:
+         for col in TAG_COLUMNS:
+            self.tags.add( row_id, col, self.rows[ row_id ][ col ] )
+
+   def commit( self ):
+      """
+      Durably record the pending edits in the journal, compacting when it grows.
+      """
+      self.journal.append( self._pending )
+      self._pending = [ ]
+
+      if self.journal.entries >= COMPACT_AFTER_ENTRIES:
+         self.compact( )
+
+   def compact( self ):
+      """
+      Fold the journal into the CSV and start a fresh journal.
+      """
+      if self._stamp is None or self.journal.entries == 0:
+         return
+      self.persist( )
+      self.journal.truncate( )
+
+   def take_changed( self ):
+      """
+      Ids of the rows changed since the last call, in the order they were first changed.
+      """
+      changed = list( self._changed )
+      self._changed = { }
+      return changed
+
+   def frame( self ):
+      return pd.DataFrame(
+         [ self.rows[ row_id ] for row_id in self.order ],
+         columns = self.columns,
       )
 
-   return records
+   def persist( self ):
+      write_table( self.frame( ), self.path )
+      self._stamp = self._file_stamp( )
+
+   def close( self ):
+      """
+      Release anything held open between requests; the file store holds nothing.
+      """
+
+   def record( self, row_id ):
+      rec = self._records.get( row_id )
+      if rec is None:
+         row = self.rows[ row_id ]
+         rec = { "id": row_id }
+         for field, col in RECORD_FIELDS.items():
+            rec[ field ] = row.get( col, "" )
+         rec[ "version" ] = self.version( row_id )
+         self._records[ row_id ] = rec
+      return rec
+
+   def version( self, row_id ):
+      return self.versions.get( row_id, self.base_generation )
+
+   def etag( self ):
+      """
+      Weak validator for the whole dataset; changes with every commit or reload.
+      """
+      return f'W/"{self.generation}"'
+
+   def records( self ):
+      return [ self.record( row_id ) for row_id in self.order ]
+
+   def resolve_id( self, record_id ):
+      """
+      Match on ID first, then fall back to a positional index.
+      """
+      try:
+         row_id = int( str( record_id ) )
+      except ValueError:
+         row_id = None
+      if row_id in self.rows:
+         return row_id
+
+      if isinstance( record_id, int ) and 0 <= record_id < len( self.order ):
+         return self.order[ record_id ]
+
+      raise IndexError( f"Record id {record_id} not found." )
+
+   def _search_texts( self, row_id ):
+      row = self.rows[ row_id ]
+      return { field: row.get( RECORD_FIELDS[ field ], "" ) for field in SEARCH_FIELDS }
+
+   def _sync_search( self ):
+      """
+      After a reload, re-index only the rows whose text changed.
+      """
+      if self._search is not None:
+         self._search.sync( ( row_id, self._search_texts( row_id ) ) for row_id in self.order )
+
+   def search_index( self ):
+      """
+      SearchIndex over SEARCH_FIELDS. Call under reading() or writing().
+      """
+      with self._search_lock:
+         if self._search is None:
+            index = SearchIndex( SEARCH_FIELDS )
+            index.sync( ( row_id, self._search_texts( row_id ) ) for row_id in self.order )
+            self._search = index
+         return self._search
+
+   def token_index( self ):
+      """
+      TokenIndex over the Explanation column. Call under reading() or writing().
+      """
+      with self._terms_lock:
+         if self._terms is None:
+            self._terms = cached_token_index(
+               self.tokens_path,
+               self.order,
+               [ self.rows[ row_id ].get( "Explanation", "" ) for row_id in self.order ],
+            )
+         return self._terms
+
+   def remove_tag( self, tag_ci ):
+      """
+      Remove a casefolded tag from both tag columns; returns the rows changed.
+      """
+      changed_rows = 0
+
+      for row_id in self.tags.rows_with( tag_ci ):
+         row_changed = False
+         for col in TAG_COLUMNS:
+            parts = split_tags( self.rows[ row_id ].get( col ) )
+            filtered = [ p for p in parts if p.casefold() != tag_ci ]
+            if filtered != parts:
+               self.set_value( row_id, col, ", ".join( filtered ) )
+               row_changed = True
+         if row_changed:
+            changed_rows += 1
+
+      return changed_rows
+
+   def rename_tag( self, old_ci, new_clean ):
+      """
+      Rename a casefolded tag in both tag columns; returns the rows changed.
+      """
+      changed_rows = 0
+
+      for row_id in self.tags.rows_with( old_ci ):
+         row_changed = False
+         for col in TAG_COLUMNS:
+            parts = split_tags( self.rows[ row_id ].get( col ) )
+            renamed = [ new_clean if p.casefold() == old_ci else p for p in parts ]
+            if renamed != parts:
+               self.set_value( row_id, col, ", ".join( renamed ) )
+               row_changed = True
+         if row_changed:
+            changed_rows += 1
+
+      return changed_rows
+
+   def add_tag_where_no_explanation( self, tag_clean ):
+      """
+      Add a tag to both tag columns of rows with a blank Explanation
+      ( case-insensitive dedupe ); returns the rows changed.
+      """
+      tag_ci = tag_clean.casefold()
+      changed_rows = 0
+
+      for row_id in self.order:
+         row = self.rows[ row_id ]
+         if str( row.get( "Explanation", "" ) ).strip() != "":
+            continue
+
+         row_changed = False
+         for col in TAG_COLUMNS:
+            parts = split_tags( row.get( col ) )
+            if all( p.casefold() != tag_ci for p in parts ):
+               parts.append( tag_clean )
+               self.set_value( row_id, col, ", ".join( parts ) )
+               row_changed = True
+         if row_changed:
+            changed_rows += 1
+
+      return changed_rows
+
+   def set_value( self, row_id, col, value ):
+      previous = self.rows[ row_id ].get( col, "" )
+      if previous == value:
+         return False
+      if col in TAG_COLUMNS:
+         self.tags.discard( row_id, col, previous )
+         self.tags.add( row_id, col, value )
+      if col == "Explanation":
+         self._terms = None
+      if not self._pending:
+         self.generation += 1
+      self.rows[ row_id ][ col ] = value
+      if self._search is not None and col in SEARCH_COLUMNS:
+         self._search.add( row_id, self._search_texts( row_id ) )
+      self.versions[ row_id ] = self.generation
+      self._changed[ row_id ] = None
+      self._records.pop( row_id, None )
+      self._pending.append( ( row_id, col, value ) )
+      return True
+
+
+class SqliteExplanationStore( ExplanationStore ):
+   """
+   ExplanationStore kept durably in a TagDatabase ( SQLite, WAL ) instead
+   of the extract file plus journal. The database is imported from
+   source_path the first time it is opened; --export writes it back out.
 
+   Reads are still served from the resident rows. Edits are committed as
+   indexed SQL: row edits by primary key, and global tag edits through
+   the row_tags index, after which only the affected rows are refreshed.
+   """
 
-def update_row( record_id, tags_chatgpt, tags_bard ):
-   df = pd.read_csv( DATA_PATH, keep_default_na = False )
+   def __init__( self, path, source_path, tokens_path = None ):
+      super( ).__init__( path, None, tokens_path )
+      self.db = TagDatabase( path )
+      self.source_path = Path( source_path )
+
+   def _file_stamp( self ):
+      if not self.path.exists( ):
+         return None
+      return self.db.data_version( )
+
+   def load( self ):
+      if self.db.is_empty( ):
+         self.db.import_frame( normalize_extract( read_table( self.source_path ) ) )
+      self._install( self.db.export_frame( ) )
+      self._index_tags( )
+      self._sync_search( )
+
+   def commit( self ):
+      self.db.set_values( self._pending )
+      self._pending = [ ]
+
+   def compact( self ):
+      if self._stamp is not None:
+         self.db.checkpoint( )
+
+   def persist( self ):
+      self.compact( )
+
+   def close( self ):
+      self.db.close( )
+
+   def _sync( self, changes ):
+      """
+      Mirror changes already committed to the database into the resident rows.
+      """
+      changed = set( )
+      for row_id, col, value in changes:
+         if row_id in self.rows and self.set_value( row_id, col, value ):
+            changed.add( row_id )
+      self._pending = [ ]
+      return len( changed )
+
+   def remove_tag( self, tag_ci ):
+      return self._sync( self.db.remove_tag( tag_ci ) )
+
+   def rename_tag( self, old_ci, new_clean ):
+      return self._sync( self.db.rename_tag( old_ci, new_clean ) )
+
+   def add_tag_where_no_explanation( self, tag_clean ):
+      return self._sync( self.db.add_tag_where_no_explanation( tag_clean ) )
+
+
+METRICS = Metrics( )
+
+# Change feed behind /api/events; event ids are store generations.
+EVENTS = EventBroker( max_subscribers = MAX_EVENT_SUBSCRIBERS )
+
+STATIC = StaticFiles( BASE_DIR )
+
+# metrics.AccessLog replacing the default stderr request lines; see use_access_log.
+ACCESS_LOG = None
+
+STORE = ExplanationStore( DATA_PATH, JOURNAL_PATH, TOKENS_PATH )
+
+
+def load_rows( ):
+   with STORE.reading( ):
+      return STORE.records( )
+
+
+def load_tag_stats( ):
+   with STORE.reading( ):
+      return STORE.tags.stats( )
 
-   if "ID" not in df.columns:
-      df[ "ID" ] = range( 1, len( df ) + 1 )
 
-   df[ "ID" ] = df[ "ID" ].fillna( "" )
+def dataset_etag( ):
+   with STORE.reading( ):
+      return STORE.etag( )
 
+
+def read_with_etag( fn, *args ):
+   """
+   ( dataset ETag, fn( *args ) ) read under one STORE.reading( ), so the
+   ETag always names the generation the data came from.
+   """
+   with STORE.reading( ):
+      return STORE.etag( ), fn( *args )
+
+
+def load_row( record_id ):
+   """
+   One record by its ID. Unlike writes, reads never fall back to a
+   positional index, so a missing ID is an IndexError ( 404 ).
+   """
+   with STORE.reading( ):
+      if record_id not in STORE.rows:
+         raise IndexError( f"Record id {record_id} not found." )
+      return STORE.record( record_id )
+
+
+def _param_values( params, name ):
+   values = [ ]
+   for raw in params.get( name, [ ] ):
+      values.extend( v.strip() for v in raw.split( "," ) if v.strip() )
+   return values
+
+
+def _param_flag( params, name ):
+   values = params.get( name, [ ] )
+   return bool( values ) and values[ -1 ].strip().lower() in ( "1", "true", "yes", "on" )
+
+
+def _param_int( params, name, default ):
+   values = params.get( name, [ ] )
+   if not values or not values[ -1 ].strip():
+      return default
    try:
-      target_idx = df.index[ df[ "ID" ].astype( str ) == str( record_id ) ][ 0 ]
-   except Exception:
-      if isinstance( record_id, int ) and 0 <= record_id < len( df ):
-         target_idx = record_id
+      value = int( values[ -1 ] )
+   except ValueError:
+      raise ValueError( f"{name} must be an integer" )
+   if value < 0:
+      raise ValueError( f"{name} must not be negative" )
+   return value
+
+
+def _encode_cursor( row_id ):
+   return base64.urlsafe_b64encode( f"id:{row_id}".encode( "utf-8" ) ).decode( "ascii" )
+
+
+def _decode_cursor( cursor ):
+   try:
+      text = base64.urlsafe_b64decode( cursor.encode( "ascii" ) ).decode( "utf-8" )
+      prefix, row_id = text.split( ":", 1 )
+      if prefix != "id":
+         raise ValueError( )
+      return int( row_id )
+   except ( ValueError, UnicodeError ):
+      raise ValueError( "Invalid cursor" )
+
+
+def query_rows( params ):
+   """
+   Filtered, paged and projected view over the resident rows.
+
+   params is a parse_qs() dict. Supported keys:
+      rating, prompt_category   match any of the comma-separated values
+      tag                       rows carrying any of the given tags
+      untagged, missing_explanation   boolean flags
+      offset, limit, cursor     paging (cursor continues after the last row returned)
+      fields                    comma-separated record fields to return ( id is always included )
+   """
+   with STORE.reading( ):
+
+      ratings = { v.casefold() for v in _param_values( params, "rating" ) }
+      categories = { v.casefold() for v in _param_values( params, "prompt_category" ) }
+      tags = [ v.casefold() for v in _param_values( params, "tag" ) ]
+      untagged = _param_flag( params, "untagged" )
+      missing_explanation = _param_flag( params, "missing_explanation" )
+
+      fields = _param_values( params, "fields" )
+      unknown = [ f for f in fields if f != "id" and f not in RECORD_FIELDS ]
+      if unknown:
+         raise ValueError( f"Unknown fields: {', '.join( unknown )}" )
+
+      offset = _param_int( params, "offset", 0 )
+      limit = _param_int( params, "limit", None )
+      cursor = params.get( "cursor", [ "" ] )[ -1 ].strip()
+
+      if tags:
+         tagged_ids = set( )
+         for key in tags:
+            tagged_ids.update( STORE.tags.rows_with( key ) )
+         candidates = [ row_id for row_id in STORE.order if row_id in tagged_ids ]
       else:
-         raise IndexError( f"Record id {record_id} not found." )
+         candidates = STORE.order
+
+      matched = [ ]
+      for row_id in candidates:
+         rec = STORE.record( row_id )
+         if ratings:
+            rating = rec[ "rating" ].casefold()
+            number = rating.rsplit( "(", 1 )[ -1 ].rstrip( ")" ) if rating.endswith( ")" ) else ""
+            if rating not in ratings and number not in ratings:
+               continue
+         if categories and rec[ "prompt_category" ].casefold() not in categories:
+            continue
+         if untagged and ( rec[ "tags_chatgpt" ].strip() or rec[ "tags_bard" ].strip() ):
+            continue
+         if missing_explanation and rec[ "explanation" ].strip():
+            continue
+         matched.append( rec )
+
+      start = offset
+      if cursor:
+         after_id = _decode_cursor( cursor )
+         start = next(
+            ( i + 1 for i, rec in enumerate( matched ) if rec[ "id" ] == after_id ),
+            len( matched ),
+         )
+
+      end = len( matched ) if limit is None else start + limit
+      page = matched[ start:end ]
+
+      if fields:
+         keep = [ "id" ] + [ f for f in fields if f != "id" ]
+         page = [ { f: rec[ f ] for f in keep } for rec in page ]
+
+      return {
+         "total": len( matched ),
+         "offset": start,
+         "limit": limit,
+         "next_cursor": _encode_cursor( page[ -1 ][ "id" ] ) if page and end < len( matched ) else None,
+         "items": page,
+      }
+
+
+def publish_changes( kind = "rows", **fields ):
+   """
+   Push the rows changed by the last commit to /api/events subscribers.
+
+   kind "rows" sends each row's new tags; the global tag operations
+   ( "rename", "remove", "add" ) send fields and the changed ids instead, so
+   clients apply the operation themselves. Call under STORE.writing(),
+   after STORE.commit( ), so events go out in commit order.
+   """
+   changed = STORE.take_changed( )
+   if not changed:
+      return
+
+   data = { "version": STORE.generation }
+   if kind == "rows":
+      data[ "rows" ] = [
+         {
+            "id": row_id,
+            "tags_chatgpt": STORE.rows[ row_id ].get( "Tags - ChatGPT", "" ),
+            "tags_bard": STORE.rows[ row_id ].get( "Tags - Bard", "" ),
+            "version": STORE.version( row_id ),
+         }
+         for row_id in changed
+      ]
+   else:
+      data.update( fields )
+      data[ "ids" ] = changed
+   EVENTS.publish( STORE.generation, kind, data )
+
+
+def tag_fields( payload ):
+   """
+   ( tags_chatgpt, tags_bard ) from a request object, "" when missing.
+   Raises ValueError naming the first field that is not a string.
+   """
+   values = [ ]
+   for field in ( "tags_chatgpt", "tags_bard" ):
+      value = payload.get( field, "" )
+      if not isinstance( value, str ):
+         raise ValueError( f"{field} must be a string" )
+      values.append( value )
+   return tuple( values )
+
+
+def update_row( record_id, tags_chatgpt, tags_bard, expected_version = None ):
+   """
+   Replace one row's tags. When expected_version is given and the row has
+   changed since, VersionConflict is raised and nothing is written.
+   Returns the row's new version.
+   """
+   with STORE.writing( ):
+      row_id = STORE.resolve_id( record_id )
+
+      if expected_version is not None and expected_version != STORE.version( row_id ):
+         raise VersionConflict( row_id, STORE.record( row_id ) )
+
+      with METRICS.phase( "mutate" ):
+         STORE.set_value( row_id, "Tags - ChatGPT", tags_chatgpt )
+         STORE.set_value( row_id, "Tags - Bard", tags_bard )
+
+      with METRICS.phase( "persist" ):
+         STORE.commit( )
+      publish_changes( )
+      return STORE.version( row_id )
+
+
+def update_rows( items, atomic = True ):
+   """
+   Apply many update_row() edits in one transaction and one journal append.
+
+   items is a list of { "id", "tags_chatgpt", "tags_bard", optional "version" };
+   missing tag fields mean "", anything but a string is rejected.
+   Ids resolve exactly as in update_row (ID first, then positional index).
+   Every item is validated before anything is written; with atomic=True a
+   single failure rejects the whole batch, otherwise only the valid items
+   are applied. Returns ( applied, results ) with one result per item.
+   """
+   with STORE.writing( ):
+      results = [ ]
+      planned = [ ]
 
-   if "Tags - ChatGPT" not in df.columns:
-      df[ "Tags - ChatGPT" ] = ""
-   if "Tags - Bard" not in df.columns:
-      df[ "Tags - Bard" ] = ""
+      for item in items:
+         if not isinstance( item, dict ) or "id" not in item:
+            results.append( { "id": None, "ok": False, "status": 400, "error": "Item must be an object with an id" } )
+            continue
 
-   df.at[ target_idx, "Tags - ChatGPT" ] = tags_chatgpt
-   df.at[ target_idx, "Tags - Bard" ] = tags_bard
+         record_id = item[ "id" ]
+         try:
+            record_id = int( record_id )
+         except ( TypeError, ValueError ):
+            results.append( { "id": record_id, "ok": False, "status": 400, "error": "Invalid row id" } )
+            continue
+
+         try:
+            row_id = STORE.resolve_id( record_id )
+         except IndexError as exc:
+            results.append( { "id": record_id, "ok": False, "status": 404, "error": str( exc ) } )
+            continue
+
+         expected_version = item.get( "version" )
+         if expected_version is not None:
+            try:
+               expected_version = int( expected_version )
+            except ( TypeError, ValueError ):
+               results.append( { "id": record_id, "ok": False, "status": 400, "error": "Invalid version" } )
+               continue
+
+         if expected_version is not None and expected_version != STORE.version( row_id ):
+            results.append(
+               {
+                  "id": record_id,
+                  "ok": False,
+                  "status": 409,
+                  "error": str( VersionConflict( row_id, None ) ),
+                  "current": STORE.record( row_id ),
+               }
+            )
+            continue
+
+         try:
+            tags_chatgpt, tags_bard = tag_fields( item )
+         except ValueError as exc:
+            results.append( { "id": record_id, "ok": False, "status": 400, "error": str( exc ) } )
+            continue
+
+         results.append( { "id": record_id, "ok": True, "status": 200 } )
+         planned.append( ( len( results ) - 1, row_id, tags_chatgpt, tags_bard ) )
+
+      failed = len( planned ) != len( results )
+      if atomic and failed:
+         for result in results:
+            if result[ "ok" ]:
+               result.update( { "ok": False, "status": 424, "error": "Not applied: another item in the batch failed" } )
+         return False, results
+
+      with METRICS.phase( "mutate" ):
+         for result_idx, row_id, tags_chatgpt, tags_bard in planned:
+            STORE.set_value( row_id, "Tags - ChatGPT", tags_chatgpt )
+            STORE.set_value( row_id, "Tags - Bard", tags_bard )
+
+      with METRICS.phase( "persist" ):
+         STORE.commit( )
+      publish_changes( )
+
+      for result_idx, row_id, _, _ in planned:
+         results[ result_idx ][ "version" ] = STORE.version( row_id )
 
-   df.to_csv( DATA_PATH, index = False )
+      return bool( planned ), results
+
+
+def batch_status( applied, results ):
+   """
+   Overall status of an update_rows() batch: 200 when it applied ( or had
+   nothing to apply ), else 409 if an item's version conflicted, else the
+   400 / 404 of the items that were invalid.
+   """
+   if applied or all( r[ "ok" ] for r in results ):
+      return 200
+   statuses = { r[ "status" ] for r in results }
+   for status in ( 409, 400, 404 ):
+      if status in statuses:
+         return status
+   return 400
 
 
 def remove_tag_globally( tag_value ):
@@ -85,33 +1027,17 @@ def remove_tag_globally( tag_value ):
    if not tag_value:
       return 0
 
-   df = pd.read_csv( DATA_PATH, keep_default_na = False )
-
    tag_ci = tag_value.strip().casefold()
    if not tag_ci:
       return 0
 
-   changed_rows = 0
-   tag_cols = [ "Tags - ChatGPT", "Tags - Bard" ]
-
-   for col in tag_cols:
-      if col not in df.columns:
-         df[ col ] = ""
-
-   for idx, _ in df.iterrows( ):
-      row_changed = False
-      for col in tag_cols:
-         raw = str( df.at[ idx, col ] or "" )
-         parts = [ p.strip() for p in raw.split( "," ) if p.strip() ]
-         filtered = [ p for p in parts if p.casefold() != tag_ci ]
-         if filtered != parts:
-            df.at[ idx, col ] = ", ".join( filtered )
-            row_changed = True
-      if row_changed:
-         changed_rows += 1
-
-   df.to_csv( DATA_PATH, index = False )
-   return changed_rows
+   with STORE.writing( ):
+      with METRICS.phase( "mutate" ):
+         changed_rows = STORE.remove_tag( tag_ci )
+      with METRICS.phase( "persist" ):
+         STORE.commit( )
+      publish_changes( "remove", tag = tag_value.strip() )
+      return changed_rows
 
 
 def rename_tag_globally( old_value, new_value ):
@@ -122,35 +1048,19 @@ def rename_tag_globally( old_value, new_value ):
    if not old_value or not new_value:
       return 0
 
-   df = pd.read_csv( DATA_PATH, keep_default_na = False )
-
    old_ci = old_value.strip().casefold()
    new_clean = new_value.strip()
 
    if not old_ci or not new_clean:
       return 0
 
-   changed_rows = 0
-   tag_cols = [ "Tags - ChatGPT", "Tags - Bard" ]
-
-   for col in tag_cols:
-      if col not in df.columns:
-         df[ col ] = ""
-
-   for idx, _ in df.iterrows( ):
-      row_changed = False
-      for col in tag_cols:
-         raw = str( df.at[ idx, col ] or "" )
-         parts = [ p.strip() for p in raw.split( "," ) if p.strip() ]
-         renamed = [ new_clean if p.casefold() == old_ci else p for p in parts ]
-         if renamed != parts:
-            df.at[ idx, col ] = ", ".join( renamed )
-            row_changed = True
-      if row_changed:
-         changed_rows += 1
-
-   df.to_csv( DATA_PATH, index = False )
-   return changed_rows
+   with STORE.writing( ):
+      with METRICS.phase( "mutate" ):
+         changed_rows = STORE.rename_tag( old_ci, new_clean )
+      with METRICS.phase( "persist" ):
+         STORE.commit( )
+      publish_changes( "rename", old_tag = old_value.strip(), new_tag = new_clean )
+      return changed_rows
 
 
 def add_tag_for_missing_explanations( tag_value ):
@@ -161,178 +1071,740 @@ def add_tag_for_missing_explanations( tag_value ):
    if not tag_value:
       return 0
 
-   df = pd.read_csv( DATA_PATH, keep_default_na = False )
    tag_clean = tag_value.strip()
    if not tag_clean:
       return 0
-   tag_ci = tag_clean.casefold()
 
-   tag_cols = [ "Tags - ChatGPT", "Tags - Bard" ]
-   for col in tag_cols:
-      if col not in df.columns:
-         df[ col ] = ""
+   with STORE.writing( ):
+      with METRICS.phase( "mutate" ):
+         changed_rows = STORE.add_tag_where_no_explanation( tag_clean )
+      with METRICS.phase( "persist" ):
+         STORE.commit( )
+      publish_changes( "add", tag = tag_clean )
+      return changed_rows
+
+
+def rating_by_tag( side = "both" ):
+   """
+   Live rating x tag crosstab, in the same Count / % of Column layout as
+   analyze.py's Crosstab_*.csv files. A row counts once under every tag it
+   carries on the chosen side(s), or under "Untagged" if it has none.
+   """
+   cols = CROSSTAB_SIDES.get( side )
+   if cols is None:
+      raise ValueError( f"side must be one of {', '.join( CROSSTAB_SIDES )}" )
+
+   with STORE.reading( ):
+      pairs = set( )
+      for postings in STORE.tags.postings.values( ):
+         label = next( iter( postings.values( ) ) )
+         for row_id, col in postings:
+            if col in cols:
+               pairs.add( ( row_id, label ) )
+      ratings = { row_id: STORE.rows[ row_id ].get( "Rating", "" ) for row_id in STORE.order }
+
+   tagged = { row_id for row_id, _ in pairs }
+   pairs.update( ( row_id, UNTAGGED ) for row_id in ratings if row_id not in tagged )
+
+   frame = pd.DataFrame( sorted( pairs ), columns = [ "ID", "Tag" ] )
+   frame[ "Rating" ] = frame[ "ID" ].map( ratings )
+   frame[ "Rating Number" ] = frame[ "Rating" ].str.extract( r"\((\d+)\)\s*$", expand = False )
+
+   # Label ratings the way the extract spells them, e.g. "Bard much better (1)".
+   labelled = frame.dropna( subset = [ "Rating Number" ] ).drop_duplicates( "Rating Number" )
+   labels = dict( zip( labelled[ "Rating Number" ], labelled[ "Rating" ] ) )
+
+   return crosstab_tables( frame, "Rating Number", [ "Tag" ], labels )[ "Tag" ]
+
+
+def term_lift( by = "rating", side = "both", min_count = MIN_LIFT_COUNT, limit = TERMS_PER_GROUP ):
+   """
+   Explanation words that set each rating ( by = "rating" ) or tag
+   ( by = "tag", on the chosen side ) apart, sliced from the token index
+   without re-tokenizing. Groups are returned even when no term reaches
+   min_count.
+   """
+   if by not in ( "rating", "tag" ):
+      raise ValueError( "by must be rating or tag" )
+   cols = CROSSTAB_SIDES.get( side )
+   if cols is None:
+      raise ValueError( f"side must be one of {', '.join( CROSSTAB_SIDES )}" )
+
+   groups = { }
+   with STORE.reading( ):
+      index = STORE.token_index( )
+      if by == "rating":
+         for row_id in STORE.order:
+            groups.setdefault( STORE.rows[ row_id ].get( "Rating", "" ) or "Missing", [ ] ).append( row_id )
+         labels = sorted( groups, key = lambda label: ( rating_number( label ) is None, rating_number( label ) or 0, label ) )
+         groups = { label: groups[ label ] for label in labels }
+      else:
+         for key in sorted( STORE.tags.postings ):
+            postings = STORE.tags.postings[ key ]
+            rows = sorted( { row_id for row_id, col in postings if col in cols } )
+            if rows:
+               groups[ next( iter( postings.values( ) ) ) ] = rows
+
+   table = index.lift_table( groups, min_count, limit )
+
+   terms = { label: [ ] for label in groups }
+   for rec in table.to_dict( orient = "records" ):
+      label = rec.pop( "group" )
+      terms[ label ].append(
+         {
+            "term": rec[ "term" ],
+            "count": int( rec[ "count" ] ),
+            "percent_of_group_words": float( rec[ "percent_of_group_words" ] ),
+            "lift": float( rec[ "lift" ] ),
+         }
+      )
+
+   return {
+      "by": by,
+      "side": side,
+      "groups": [
+         { "label": label, "rows": len( rows ), "terms": terms[ label ] }
+         for label, rows in groups.items( )
+      ],
+   }
+
+
+def search_rows( params ):
+   """
+   Ranked full-text search over the prompt, responses and explanation.
 
-   changed_rows = 0
-   for idx, _ in df.iterrows( ):
-      expl = str( df.at[ idx, "Explanation" ] ) if "Explanation" in df.columns else ""
-      if expl is None:
-         expl = ""
-      if str( expl ).strip() != "":
+   params is a parse_qs() dict. Supported keys:
+      q                 the query ( see search_index.parse_query )
+      fields            comma-separated fields to search ( default: all of SEARCH_FIELDS )
+      offset, limit     paging over the ranked results
+   """
+   query = ( params.get( "q" ) or [ "" ] )[ -1 ].strip()
+   if not query:
+      raise ValueError( "q is required" )
+
+   fields = [ f.casefold() for f in _param_values( params, "fields" ) ]
+   unknown = [ f for f in fields if f not in SEARCH_FIELDS ]
+   if unknown:
+      raise ValueError( f"Unknown search fields: {', '.join( unknown )}" )
+
+   offset = _param_int( params, "offset", 0 )
+   limit = _param_int( params, "limit", SEARCH_PAGE_SIZE )
+
+   with STORE.reading( ):
+      clauses, results = STORE.search_index( ).search( query, fields or None )
+
+      items = [ ]
+      for row_id, score, matched in results[ offset:offset + limit ]:
+         rec = STORE.record( row_id )
+         items.append(
+            {
+               "id": row_id,
+               "score": round( score, 4 ),
+               "fields": matched,
+               "rating": rec[ "rating" ],
+               "prompt_category": rec[ "prompt_category" ],
+               "snippet": snippet( rec[ matched[ 0 ] ], clauses ) if matched else "",
+            }
+         )
+
+   return {
+      "query": query,
+      "total": len( results ),
+      "offset": offset,
+      "limit": limit,
+      "items": items,
+   }
+
+
+def route_label( path ):
+   """
+   Name a request path is counted under, so per-route series stay bounded.
+   """
+   if path in API_ROUTES:
+      return path
+   if path.startswith( "/api/explanations/" ):
+      return "/api/explanations/<id>"
+   if path.startswith( "/api/" ):
+      return "/api/<unknown>"
+   return "<static>"
+
+
+def negotiate_encoding( accept_encoding ):
+   """
+   Pick "br" (when brotli is installed), "gzip" or None from an Accept-Encoding header.
+   """
+   accepted = { }
+   for part in ( accept_encoding or "" ).split( "," ):
+      name, _, params = part.strip().partition( ";" )
+      quality = 1.0
+      params = params.strip()
+      if params.startswith( "q=" ):
+         try:
+            quality = float( params[ 2: ] )
+         except ValueError:
+            quality = 0.0
+      if name:
+         accepted[ name.strip().lower() ] = quality
+
+   for encoding in ( "br", "gzip" ):
+      if encoding == "br" and brotli is None:
          continue
+      if accepted.get( encoding, accepted.get( "*", 0.0 ) ) > 0:
+         return encoding
+   return None
+
+
+def make_compressor( encoding ):
+   """
+   Return ( compress, finish ) callables for a streaming encoder.
+   """
+   if encoding == "br":
+      compressor = brotli.Compressor( quality = 5 )
+      return compressor.process, compressor.finish
+   compressor = zlib.compressobj( 6, zlib.DEFLATED, 31 )
+   return compressor.compress, compressor.flush
 
-      row_changed = False
-      for col in tag_cols:
-         raw = str( df.at[ idx, col ] or "" )
-         parts = [ p.strip() for p in raw.split( "," ) if p.strip() ]
-         if all( p.casefold() != tag_ci for p in parts ):
-            parts.append( tag_clean )
-            df.at[ idx, col ] = ", ".join( parts )
-            row_changed = True
-      if row_changed:
-         changed_rows += 1
 
-   df.to_csv( DATA_PATH, index = False )
-   return changed_rows
+def iter_json_array( records ):
+   yield b"["
+   for idx, rec in enumerate( records ):
+      yield ( b"," if idx else b"" ) + json.dumps( rec ).encode( "utf-8" )
+   yield b"]"
+
+
+def iter_ndjson( records ):
+   for rec in records:
+      yield json.dumps( rec ).encode( "utf-8" ) + b"\n"
+
+
+def iter_json_page( page ):
+   """
+   Stream a query_rows() envelope without serializing the items in one piece.
+   """
+   meta = { key: value for key, value in page.items( ) if key != "items" }
+   yield json.dumps( meta ).encode( "utf-8" )[ :-1 ] + b', "items": '
+   yield from iter_json_array( page[ "items" ] )
+   yield b"}"
 
 
 class TaggingHandler( SimpleHTTPRequestHandler ):
 
+   def setup( self ):
+      super( ).setup( )
+      self.wfile = CountingWriter( self.wfile )
+
+   def send_response( self, code, message = None ):
+      self.status_code = code
+      super( ).send_response( code, message )
+
+   def log_request( self, code = "-", size = "-" ):
+      # With an access log configured, measured() writes one JSON line instead.
+      if ACCESS_LOG is None:
+         super( ).log_request( code, size )
+
+   @contextmanager
+   def measured( self ):
+      """
+      Count the request in METRICS ( and ACCESS_LOG ) once it has been answered.
+      """
+      start = time.perf_counter( )
+      written = self.wfile.count
+      self.status_code = None
+      METRICS.request_started( )
+      try:
+         yield
+      finally:
+         seconds = time.perf_counter( ) - start
+         route = route_label( urlparse( self.path ).path )
+         status = self.status_code or 500
+         try:
+            bytes_in = max( int( self.headers.get( "Content-Length", 0 ) ), 0 )
+         except ValueError:
+            bytes_in = 0
+         bytes_out = self.wfile.count - written
+
+         METRICS.request_finished( self.command, route, status, seconds, bytes_in, bytes_out )
+         if ACCESS_LOG is not None:
+            ACCESS_LOG.write(
+               client = self.client_address[ 0 ],
+               method = self.command,
+               path = self.path,
+               route = route,
+               status = status,
+               duration_ms = round( seconds * 1000.0, 3 ),
+               bytes_in = bytes_in,
+               bytes_out = bytes_out,
+            )
+
    def end_headers( self ):
       self.send_header( "Access-Control-Allow-Origin", "*" )
       self.send_header( "Access-Control-Allow-Methods", "GET, POST, OPTIONS" )
-      self.send_header( "Access-Control-Allow-Headers", "Content-Type" )
+      self.send_header( "Access-Control-Allow-Headers", "Content-Type, If-Match, If-None-Match, Last-Event-ID" )
+      self.send_header( "Access-Control-Expose-Headers", "ETag, X-Total-Count, X-Next-Cursor" )
       super( ).end_headers( )
 
-   def do_OPTIONS( self ):
+   def send_json( self, status, payload, etag = None ):
+      with METRICS.phase( "serialize" ):
+         body = json.dumps( payload ).encode( "utf-8" )
+
+      encoding = None
+      if len( body ) >= COMPRESS_MIN_BYTES:
+         encoding = negotiate_encoding( self.headers.get( "Accept-Encoding" ) )
+      if encoding:
+         with METRICS.phase( "compress" ):
+            compress, finish = make_compressor( encoding )
+            body = compress( body ) + finish( )
+
+      self.send_response( status )
+      self.send_header( "Content-Type", "application/json" )
+      self.send_header( "Content-Length", str( len( body ) ) )
+      self.send_header( "Vary", "Accept-Encoding" )
+      if encoding:
+         self.send_header( "Content-Encoding", encoding )
+      if etag:
+         self.send_header( "ETag", etag )
+      self.end_headers( )
+      with METRICS.phase( "write" ):
+         self.wfile.write( body )
+
+   def send_stream( self, status, chunks, content_type, etag = None, headers = None ):
+      """
+      Write chunks as they are produced, compressed when the client allows it.
+
+      The server speaks HTTP/1.0, so the body is delimited by closing the
+      connection rather than by Content-Length or chunked encoding.
+      """
+      encoding = negotiate_encoding( self.headers.get( "Accept-Encoding" ) )
+
+      self.send_response( status )
+      self.send_header( "Content-Type", content_type )
+      self.send_header( "Vary", "Accept, Accept-Encoding" )
+      if encoding:
+         self.send_header( "Content-Encoding", encoding )
+      if etag:
+         self.send_header( "ETag", etag )
+      for name, value in ( headers or { } ).items( ):
+         self.send_header( name, value )
+      self.end_headers( )
+      self.close_connection = True
+
+      compress, finish = make_compressor( encoding ) if encoding else ( None, None )
+      block = [ ]
+      block_size = 0
+      # Producing the chunks is serialize time; whatever flush() spends is compress / write.
+      spent = { "compress": 0.0, "write": 0.0 }
+      start = time.perf_counter( )
+
+      def flush( final = False ):
+         data = b"".join( block )
+         if compress:
+            mark = time.perf_counter( )
+            data = compress( data ) + ( finish( ) if final else b"" )
+            spent[ "compress" ] += time.perf_counter( ) - mark
+         if data:
+            mark = time.perf_counter( )
+            self.wfile.write( data )
+            self.wfile.flush( )
+            spent[ "write" ] += time.perf_counter( ) - mark
+
+      try:
+         for chunk in chunks:
+            block.append( chunk )
+            block_size += len( chunk )
+            if block_size >= STREAM_BLOCK_BYTES:
+               flush( )
+               block = [ ]
+               block_size = 0
+         flush( final = True )
+      except ( BrokenPipeError, ConnectionResetError ):
+         pass
+      finally:
+         METRICS.observe_phase( "serialize", time.perf_counter( ) - start - sum( spent.values( ) ) )
+         if compress:
+            METRICS.observe_phase( "compress", spent[ "compress" ] )
+         METRICS.observe_phase( "write", spent[ "write" ] )
+
+   def wants_ndjson( self ):
+      return "application/x-ndjson" in self.headers.get( "Accept", "" )
+
+   def not_modified( self, etag ):
+      """
+      Answer 304 when the client's If-None-Match already names etag.
+      """
+      candidates = [ c.strip() for c in self.headers.get( "If-None-Match", "" ).split( "," ) ]
+      if etag not in candidates and "*" not in candidates:
+         return False
+      self.send_response( 304 )
+      self.send_header( "ETag", etag )
+      self.end_headers( )
+      return True
+
+   def if_match_version( self ):
+      """
+      Row version from an If-Match header ( "123", W/"123" or 123 ), or None.
+      """
+      raw = self.headers.get( "If-Match", "" ).strip()
+      if not raw or raw == "*":
+         return None
+      if raw.startswith( "W/" ):
+         raw = raw[ 2: ]
+      return int( raw.strip( '"' ) )
+
+   def content_length( self ):
+      """
+      The request's Content-Length ( 0 when absent ); ValueError if it is not a non-negative integer.
+      """
+      raw = self.headers.get( "Content-Length", "0" ).strip()
+      if not raw.isdigit( ):
+         raise ValueError( "Invalid Content-Length" )
+      return int( raw )
+
+   def read_json_body( self ):
+      content_length = self.content_length( )
+      body = self.rfile.read( content_length ) if content_length > 0 else b"{}"
+
+      try:
+         payload = json.loads( body.decode( "utf-8" ) )
+      except json.JSONDecodeError:
+         payload = { }
+
+      return payload if isinstance( payload, dict ) else { }
+
+   def send_metrics( self, params ):
+      fmt = ( params.get( "format" ) or [ "prometheus" ] )[ -1 ].strip().lower()
+      if fmt == "json":
+         self.send_json( 200, METRICS.snapshot( ) )
+         return
+      if fmt != "prometheus":
+         self.send_json( 400, { "error": "format must be prometheus or json" } )
+         return
+
+      body = METRICS.prometheus( ).encode( "utf-8" )
       self.send_response( 200 )
+      self.send_header( "Content-Type", "text/plain; version=0.0.4; charset=utf-8" )
+      self.send_header( "Content-Length", str( len( body ) ) )
+      self.send_header( "Cache-Control", "no-store" )
       self.end_headers( )
+      self.wfile.write( body )
+
+   def send_events( self, params ):
+      """
+      Stream store changes as Server-Sent Events until the client leaves.
+
+      A reconnecting EventSource resumes from its Last-Event-ID header; a
+      new one passes ?since=<version>, the generation in the ETag of the
+      data it loaded, so nothing committed in between is missed.
+      """
+      last_event_id = self.headers.get( "Last-Event-ID" ) or ( params.get( "since" ) or [ "" ] )[ -1 ]
+      try:
+         last_event_id = int( last_event_id.strip().removeprefix( "W/" ).strip( '"' ) ) if last_event_id else None
+      except ValueError:
+         self.send_json( 400, { "error": "Invalid event id" } )
+         return
+
+      subscription = EVENTS.subscribe( last_event_id )
+      if subscription is None:
+         if EVENTS.max_subscribers == 0:
+            self.send_json( 503, { "error": "Live events need --server threaded" } )
+         else:
+            self.send_json( 503, { "error": "Too many event streams open" } )
+         return
+
+      self.close_connection = True
+      try:
+         self.send_response( 200 )
+         self.send_header( "Content-Type", "text/event-stream; charset=utf-8" )
+         self.send_header( "Cache-Control", "no-store" )
+         self.end_headers( )
+         self.wfile.write( f"retry: {RETRY_MS}\n\n".encode( "utf-8" ) )
+
+         while True:
+            event = subscription.next( )
+            if event is None:
+               if subscription.closed:
+                  break
+               event = b": keep-alive\n\n"
+            self.wfile.write( event )
+      except ( BrokenPipeError, ConnectionResetError ):
+         pass
+      finally:
+         EVENTS.unsubscribe( subscription )
+
+   def send_static( self, head_only = False ):
+      """
+      Serve a file STATIC can cache, with ETag / Last-Modified validators
+      and a precompressed body when the client accepts one. Returns False
+      for anything else, which the base handler then serves from disk.
+      """
+      asset = STATIC.get( self.translate_path( self.path ) )
+      if asset is None:
+         return False
+
+      accepted = negotiate_encoding( self.headers.get( "Accept-Encoding" ) ) if asset.compressible else None
+      encoding, body, etag = asset.variant( accepted )
+
+      if asset.not_modified( self.headers ):
+         self.send_response( 304 )
+      else:
+         self.send_response( 200 )
+         self.send_header( "Content-Type", asset.content_type )
+         self.send_header( "Content-Length", str( len( body ) ) )
+         if encoding:
+            self.send_header( "Content-Encoding", encoding )
+      self.send_header( "ETag", etag )
+      self.send_header( "Last-Modified", asset.last_modified )
+      self.send_header( "Cache-Control", CACHE_CONTROL )
+      if asset.compressible:
+         self.send_header( "Vary", "Accept-Encoding" )
+      self.end_headers( )
+
+      if self.status_code == 200 and not head_only:
+         with METRICS.phase( "write" ):
+            self.wfile.write( body )
+      return True
+
+   def do_OPTIONS( self ):
+      with self.measured( ):
+         self.send_response( 200 )
+         self.end_headers( )
 
    def do_GET( self ):
+      with self.measured( ):
+         self.route_get( )
+
+   def do_HEAD( self ):
+      with self.measured( ):
+         if not self.send_static( head_only = True ):
+            super( ).do_HEAD( )
+
+   def do_POST( self ):
+      with self.measured( ):
+         try:
+            self.content_length( )
+         except ValueError as exc:
+            self.close_connection = True
+            self.send_json( 400, { "error": str( exc ) } )
+            return
+         self.route_post( )
+
+   def route_get( self ):
       parsed = urlparse( self.path )
 
+      if parsed.path == "/api/metrics":
+         self.send_metrics( parse_qs( parsed.query ) )
+         return
+
+      if parsed.path == "/api/events":
+         self.send_events( parse_qs( parsed.query ) )
+         return
+
+      if parsed.path == "/api/tags":
+         try:
+            etag = dataset_etag( )
+            if self.not_modified( etag ):
+               return
+            etag, data = read_with_etag( load_tag_stats )
+         except Exception as exc:
+            self.send_json( 500, { "error": f"Failed to load tags: {exc}" } )
+            return
+
+         self.send_json( 200, data, etag )
+         return
+
+      if parsed.path == "/api/crosstab":
+         params = parse_qs( parsed.query )
+         side = ( params.get( "side" ) or [ "both" ] )[ -1 ].strip().lower()
+         fmt = ( params.get( "format" ) or [ "json" ] )[ -1 ].strip().lower()
+
+         try:
+            if fmt not in ( "json", "csv" ):
+               raise ValueError( "format must be json or csv" )
+            etag = dataset_etag( )
+            if self.not_modified( etag ):
+               return
+            etag, table = read_with_etag( rating_by_tag, side )
+         except ValueError as exc:
+            self.send_json( 400, { "error": str( exc ) } )
+            return
+         except Exception as exc:
+            self.send_json( 500, { "error": f"Failed to build crosstab: {exc}" } )
+            return
+
+         if fmt == "csv":
+            buffer = io.StringIO( )
+            table.to_csv( buffer )
+            self.send_stream( 200, [ buffer.getvalue( ).encode( "utf-8" ) ], "text/csv; charset=utf-8", etag )
+         else:
+            payload = table.to_dict( orient = "split" )
+            payload[ "side" ] = side
+            self.send_json( 200, payload, etag )
+         return
+
+      if parsed.path == "/api/terms":
+         params = parse_qs( parsed.query )
+
+         try:
+            by = ( params.get( "by" ) or [ "rating" ] )[ -1 ].strip().lower()
+            side = ( params.get( "side" ) or [ "both" ] )[ -1 ].strip().lower()
+            min_count = _param_int( params, "min_count", MIN_LIFT_COUNT )
+            limit = _param_int( params, "limit", TERMS_PER_GROUP )
+            etag = dataset_etag( )
+            if self.not_modified( etag ):
+               return
+            etag, data = read_with_etag( term_lift, by, side, min_count, limit )
+         except ValueError as exc:
+            self.send_json( 400, { "error": str( exc ) } )
+            return
+         except Exception as exc:
+            self.send_json( 500, { "error": f"Failed to count terms: {exc}" } )
+            return
+
+         self.send_json( 200, data, etag )
+         return
+
+      if parsed.path == "/api/search":
+         params = parse_qs( parsed.query )
+
+         try:
+            etag = dataset_etag( )
+            if self.not_modified( etag ):
+               return
+            etag, data = read_with_etag( search_rows, params )
+         except ValueError as exc:
+            self.send_json( 400, { "error": str( exc ) } )
+            return
+         except Exception as exc:
+            self.send_json( 500, { "error": f"Search failed: {exc}" } )
+            return
+
+         self.send_json( 200, data, etag )
+         return
+
       if parsed.path == "/api/explanations":
+         params = parse_qs( parsed.query )
+
+         try:
+            etag = dataset_etag( )
+            if self.not_modified( etag ):
+               return
+            if params:
+               etag, data = read_with_etag( query_rows, params )
+            else:
+               etag, data = read_with_etag( load_rows )
+         except ValueError as exc:
+            self.send_json( 400, { "error": str( exc ) } )
+            return
+         except Exception as exc:
+            self.send_json( 500, { "error": f"Failed to load data: {exc}" } )
+            return
+
+         if self.wants_ndjson( ):
+            headers = { }
+            records = data
+            if params:
+               records = data[ "items" ]
+               headers[ "X-Total-Count" ] = str( data[ "total" ] )
+               if data[ "next_cursor" ]:
+                  headers[ "X-Next-Cursor" ] = data[ "next_cursor" ]
+            self.send_stream( 200, iter_ndjson( records ), "application/x-ndjson", etag, headers )
+         elif params:
+            self.send_stream( 200, iter_json_page( data ), "application/json", etag )
+         else:
+            self.send_stream( 200, iter_json_array( data ), "application/json", etag )
+         return
+
+      if parsed.path.startswith( "/api/explanations/" ):
+         try:
+            row_id = int( parsed.path.rsplit( "/", 1 )[ 1 ] )
+         except ( ValueError, IndexError ):
+            self.send_json( 400, { "error": "Invalid row id" } )
+            return
+
          try:
-            data = load_rows( )
+            data = load_row( row_id )
+         except IndexError as exc:
+            self.send_json( 404, { "error": str( exc ) } )
+            return
          except Exception as exc:
-            self.send_response( 500 )
-            self.send_header( "Content-Type", "application/json" )
-            self.end_headers( )
-            self.wfile.write(
-               json.dumps( { "error": f"Failed to load data: {exc}" } ).encode( "utf-8" )
-            )
+            self.send_json( 500, { "error": f"Failed to load row: {exc}" } )
             return
 
-         self.send_response( 200 )
-         self.send_header( "Content-Type", "application/json" )
-         self.end_headers( )
-         self.wfile.write( json.dumps( data ).encode( "utf-8" ) )
+         self.send_json( 200, data, f'"{data[ "version" ]}"' )
+         return
+
+      if self.send_static( ):
          return
 
       return super( ).do_GET( )
 
-   def do_POST( self ):
+   def route_post( self ):
       parsed = urlparse( self.path )
 
       if parsed.path == "/api/tags/remove":
-         content_length = int( self.headers.get( "Content-Length", 0 ) )
-         body = self.rfile.read( content_length ) if content_length > 0 else b"{}"
-
-         try:
-            payload = json.loads( body.decode( "utf-8" ) )
-         except json.JSONDecodeError:
-            payload = { }
+         payload = self.read_json_body( )
 
          tag_value = str( payload.get( "tag", "" ) ).strip()
          if not tag_value:
-            self.send_response( 400 )
-            self.send_header( "Content-Type", "application/json" )
-            self.end_headers( )
-            self.wfile.write(
-               json.dumps( { "error": "Missing tag" } ).encode( "utf-8" )
-            )
+            self.send_json( 400, { "error": "Missing tag" } )
             return
 
          try:
             changed = remove_tag_globally( tag_value )
          except Exception as exc:
-            self.send_response( 500 )
-            self.send_header( "Content-Type", "application/json" )
-            self.end_headers( )
-            self.wfile.write(
-               json.dumps( { "error": f"Failed to remove tag: {exc}" } ).encode( "utf-8" )
-            )
+            self.send_json( 500, { "error": f"Failed to remove tag: {exc}" } )
             return
 
-         self.send_response( 200 )
-         self.send_header( "Content-Type", "application/json" )
-         self.end_headers( )
-         self.wfile.write( json.dumps( { "removed_rows": changed } ).encode( "utf-8" ) )
+         self.send_json( 200, { "removed_rows": changed } )
          return
 
       if parsed.path == "/api/tags/rename":
-         content_length = int( self.headers.get( "Content-Length", 0 ) )
-         body = self.rfile.read( content_length ) if content_length > 0 else b"{}"
-
-         try:
-            payload = json.loads( body.decode( "utf-8" ) )
-         except json.JSONDecodeError:
-            payload = { }
+         payload = self.read_json_body( )
 
          old_value = str( payload.get( "old_tag", "" ) ).strip()
          new_value = str( payload.get( "new_tag", "" ) ).strip()
 
          if not old_value or not new_value:
-            self.send_response( 400 )
-            self.send_header( "Content-Type", "application/json" )
-            self.end_headers( )
-            self.wfile.write(
-               json.dumps( { "error": "Both old_tag and new_tag are required" } ).encode( "utf-8" )
-            )
+            self.send_json( 400, { "error": "Both old_tag and new_tag are required" } )
             return
 
          try:
             changed = rename_tag_globally( old_value, new_value )
          except Exception as exc:
-            self.send_response( 500 )
-            self.send_header( "Content-Type", "application/json" )
-            self.end_headers( )
-            self.wfile.write(
-               json.dumps( { "error": f"Failed to rename tag: {exc}" } ).encode( "utf-8" )
-            )
+            self.send_json( 500, { "error": f"Failed to rename tag: {exc}" } )
             return
 
-         self.send_response( 200 )
-         self.send_header( "Content-Type", "application/json" )
-         self.end_headers( )
-         self.wfile.write( json.dumps( { "updated_rows": changed } ).encode( "utf-8" ) )
+         self.send_json( 200, { "updated_rows": changed } )
          return
 
       if parsed.path == "/api/tags/add_missing_explanations":
-         content_length = int( self.headers.get( "Content-Length", 0 ) )
-         body = self.rfile.read( content_length ) if content_length > 0 else b"{}"
-
-         try:
-            payload = json.loads( body.decode( "utf-8" ) )
-         except json.JSONDecodeError:
-            payload = { }
+         payload = self.read_json_body( )
 
          tag_value = str( payload.get( "tag", "" ) ).strip() or "worker did not provide an explanation"
 
          try:
             changed = add_tag_for_missing_explanations( tag_value )
          except Exception as exc:
-            self.send_response( 500 )
-            self.send_header( "Content-Type", "application/json" )
-            self.end_headers( )
-            self.wfile.write(
-               json.dumps( { "error": f"Failed to apply missing-explanation tag: {exc}" } ).encode( "utf-8" )
-            )
+            self.send_json( 500, { "error": f"Failed to apply missing-explanation tag: {exc}" } )
             return
 
-         self.send_response( 200 )
-         self.send_header( "Content-Type", "application/json" )
-         self.end_headers( )
-         self.wfile.write( json.dumps( { "updated_rows": changed } ).encode( "utf-8" ) )
+         self.send_json( 200, { "updated_rows": changed } )
+         return
+
+      if parsed.path == "/api/explanations/batch":
+         payload = self.read_json_body( )
+
+         items = payload.get( "items" )
+         if not isinstance( items, list ) or not items:
+            self.send_json( 400, { "error": "items must be a non-empty list" } )
+            return
+
+         try:
+            applied, results = update_rows( items, atomic = payload.get( "atomic", True ) is not False )
+         except Exception as exc:
+            self.send_json( 500, { "error": f"Failed to apply batch: {exc}" } )
+            return
+
+         self.send_json( batch_status( applied, results ), { "applied": applied, "results": results } )
          return
 
       if parsed.path.startswith( "/api/explanations/" ):
@@ -340,68 +1812,266 @@ class TaggingHandler( SimpleHTTPRequestHandler ):
             row_id_str = parsed.path.rsplit( "/", 1 )[ 1 ]
             row_id = int( row_id_str )
          except ( ValueError, IndexError ):
-            self.send_response( 400 )
-            self.send_header( "Content-Type", "application/json" )
-            self.end_headers( )
-            self.wfile.write(
-               json.dumps( { "error": "Invalid row id" } ).encode( "utf-8" )
-            )
+            self.send_json( 400, { "error": "Invalid row id" } )
             return
 
-         content_length = int( self.headers.get( "Content-Length", 0 ) )
-         body = self.rfile.read( content_length ) if content_length > 0 else b"{}"
+         payload = self.read_json_body( )
 
          try:
-            payload = json.loads( body.decode( "utf-8" ) )
-         except json.JSONDecodeError:
-            payload = { }
+            tags_chatgpt, tags_bard = tag_fields( payload )
+         except ValueError as exc:
+            self.send_json( 400, { "error": str( exc ) } )
+            return
 
-         tags_chatgpt = str( payload.get( "tags_chatgpt", "" ) )
-         tags_bard = str( payload.get( "tags_bard", "" ) )
+         try:
+            expected_version = self.if_match_version( )
+         except ValueError:
+            self.send_json( 400, { "error": "Invalid If-Match header" } )
+            return
 
          try:
-            update_row( row_id, tags_chatgpt, tags_bard )
+            version = update_row( row_id, tags_chatgpt, tags_bard, expected_version )
          except IndexError as exc:
-            self.send_response( 404 )
-            self.send_header( "Content-Type", "application/json" )
-            self.end_headers( )
-            self.wfile.write( json.dumps( { "error": str( exc ) } ).encode( "utf-8" ) )
+            self.send_json( 404, { "error": str( exc ) } )
+            return
+         except VersionConflict as exc:
+            self.send_json( 409, { "error": str( exc ), "current": exc.current } )
             return
          except Exception as exc:
-            self.send_response( 500 )
-            self.send_header( "Content-Type", "application/json" )
-            self.end_headers( )
-            self.wfile.write(
-               json.dumps( { "error": f"Failed to update row: {exc}" } ).encode( "utf-8" )
-            )
+            self.send_json( 500, { "error": f"Failed to update row: {exc}" } )
             return
 
          self.send_response( 204 )
+         self.send_header( "ETag", f'"{version}"' )
          self.end_headers( )
          return
 
       return super( ).do_POST( )
 
 
-def run( host = "127.0.0.1", port = 8000 ):
+class PooledHTTPServer( HTTPServer ):
+   """
+   HTTPServer that hands each connection to a fixed-size worker pool.
+   """
+
+   def __init__( self, server_address, handler_class, workers ):
+      super( ).__init__( server_address, handler_class )
+      self.pool = ThreadPoolExecutor( max_workers = workers, thread_name_prefix = "tagger" )
+
+   def process_request( self, request, client_address ):
+      self.pool.submit( self.process_request_thread, request, client_address )
+
+   def process_request_thread( self, request, client_address ):
+      try:
+         self.finish_request( request, client_address )
+      except Exception:
+         self.handle_error( request, client_address )
+      finally:
+         self.shutdown_request( request )
+
+   def server_close( self ):
+      super( ).server_close( )
+      self.pool.shutdown( wait = True )
+
+
+def make_server( host, port, mode = "threaded", workers = 0 ):
+   """
+   mode "single" handles one connection at a time (the original behaviour);
+   "threaded" uses a thread per connection, or a pool of `workers` threads.
+   """
    handler_class = lambda *args, **kwargs: TaggingHandler(
       *args,
       directory = str( BASE_DIR ),
       **kwargs
    )
 
-   httpd = HTTPServer( ( host, port ), handler_class )
+   if mode == "single":
+      return HTTPServer( ( host, port ), handler_class )
+   if workers > 0:
+      return PooledHTTPServer( ( host, port ), handler_class, workers )
+
+   httpd = ThreadingHTTPServer( ( host, port ), handler_class )
+   httpd.daemon_threads = True
+   return httpd
+
 
-   print( f"Serving tagger at http://{host}:{port}/tagger.html" )
-   print( f"API: GET /api/explanations, POST /api/explanations/<row_id>" )
-   print( f"CSV path: {DATA_PATH}" )
+def run( host = "127.0.0.1", port = 8000, mode = "threaded", workers = 0 ):
+   STORE.ensure_loaded( )
+   print( f"Loaded {len( STORE.order )} rows into memory." )
+
+   files, size = STATIC.preload( PRELOAD_ASSETS )
+   print( f"Cached {files} page assets ({size} bytes with compressed copies)." )
+
+   httpd = make_server( host, port, mode, workers )
+
+   # Each event stream holds a thread: none in single mode, and never the whole pool.
+   if mode == "single":
+      EVENTS.max_subscribers = 0
+   elif workers > 0:
+      EVENTS.max_subscribers = min( MAX_EVENT_SUBSCRIBERS, workers - 1 )
+
+   print( f"Serving tagger at http://{host}:{port}/tagger.html ({mode}, workers={workers or 'per-connection'})" )
+   print( f"API: GET /api/explanations[?offset&limit&cursor&fields&filters], GET /api/explanations/<row_id>" )
+   print( f"     GET /api/tags, POST /api/explanations/<row_id>, POST /api/explanations/batch" )
+   print( f"     GET /api/crosstab[?side&format], GET /api/terms[?by&side&min_count&limit]" )
+   print( f"     GET /api/search?q=[&fields&offset&limit], GET /api/metrics[?format=prometheus|json]" )
+   print( f"     GET /api/events[?since] (Server-Sent Events: row and tag changes)" )
+   print( f"Data path: {STORE.path}" )
 
    try:
       httpd.serve_forever( )
    except KeyboardInterrupt:
       print( "\nShutting down server." )
+      EVENTS.close( )
       httpd.server_close( )
+   finally:
+      with STORE.lock.write( ):
+         STORE.compact( )
+         STORE.close( )
+
+
+def use_sqlite( db_path, source_path ):
+   """
+   Serve from a SQLite database, imported from source_path on first use.
+   """
+   global STORE
+   db_path = Path( db_path )
+   STORE = SqliteExplanationStore( db_path, source_path, db_path.with_suffix( ".tokens.npz" ) )
+
+
+def use_access_log( target ):
+   """
+   Log each request as a JSON line to target ( a path, or "-" for stderr )
+   instead of the default stderr lines.
+   """
+   global ACCESS_LOG
+   stream = sys.stderr if str( target ) == "-" else open( target, "a", encoding = "utf-8" )
+   ACCESS_LOG = AccessLog( stream )
+
+
+def use_data_path( path ):
+   """
+   Point the store at another extract; its journal and token cache sit beside it.
+   """
+   global STORE
+   path = Path( path )
+   check_table_path( path )
+   STORE = ExplanationStore( path, path.with_suffix( ".journal" ), path.with_suffix( ".tokens.npz" ) )
+
+
+def main( ):
+   parser = argparse.ArgumentParser( description = "Serve the explanations tagger." )
+   parser.add_argument(
+      "--data",
+      type = Path,
+      default = DATA_PATH,
+      help = "Extract to serve and edit: .csv, .parquet or .arrow (default: explanations.csv). "
+             "Parquet and Arrow need pyarrow.",
+   )
+   parser.add_argument( "--host", default = "127.0.0.1", help = "Interface to bind (default: 127.0.0.1)." )
+   parser.add_argument( "--port", type = int, default = 8000, help = "Port to listen on (default: 8000)." )
+   parser.add_argument(
+      "--server",
+      choices = [ "single", "threaded" ],
+      default = "threaded",
+      help = "single: one request at a time; threaded: concurrent requests (default).",
+   )
+   parser.add_argument(
+      "--workers",
+      type = int,
+      default = 0,
+      help = "Size of the worker pool in threaded mode (default: 0, one thread per connection).",
+   )
+   parser.add_argument(
+      "--access-log",
+      metavar = "PATH",
+      help = "Write one JSON line per request (method, route, status, duration, bytes) to PATH, "
+             "or - for stderr, instead of the default request log lines.",
+   )
+   parser.add_argument(
+      "--compact",
+      action = "store_true",
+      help = "Fold the tag journal into the extract (with --sqlite: checkpoint the WAL) and exit.",
+   )
+   parser.add_argument(
+      "--sqlite",
+      type = Path,
+      metavar = "DB",
+      help = "Keep the extract in a SQLite database (WAL mode) at DB instead of the --data file. "
+             "DB is imported from --data when it does not exist yet; use --export to write it back.",
+   )
+   parser.add_argument(
+      "--export",
+      type = Path,
+      metavar = "PATH",
+      help = "Write the extract, with pending journal edits, to PATH in the format of its suffix "
+             "(.csv, .parquet or .arrow) and exit. Use it to import a CSV into a columnar file or back.",
+   )
+   parser.add_argument(
+      "--list-snapshots",
+      action = "store_true",
+      help = "List the rotating snapshots of the extract and exit.",
+   )
+   parser.add_argument(
+      "--restore",
+      nargs = "?",
+      const = "latest",
+      metavar = "SNAPSHOT",
+      help = "Roll the extract back to a snapshot (default: the newest) and exit. "
+             "Pending journal edits are discarded. Stop the server first.",
+   )
+   args = parser.parse_args( )
+
+   try:
+      if args.sqlite:
+         check_table_path( args.data )
+         use_sqlite( args.sqlite, args.data )
+      elif args.data != DATA_PATH:
+         use_data_path( args.data )
+      if args.export:
+         check_table_path( args.export )
+   except ( ValueError, ImportError ) as exc:
+      parser.error( str( exc ) )
+
+   if args.sqlite and ( args.list_snapshots or args.restore ):
+      parser.error( "--list-snapshots and --restore apply to the extract file, not to --sqlite" )
+
+   if args.list_snapshots:
+      for snapshot in list_snapshots( STORE.path ):
+         print( snapshot.name )
+      return
+
+   if args.restore:
+      # No compaction first: it would write a snapshot of its own, and "latest" would pick that.
+      restored = restore_snapshot( STORE.path, None if args.restore == "latest" else args.restore )
+      STORE.journal.truncate( )
+      print( f"Restored {STORE.path} from {restored.name}" )
+      return
+
+   if args.compact and args.sqlite:
+      STORE.ensure_loaded( )
+      STORE.compact( )
+      print( f"Checkpointed {STORE.path}" )
+      return
+
+   if args.compact:
+      STORE.ensure_loaded( )
+      entries = STORE.journal.entries
+      STORE.compact( )
+      print( f"Compacted {entries} journal entries into {STORE.path}" )
+      return
+
+   if args.export:
+      with STORE.reading( ):
+         write_table( STORE.frame( ), args.export )
+      print( f"Exported {len( STORE.order )} rows from {STORE.path} to {args.export}" )
+      return
+
+   if args.access_log:
+      use_access_log( args.access_log )
+
+   run( args.host, args.port, args.server, args.workers )
 
 
 if __name__ == "__main__":
-   run( )
+   main( )
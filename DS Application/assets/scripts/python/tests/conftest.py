@@ -0,0 +1,61 @@
+import sys
+import threading
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+# The scripts import each other as top-level modules.
+sys.path.insert( 0, str( Path( __file__ ).resolve().parents[ 1 ] ) )
+
+import tag_server
+from events import EventBroker
+
+
+ROWS = [
+   { "ID": "1", "Rating": "ChatGPT much better (7)", "Prompt Category": "Coding", "Prompt": "sort a list",
+     "ChatGPT": "use sorted", "Bard": "use sort", "Explanation": "clearer answer", "Tags - ChatGPT": "clear", "Tags - Bard": "" },
+   { "ID": "2", "Rating": "Bard better (2)", "Prompt Category": "Writing", "Prompt": "write a poem",
+     "ChatGPT": "roses", "Bard": "violets", "Explanation": "", "Tags - ChatGPT": "", "Tags - Bard": "" },
+   { "ID": "3", "Rating": "About the same (4)", "Prompt Category": "Coding", "Prompt": "reverse a string",
+     "ChatGPT": "slice it", "Bard": "loop over it", "Explanation": "both work", "Tags - ChatGPT": "clear, short", "Tags - Bard": "Clear" },
+   { "ID": "5", "Rating": "Bard much better (1)", "Prompt Category": "Writing", "Prompt": "summarize",
+     "ChatGPT": "too long", "Bard": "short summary", "Explanation": "Bard is concise", "Tags - ChatGPT": "", "Tags - Bard": "short" },
+]
+
+
+@pytest.fixture
+def extract_path( tmp_path ):
+   path = tmp_path / "explanations.csv"
+   pd.DataFrame( ROWS ).to_csv( path, index = False )
+   return path
+
+
+def make_store( path ):
+   return tag_server.ExplanationStore( path, path.with_suffix( ".journal" ), path.with_suffix( ".tokens.npz" ) )
+
+
+@pytest.fixture
+def store( extract_path, monkeypatch ):
+   """
+   A fresh tag_server.STORE ( and event broker ) over a four-row extract.
+   """
+   store = make_store( extract_path )
+   monkeypatch.setattr( tag_server, "STORE", store )
+   monkeypatch.setattr( tag_server, "EVENTS", EventBroker( ) )
+   store.ensure_loaded( )
+   return store
+
+
+@pytest.fixture
+def server( store, monkeypatch ):
+   """
+   Base URL of a threaded tag_server serving the store fixture.
+   """
+   monkeypatch.setattr( tag_server.TaggingHandler, "log_message", lambda *args: None )
+   httpd = tag_server.make_server( "127.0.0.1", 0, "threaded" )
+   thread = threading.Thread( target = httpd.serve_forever, daemon = True )
+   thread.start( )
+   yield f"http://127.0.0.1:{httpd.server_address[ 1 ]}"
+   httpd.shutdown( )
+   httpd.server_close( )
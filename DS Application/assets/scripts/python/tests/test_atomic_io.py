@@ -0,0 +1,28 @@
+import os
+import stat
+
+from atomic_io import atomic_write, list_snapshots
+
+
+def mode( path ):
+   return stat.S_IMODE( os.stat( path ).st_mode )
+
+
+def test_atomic_write_keeps_permissions( tmp_path ):
+   path = tmp_path / "data.csv"
+   path.write_text( "old", encoding = "utf-8" )
+   os.chmod( path, 0o640 )
+
+   atomic_write( path, lambda fh: fh.write( "new" ) )
+
+   assert path.read_text( encoding = "utf-8" ) == "new"
+   assert mode( path ) == 0o640
+
+
+def test_atomic_write_snapshots_previous_version( tmp_path ):
+   path = tmp_path / "data.csv"
+   atomic_write( path, lambda fh: fh.write( "one" ) )
+   atomic_write( path, lambda fh: fh.write( "two" ) )
+
+   snapshots = list_snapshots( path )
+   assert [ s.read_text( encoding = "utf-8" ) for s in snapshots ] == [ "one" ]
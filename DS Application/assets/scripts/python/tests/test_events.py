@@ -0,0 +1,63 @@
+import tag_server
+from events import EventBroker, Subscription
+
+
+def drain( subscription ):
+   events = [ ]
+   while ( event := subscription.next( timeout = 0 ) ) is not None:
+      events.append( event.decode( "utf-8" ) )
+   return events
+
+
+def event_ids( events ):
+   return [ int( event.split( "\n", 1 )[ 0 ].removeprefix( "id: " ) ) for event in events ]
+
+
+def test_last_event_id_replays_missed_events( ):
+   broker = EventBroker( )
+   for event_id in ( 10, 11, 12, 13 ):
+      broker.publish( event_id, "rows", { "version": event_id } )
+
+   assert event_ids( drain( broker.subscribe( 11 ) ) ) == [ 12, 13 ]
+   assert drain( broker.subscribe( 13 ) ) == [ ]
+
+
+def test_client_behind_history_gets_reload( ):
+   broker = EventBroker( history_size = 2 )
+   for event_id in ( 10, 11, 12, 13 ):
+      broker.publish( event_id, "rows", { "version": event_id } )
+
+   events = drain( broker.subscribe( 10 ) )
+   assert len( events ) == 1
+   assert "event: reload" in events[ 0 ]
+
+
+def test_slow_subscriber_is_dropped_without_blocking( ):
+   broker = EventBroker( )
+   subscription = broker.subscribe( )
+   for event_id in range( subscription.limit + 5 ):
+      broker.publish( event_id, "rows", { "version": event_id } )
+
+   assert subscription.closed == "overflow"
+   assert broker.subscribers == 0
+   # What was queued before the overflow is still delivered, then the stream ends.
+   assert len( drain( subscription ) ) == subscription.limit
+
+
+def test_subscription_wakes_on_close( ):
+   subscription = Subscription( )
+   subscription.close( )
+   assert subscription.next( timeout = 5 ) is None
+
+
+def test_mutators_publish_in_commit_order( store ):
+   subscription = tag_server.EVENTS.subscribe( )
+
+   tag_server.update_row( 1, "a", "" )
+   tag_server.rename_tag_globally( "short", "brief" )
+   tag_server.update_row( 1, "a", "" )  # no change, no event
+
+   events = drain( subscription )
+   assert [ event.split( "\n" )[ 1 ] for event in events ] == [ "event: rows", "event: rename" ]
+   assert event_ids( events ) == sorted( event_ids( events ) )
+   assert '"ids":[3,5]' in events[ 1 ]
@@ -0,0 +1,206 @@
+import json
+import socket
+import urllib.error
+import urllib.request
+from urllib.parse import urlparse
+
+import pytest
+
+import tag_server
+from conftest import make_store
+
+
+def request( base, path, payload = None, headers = None ):
+   data = None if payload is None else json.dumps( payload ).encode( "utf-8" )
+   req = urllib.request.Request( base + path, data = data, headers = headers or { } )
+   if data is not None:
+      req.add_header( "Content-Type", "application/json" )
+   try:
+      with urllib.request.urlopen( req ) as response:
+         return response.status, response.headers, response.read( )
+   except urllib.error.HTTPError as exc:
+      return exc.code, exc.headers, exc.read( )
+
+
+def raw_post( base, path, content_length, body = b"" ):
+   parsed = urlparse( base )
+   with socket.create_connection( ( parsed.hostname, parsed.port ), timeout = 5 ) as sock:
+      sock.sendall(
+         f"POST {path} HTTP/1.1\r\nHost: x\r\nContent-Length: {content_length}\r\n\r\n".encode( "ascii" ) + body
+      )
+      response = b""
+      while chunk := sock.recv( 65536 ):
+         response += chunk
+   head, _, body = response.partition( b"\r\n\r\n" )
+   return int( head.split( )[ 1 ] ), json.loads( body )
+
+
+# Journal ------------------------------------------------------------------
+
+def test_journal_replayed_after_restart( store, extract_path ):
+   tag_server.update_row( 2, "vivid", "flat" )
+   tag_server.rename_tag_globally( "CLEAR", "lucid" )
+
+   restarted = make_store( extract_path )
+   restarted.ensure_loaded( )
+
+   assert restarted.journal.entries > 0
+   assert restarted.rows[ 2 ][ "Tags - ChatGPT" ] == "vivid"
+   assert restarted.rows[ 2 ][ "Tags - Bard" ] == "flat"
+   assert restarted.rows[ 3 ][ "Tags - ChatGPT" ] == "lucid, short"
+   assert restarted.rows[ 3 ][ "Tags - Bard" ] == "lucid"
+
+
+def test_journal_ignores_torn_trailing_line( store, extract_path ):
+   tag_server.update_row( 2, "vivid", "" )
+   with open( store.journal.path, "a", encoding = "utf-8" ) as fh:
+      fh.write( '{"id": 1, "column": "Tags - Bard", "val' )
+
+   restarted = make_store( extract_path )
+   restarted.ensure_loaded( )
+
+   assert restarted.rows[ 2 ][ "Tags - ChatGPT" ] == "vivid"
+   assert restarted.rows[ 1 ][ "Tags - Bard" ] == ""
+
+
+def test_compaction_folds_journal_into_extract( store, extract_path ):
+   tag_server.update_row( 5, "terse", "short" )
+   with store.lock.write( ):
+      store.compact( )
+
+   assert store.journal.entries == 0
+   assert store.journal.path.read_text( encoding = "utf-8" ) == ""
+
+   restarted = make_store( extract_path )
+   restarted.ensure_loaded( )
+   assert restarted.rows[ 5 ][ "Tags - ChatGPT" ] == "terse"
+
+
+# Versions and batches -----------------------------------------------------
+
+def test_stale_version_conflicts( store ):
+   version = store.version( 1 )
+   tag_server.update_row( 1, "first", "", expected_version = version )
+
+   with pytest.raises( tag_server.VersionConflict ):
+      tag_server.update_row( 1, "second", "", expected_version = version )
+   assert store.rows[ 1 ][ "Tags - ChatGPT" ] == "first"
+
+
+def test_atomic_batch_rolls_back_on_any_failure( store ):
+   before = { row_id: dict( row ) for row_id, row in store.rows.items( ) }
+   generation = store.generation
+
+   applied, results = tag_server.update_rows(
+      [
+         { "id": 1, "tags_chatgpt": "changed", "tags_bard": "" },
+         { "id": 999, "tags_chatgpt": "x", "tags_bard": "" },
+      ]
+   )
+
+   assert not applied
+   assert [ r[ "status" ] for r in results ] == [ 424, 404 ]
+   assert tag_server.batch_status( applied, results ) == 404
+   assert store.rows == before
+   assert store.generation == generation
+   assert store.journal.entries == 0
+
+
+def test_non_atomic_batch_applies_valid_items( store ):
+   applied, results = tag_server.update_rows(
+      [
+         { "id": 1, "tags_chatgpt": "changed", "tags_bard": "" },
+         { "id": "abc" },
+      ],
+      atomic = False,
+   )
+
+   assert applied
+   assert [ r[ "status" ] for r in results ] == [ 200, 400 ]
+   assert results[ 0 ][ "version" ] == store.version( 1 )
+   assert store.rows[ 1 ][ "Tags - ChatGPT" ] == "changed"
+
+
+def test_batch_status_prefers_conflict( store ):
+   applied, results = tag_server.update_rows(
+      [
+         { "id": 1, "tags_chatgpt": "x", "tags_bard": "", "version": 1 },
+         { "id": 999 },
+      ]
+   )
+   assert tag_server.batch_status( applied, results ) == 409
+
+
+@pytest.mark.parametrize( "value", [ None, [ "a", "b" ], 3 ] )
+def test_batch_rejects_non_string_tags( store, value ):
+   applied, results = tag_server.update_rows( [ { "id": 1, "tags_chatgpt": value } ] )
+
+   assert not applied
+   assert results[ 0 ][ "status" ] == 400
+   assert "tags_chatgpt" in results[ 0 ][ "error" ]
+   assert store.rows[ 1 ][ "Tags - ChatGPT" ] == "clear"
+
+
+# Paging -------------------------------------------------------------------
+
+def test_cursor_paging_visits_every_row_once( store ):
+   seen = [ ]
+   params = { "limit": [ "3" ] }
+   while True:
+      page = tag_server.query_rows( params )
+      seen.extend( item[ "id" ] for item in page[ "items" ] )
+      if not page[ "next_cursor" ]:
+         break
+      params = { "limit": [ "3" ], "cursor": [ page[ "next_cursor" ] ] }
+
+   assert seen == store.order
+
+
+# HTTP ---------------------------------------------------------------------
+
+@pytest.mark.parametrize( "payload, field", [
+   ( { "tags_chatgpt": None }, "tags_chatgpt" ),
+   ( { "tags_chatgpt": "ok", "tags_bard": [ "a" ] }, "tags_bard" ),
+] )
+def test_single_row_save_rejects_non_string_tags( server, store, payload, field ):
+   status, _, body = request( server, "/api/explanations/1", payload )
+
+   assert status == 400
+   assert field in json.loads( body )[ "error" ]
+   assert store.rows[ 1 ][ "Tags - ChatGPT" ] == "clear"
+
+
+@pytest.mark.parametrize( "content_length", [ "abc", "-5", "" ] )
+def test_bad_content_length_is_400( server, content_length ):
+   status, body = raw_post( server, "/api/explanations/1", content_length, b'{"tags_chatgpt": "x"}' )
+
+   assert status == 400
+   assert body == { "error": "Invalid Content-Length" }
+
+
+def test_save_with_if_match( server, store ):
+   status, headers, _ = request( server, "/api/explanations/1" )
+   etag = headers[ "ETag" ]
+
+   status, headers, _ = request( server, "/api/explanations/1", { "tags_chatgpt": "a" }, { "If-Match": etag } )
+   assert status == 204
+
+   status, _, body = request( server, "/api/explanations/1", { "tags_chatgpt": "b" }, { "If-Match": etag } )
+   assert status == 409
+   assert json.loads( body )[ "current" ][ "tags_chatgpt" ] == "a"
+
+
+@pytest.mark.parametrize( "row_id", [ 0, 4, 999 ] )
+def test_get_missing_id_is_404( server, row_id ):
+   status, _, _ = request( server, f"/api/explanations/{row_id}" )
+   assert status == 404
+
+
+def test_list_etag_matches_body_generation( server, store ):
+   tag_server.update_row( 3, "fresh", "" )
+   status, headers, body = request( server, "/api/explanations?limit=10" )
+
+   generation = int( headers[ "ETag" ].removeprefix( "W/" ).strip( '"' ) )
+   assert status == 200
+   assert generation == store.generation
+   assert max( item[ "version" ] for item in json.loads( body )[ "items" ] ) == generation
@@ -0,0 +1,253 @@
+import hashlib
+import re
+from collections import Counter
+from itertools import islice
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from atomic_io import atomic_write
+
+
+# Rows of text handled per batch; memory is bounded by the vocabulary plus one batch.
+CHUNK_ROWS = 5000
+
+NGRAM_NAMES = { 1: "Words", 2: "Bigrams", 3: "Trigrams" }
+
+# Terms seen fewer times than this within a slice are left out of lift tables.
+MIN_LIFT_COUNT = 5
+
+_WORD_RE = re.compile( r"[a-zA-Z]+" )
+
+
+def as_text( value ):
+   return "" if value is None or pd.isna( value ) else str( value )
+
+
+def tokenize( text, stop_words = ( ) ):
+   """
+   Lowercased runs of ASCII letters, with stop words dropped as they are read.
+   Anything else ( digits, punctuation, accents ) separates words.
+   """
+   return [ w for w in map( str.lower, _WORD_RE.findall( as_text( text ) ) ) if w not in stop_words ]
+
+
+def ngrams( tokens, n ):
+   if n == 1:
+      return tokens
+   return [ " ".join( tokens[ i:i + n ] ) for i in range( len( tokens ) - n + 1 ) ]
+
+
+def iter_chunks( texts, size = CHUNK_ROWS ):
+   texts = iter( texts )
+   while True:
+      chunk = list( islice( texts, size ) )
+      if not chunk:
+         return
+      yield chunk
+
+
+def count_terms( texts, stop_words = ( ), n = 1, chunk_size = CHUNK_ROWS ):
+   """
+   Stream texts into a Counter of n-grams ( n-grams never span two texts ).
+
+   texts can be any iterable, e.g. a column or a generator over
+   pd.read_csv( ..., chunksize = ... ), so nothing larger than one chunk
+   of raw text is held at a time.
+
+   Returns ( counts, total ), where total is the number of n-grams seen.
+   Terms keep first-seen order.
+   """
+   stop_words = frozenset( stop_words )
+   counts = Counter( )
+   total = 0
+
+   for chunk in iter_chunks( texts, chunk_size ):
+      if n == 1:
+         # Single words cannot span texts, so tokenize the whole chunk at once.
+         terms = tokenize( "\n".join( map( as_text, chunk ) ), stop_words )
+         counts.update( terms )
+         total += len( terms )
+         continue
+
+      for text in chunk:
+         terms = ngrams( tokenize( text, stop_words ), n )
+         counts.update( terms )
+         total += len( terms )
+
+   return counts, total
+
+
+def available_stop_words( ):
+   """
+   nltk's English stop words if the corpus is already installed, else none.
+   Never downloads; analyze.py's get_stop_words does that.
+   """
+   try:
+      from nltk.corpus import stopwords
+      return set( stopwords.words( "english" ) )
+   except ( ImportError, LookupError ):
+      return set( )
+
+
+def text_fingerprint( row_ids, texts ):
+   digest = hashlib.sha256( )
+   for row_id, text in zip( row_ids, texts ):
+      digest.update( f"{row_id}\x1f{as_text( text )}\x1e".encode( "utf-8" ) )
+   return digest.hexdigest( )
+
+
+class TokenIndex:
+   """
+   Per-row term counts for one text column, tokenized once.
+
+   Rows are stored CSR-style: the terms of the i-th row are
+   term_ids[ indptr[ i ]:indptr[ i + 1 ] ] with matching counts, so the
+   counts for any slice of rows ( a rating, a tag ) are a single bincount
+   over the slice's entries instead of a second pass over the text.
+   """
+
+   def __init__( self, row_ids, vocabulary, indptr, term_ids, counts, stop_words, fingerprint ):
+      self.row_ids = np.asarray( row_ids, dtype = np.int64 )
+      self.vocabulary = np.asarray( vocabulary, dtype = str )
+      self.indptr = np.asarray( indptr, dtype = np.int64 )
+      self.term_ids = np.asarray( term_ids, dtype = np.int32 )
+      self.counts = np.asarray( counts, dtype = np.int32 )
+      self.stop_words = frozenset( stop_words )
+      self.fingerprint = fingerprint
+
+   @classmethod
+   def build( cls, row_ids, texts, stop_words = ( ) ):
+      row_ids = list( row_ids )
+      texts = list( texts )
+      stop_words = frozenset( stop_words )
+
+      term_to_id = { }
+      indptr = [ 0 ]
+      term_ids = [ ]
+      counts = [ ]
+
+      for text in texts:
+         for term, count in Counter( tokenize( text, stop_words ) ).items( ):
+            term_ids.append( term_to_id.setdefault( term, len( term_to_id ) ) )
+            counts.append( count )
+         indptr.append( len( term_ids ) )
+
+      return cls(
+         row_ids, list( term_to_id ), indptr, term_ids, counts,
+         stop_words, text_fingerprint( row_ids, texts )
+      )
+
+   def save( self, path ):
+      def write( fh ):
+         np.savez_compressed(
+            fh,
+            row_ids = self.row_ids,
+            vocabulary = self.vocabulary,
+            indptr = self.indptr,
+            term_ids = self.term_ids,
+            counts = self.counts,
+            stop_words = np.asarray( sorted( self.stop_words ), dtype = str ),
+            fingerprint = np.asarray( self.fingerprint ),
+         )
+
+      atomic_write( path, write, keep = 0, binary = True )
+
+   @classmethod
+   def load( cls, path ):
+      with np.load( path, allow_pickle = False ) as data:
+         return cls(
+            data[ "row_ids" ], data[ "vocabulary" ], data[ "indptr" ],
+            data[ "term_ids" ], data[ "counts" ], data[ "stop_words" ].tolist( ),
+            str( data[ "fingerprint" ] ),
+         )
+
+   def term_counts( self, rows = None ):
+      """
+      Total count of every vocabulary term over rows ( all rows if None ).
+      """
+      if rows is None:
+         entries = slice( None )
+      else:
+         selected = np.isin( self.row_ids, np.fromiter( rows, dtype = np.int64 ) )
+         entries = np.repeat( selected, np.diff( self.indptr ) )
+      return np.bincount(
+         self.term_ids[ entries ], weights = self.counts[ entries ], minlength = len( self.vocabulary )
+      ).astype( np.int64 )
+
+   def lift_table( self, groups, min_count = MIN_LIFT_COUNT, limit = None ):
+      """
+      Terms that characterise each group of rows.
+
+      groups maps a label to the row ids in it ( groups may overlap ).
+      lift is the term's share of the group's words over its share of all
+      words, so 2.0 means twice as common in the group as overall.
+
+      Returns a DataFrame with columns group, term, count,
+      percent_of_group_words and lift, sorted by group then lift.
+      """
+      overall = self.term_counts( )
+      overall_total = overall.sum( )
+
+      frames = [ ]
+      for label, rows in groups.items( ):
+         counts = self.term_counts( rows )
+         total = counts.sum( )
+         keep = np.flatnonzero( counts >= max( min_count, 1 ) )
+         if total == 0 or keep.size == 0:
+            continue
+
+         share = counts[ keep ] / total
+         frame = pd.DataFrame(
+            {
+               "group": label,
+               "term": self.vocabulary[ keep ],
+               "count": counts[ keep ],
+               "percent_of_group_words": share * 100.0,
+               "lift": share / ( overall[ keep ] / overall_total ),
+            }
+         )
+         frame = frame.sort_values( [ "lift", "count" ], ascending = False, kind = "stable" )
+         frames.append( frame if limit is None else frame.head( limit ) )
+
+      if not frames:
+         return pd.DataFrame( columns = [ "group", "term", "count", "percent_of_group_words", "lift" ] )
+      return pd.concat( frames, ignore_index = True )
+
+
+def cached_token_index( path, row_ids, texts, stop_words = None ):
+   """
+   TokenIndex for these rows, reusing the copy cached at path when it was
+   built from the same texts ( and the same stop words, if given ).
+   A stale or missing cache is rebuilt and rewritten.
+
+   With stop_words None, whatever list the cache was built with is accepted;
+   a fresh build then falls back to available_stop_words().
+   """
+   path = Path( path )
+   row_ids = list( row_ids )
+   texts = list( texts )
+   fingerprint = text_fingerprint( row_ids, texts )
+
+   if path.exists( ):
+      try:
+         cached = TokenIndex.load( path )
+      except ( OSError, ValueError, KeyError ):
+         cached = None
+      if (
+         cached is not None
+         and cached.fingerprint == fingerprint
+         and ( stop_words is None or cached.stop_words == frozenset( stop_words ) )
+      ):
+         return cached
+
+   if stop_words is None:
+      stop_words = available_stop_words( )
+
+   index = TokenIndex.build( row_ids, texts, stop_words )
+   try:
+      index.save( path )
+   except OSError:
+      pass
+   return index